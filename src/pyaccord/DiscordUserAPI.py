@@ -1,5 +1,6 @@
 """API abstraction for performing actions on Discord Users."""
 
+import contextlib
 import requests
 import datetime
 import logging
@@ -7,7 +8,11 @@ import logging
 from typing import List, Optional, Union
 from oauthlib.oauth2 import WebApplicationClient
 
-from .url_functions import get_api_url, get_authorization_url, get_token_url
+from .deadline import Deadline, current_deadline
+from .exceptions import DeadlineExceededError
+from .ratelimit import RateLimitBackend, RateLimiter
+from .scheduler import Priority, RequestScheduler, current_priority, priority, shared_scheduler
+from .url_functions import Route, get_api_url, get_authorization_url, get_token_url
 
 
 logger = logging.getLogger("DiscordAPI")
@@ -17,8 +22,14 @@ class DiscordUserAPI():
     """Class for performing actions on a discord user."""
 
     def __init__(self, *, client_id=None, client_secret=None, access_token=None, version=None, expires_in=None,
-                 refresh_token=None, oauth_code=None, callback_url=None, expiry=None, bot_token: Optional[str] = None):
-        """Initialize Discord User API."""
+                 refresh_token=None, oauth_code=None, callback_url=None, expiry=None, bot_token: Optional[str] = None,
+                 rate_limit_backend: Optional[RateLimitBackend] = None, timeout: Optional[float] = None):
+        """
+        Initialize Discord User API.
+
+        Requests made with the bot token share rate limits with every Client using the same token and backend.
+        `timeout` bounds every call, including retries and rate limit waits, in seconds.
+        """
 
         if not (access_token and refresh_token or oauth_code and callback_url):
             raise ValueError("Insufficient information passed to initialize API")
@@ -27,7 +38,7 @@ class DiscordUserAPI():
             # If no tokens, get the tokens
             logger.info("No tokens provided, getting tokens with oauth code and callback url")
             try:
-                credentials = get_tokens(oauth_code, callback_url, client_id, client_secret)
+                credentials = get_tokens(oauth_code, callback_url, client_id, client_secret, timeout=timeout)
             except requests.exceptions.HTTPError as e:
                 logger.error(
                     f"Failed to get tokens from discord."
@@ -60,12 +71,49 @@ class DiscordUserAPI():
 
         self.discord_api_url = get_api_url(self.version)
 
-    def get_user_info(self):
-        url = self.discord_api_url + "/users/@me"
+        self.rate_limit_backend = rate_limit_backend
+        self.timeout = timeout
+        # Bearer tokens are per login, a shared scheduler for each would be kept for the life of the process
+        self._user_scheduler = RequestScheduler(RateLimiter(self.access_token, rate_limit_backend))
+        self._bot_scheduler = shared_scheduler(RateLimiter(self.bot_token, rate_limit_backend)) \
+            if self.bot_token else None
+
+    def _request(self, route: Route, scheduler: RequestScheduler, *, headers: dict, max_retries: int = 5,
+                 **kwargs) -> requests.Response:
+        """Make a request once the scheduler has given it its turn on the rate limit, retrying on 429s."""
 
+        url = route.url(self.version)
+
+        deadline = current_deadline()
+        if self.timeout is not None and (deadline is None or deadline.remaining() > self.timeout):
+            deadline = Deadline(self.timeout)
+
+        for _ in range(max_retries):
+            scheduler.acquire(route.key, route.major, deadline=deadline)
+
+            timeout = deadline.check(str(route)) if deadline is not None else None
+            try:
+                response = requests.request(route.method, url, headers=headers, timeout=timeout, **kwargs)
+            except requests.exceptions.Timeout as e:
+                if deadline is not None and deadline.expired:
+                    raise DeadlineExceededError(f"Deadline exceeded waiting for {route}") from e
+                raise
+
+            retry_after = scheduler.rate_limiter.release(route.key, route.major, response)
+            if retry_after:
+                scheduler.rate_limiter.backoff(retry_after, route.key, deadline=deadline)
+
+            if response.status_code != 429:
+                break
+
+            logger.warning(f"Rate limited on {route}, retrying")
+
+        return response
+
+    def get_user_info(self):
         headers = {"Authorization": f"Bearer {self.access_token}"}
 
-        response = requests.get(url, headers=headers)
+        response = self._request(Route("GET", "/users/@me"), self._user_scheduler, headers=headers)
 
         response.raise_for_status()
 
@@ -114,8 +162,8 @@ class DiscordUserAPI():
 
         logger.debug(f"Trying to add discord user id {user_id} to guild {guild_id}")
 
-        url = self.discord_api_url + f"/guilds/{guild_id}/members/{user_id}"
-        logger.debug(f"Request url: {url}")
+        route = Route("PUT", "/guilds/{guild_id}/members/{user_id}", guild_id=guild_id, user_id=user_id)
+        logger.debug(f"Request route: {route}")
 
         headers = {
             "User-Agent": "WebsiteServerClient (engfrosh.com, 1)",
@@ -134,7 +182,14 @@ class DiscordUserAPI():
         if deaf:
             data["deaf"] = deaf
 
-        response = requests.put(url, headers=headers, json=data)
+        if self._bot_scheduler is None:
+            logger.error("No bot token, cannot add user to guild.")
+            return False
+
+        # A user is waiting on this, so it goes ahead of bulk traffic on the bot's token unless told otherwise
+        request_priority = priority(Priority.INTERACTIVE) if current_priority() is None else contextlib.nullcontext()
+        with request_priority:
+            response = self._request(route, self._bot_scheduler, headers=headers, json=data)
 
         if response.status_code == 201:
             logger.info(f"Successfully added user with id {user_id} to guild with id {guild_id}")
@@ -150,7 +205,7 @@ class DiscordUserAPI():
             return False
 
 
-def get_tokens(oauth_code, callback_url, client_id, client_secret):
+def get_tokens(oauth_code, callback_url, client_id, client_secret, timeout: Optional[float] = None):
     """Get the tokens OAuth tokens for the user via the discord api."""
 
     data = {
@@ -165,7 +220,7 @@ def get_tokens(oauth_code, callback_url, client_id, client_secret):
         "Content-Type": 'application/x-www-form-urlencoded'
     }
 
-    response = requests.post(get_token_url(), headers=headers, data=data)
+    response = requests.post(get_token_url(), headers=headers, data=data, timeout=timeout)
     response.raise_for_status()
     return response.json()
 
@@ -3,3 +3,16 @@
 from .client import Client  # noqa: F401
 from .role import Role  # noqa: F401
 from .invite import Invite  # noqa: F401
+from .invite_pool import InvitePool  # noqa: F401
+from .webhook import Webhook  # noqa: F401
+from .export import ChannelExporter  # noqa: F401
+from .membership import MembershipIndex  # noqa: F401
+from .ratelimit import (  # noqa: F401
+    LocalRateLimitBackend, RateLimitBackend, RedisRateLimitBackend, SQLiteRateLimitBackend
+)
+from .deadline import Deadline  # noqa: F401
+from .exceptions import DeadlineExceededError  # noqa: F401
+from .serialization import ModelBatch  # noqa: F401
+from .assets import AssetCache  # noqa: F401
+from .scheduler import Priority, RequestScheduler  # noqa: F401
+from .planner import RequestPlan  # noqa: F401
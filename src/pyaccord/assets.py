@@ -0,0 +1,270 @@
+"""Discord CDN asset urls and a disk cache for downloading them."""
+
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .deadline import current_deadline
+
+logger = logging.getLogger("DiscordAPI")
+
+CDN_URL = "https://cdn.discordapp.com"
+
+ASSET_SIZES = frozenset(2 ** i for i in range(4, 13))
+ASSET_FORMATS = frozenset(("png", "jpg", "jpeg", "webp", "gif"))
+
+ASSET_CHUNK_SIZE = 64 * 1024
+
+# The CDN doesn't need authorization, so every cache shares one keep-alive pool
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=16))
+_session.headers.update({"User-Agent": "WebsiteServerClient (engfrosh.com, 1)"})
+
+
+def asset_url(path: str, asset_hash: str, *, size: Optional[int] = None, format: Optional[str] = None) -> str:
+    """
+    Build the CDN url of an asset from its hash, eg. `asset_url(f"icons/{guild_id}", guild.icon)`.
+
+    Animated assets, whose hash starts with "a_", default to gif and everything else to png.
+    `size` must be a power of 2 between 16 and 4096.
+    """
+
+    if format is None:
+        format = "gif" if asset_hash.startswith("a_") else "png"
+    if format not in ASSET_FORMATS:
+        raise ValueError(f"Unsupported asset format {format}, must be one of {', '.join(sorted(ASSET_FORMATS))}")
+    if size is not None and size not in ASSET_SIZES:
+        raise ValueError(f"Unsupported asset size {size}, must be a power of 2 between 16 and 4096")
+
+    url = f"{CDN_URL}/{path}/{asset_hash}.{format}"
+    if size is not None:
+        url += f"?size={size}"
+
+    return url
+
+
+def default_avatar_url(user_id: int, discriminator: Optional[str] = None) -> str:
+    """The url of the avatar Discord shows for a user that hasn't set one."""
+
+    if discriminator and discriminator != "0":
+        index = int(discriminator) % 5
+    else:
+        index = (int(user_id) >> 22) % 6
+
+    return f"{CDN_URL}/embed/avatars/{index}.png"
+
+
+def asset_key(url: str) -> str:
+    """The cache file name for an asset url, made from its path, hash and size."""
+
+    parts = urlsplit(url)
+    segments = [s for s in parts.path.split("/") if s]
+    stem, _, extension = segments[-1].rpartition(".")
+    key = "_".join(segments[:-1] + [stem or extension])
+
+    size = parse_qs(parts.query).get("size")
+    if size:
+        key += f"@{int(size[0])}"
+
+    return f"{key}.{extension}" if stem else key
+
+
+class AssetCache:
+    """
+    Size bounded least recently used disk cache of CDN assets.
+
+    `fetch` returns the path to a local copy of the asset, downloading it only if it isn't cached. Cached files
+    older than `revalidate_after` seconds are revalidated with a conditional request, which costs no download if
+    they haven't changed. Concurrent fetches of the same asset share one download.
+    """
+
+    INDEX_FILE = "index.json"
+
+    directory: str
+    max_bytes: int
+    revalidate_after: Optional[float]
+
+    def __init__(
+            self, directory: str, *, max_bytes: int = 256 * 1024 * 1024,
+            revalidate_after: Optional[float] = 86400.0) -> None:
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+
+        self._lock = threading.Lock()
+        # Key to entry in least to most recently used order
+        self._entries: collections.OrderedDict[str, Dict] = collections.OrderedDict()
+        self._inflight: Dict[str, concurrent.futures.Future] = {}
+        self._total_bytes = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def __repr__(self) -> str:
+        return f"<AssetCache: {len(self)} assets, {self.total_bytes} bytes in {self.directory}>"
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _load_index(self) -> None:
+
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                os.remove(self._path(name))
+
+        try:
+            with open(self._path(self.INDEX_FILE)) as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+
+        for key, entry in entries:
+            if os.path.exists(self._path(key)):
+                self._entries[key] = entry
+                self._total_bytes += entry["size"]
+
+    def _save_index(self) -> None:
+        """Write the index atomically, must be called with the lock held."""
+
+        path = self._path(self.INDEX_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(list(self._entries.items()), f)
+        os.replace(path + ".tmp", path)
+
+    def _evict(self) -> None:
+        """Remove least recently used assets until the cache fits, must be called with the lock held."""
+
+        for key in list(self._entries):
+            # Always keep the most recent asset, even if it alone is over the limit
+            if self._total_bytes <= self.max_bytes or len(self._entries) == 1:
+                break
+            if key in self._inflight:
+                continue
+
+            entry = self._entries.pop(key)
+            self._total_bytes -= entry["size"]
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            logger.debug(f"Evicted asset {key} from the asset cache")
+
+    def _is_fresh(self, entry: Dict) -> bool:
+        return self.revalidate_after is None or time.time() - entry["checked_at"] < self.revalidate_after
+
+    def fetch(self, url: str) -> str:
+        """Get the path of a local copy of the asset at the url."""
+
+        key = asset_key(url)
+        path = self._path(key)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_fresh(entry) and os.path.exists(path):
+                self._entries.move_to_end(key)
+                return path
+
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = concurrent.futures.Future()
+
+        if not owner:
+            return future.result()
+
+        try:
+            self._download(url, key, entry)
+            future.set_result(path)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+        return path
+
+    def read(self, url: str) -> bytes:
+        """Get the contents of the asset at the url."""
+
+        with open(self.fetch(url), "rb") as f:
+            return f.read()
+
+    def _download(self, url: str, key: str, entry: Optional[Dict]) -> None:
+        """Download the asset to its cache file, or just revalidate it if it is already cached."""
+
+        path = self._path(key)
+
+        headers = {}
+        if entry is not None and os.path.exists(path):
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        deadline = current_deadline()
+        timeout = deadline.check(f"asset download {url}") if deadline is not None else None
+
+        with _session.get(url, headers=headers, stream=True, timeout=timeout) as r:
+            if r.status_code == 304 and headers:
+                logger.debug(f"Asset {key} not modified")
+                with self._lock:
+                    entry["checked_at"] = time.time()
+                    self._entries[key] = entry
+                    self._entries.move_to_end(key)
+                    self._save_index()
+                return
+
+            if not r.ok:
+                logger.error(f"Failed to download asset {url}: {r.status_code}")
+            r.raise_for_status()
+
+            size = 0
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in r.iter_content(chunk_size=ASSET_CHUNK_SIZE):
+                        f.write(chunk)
+                        size += len(chunk)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+        logger.debug(f"Downloaded asset {key}, {size} bytes")
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old["size"]
+
+            self._entries[key] = {
+                "size": size,
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+                "checked_at": time.time(),
+            }
+            self._total_bytes += size
+
+            self._evict()
+            self._save_index()
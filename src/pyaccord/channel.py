@@ -9,6 +9,7 @@ from .invite import Invite
 
 if TYPE_CHECKING:
     from client import Client
+    from invite_pool import InvitePool
 
 
 class ChannelType(IntEnum):
@@ -45,6 +46,9 @@ class BaseChannel:
     def __repr__(self) -> str:
         return f"<BaseChannel: {self.name} #{self.id}>"
 
+    def __getstate__(self) -> dict:
+        return dict(self.__dict__, _client=None)
+
     @staticmethod
     def from_list_of_dict(lst: List[dict], *, client: Optional[Client] = None, **kwargs) -> List[Channel]:
         channels = []
@@ -97,3 +101,14 @@ class TextChannel(BaseChannel):
 
         return self._client.create_channel_invite(
             self, max_age=max_age, max_uses=max_uses, temporary=temporary, unique=unique)
+
+    def create_invite_pool(self, *, size: int = 10, max_age: int = 86400, max_uses: int = 1,
+                           temporary: Optional[bool] = None, expiry_margin: float = 60,
+                           refill_interval: float = 1.0) -> InvitePool:
+
+        if not self._client:
+            raise NoPyaccordClientProvidedError
+
+        return self._client.create_invite_pool(
+            self, size=size, max_age=max_age, max_uses=max_uses, temporary=temporary,
+            expiry_margin=expiry_margin, refill_interval=refill_interval)
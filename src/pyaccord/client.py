@@ -2,30 +2,69 @@
 
 from __future__ import annotations
 
-from typing import Dict, Iterable, List, Optional, Union
+from typing import Any, Callable, ContextManager, Dict, Iterable, Iterator, List, Optional, Union
+import concurrent.futures
+import contextvars
+import datetime
 import requests
 import logging
+import threading
 
 from .permissions import Permissions
 from .channel import BaseChannel, Channel
 
+from .gateway import Gateway, GatewayIntents
 from .guild import Guild
 from .invite import Invite
+from .invite_pool import InvitePool
+from .membership import MembershipIndex
+from .export import ChannelExporter
+from .prune import PruneProgress, prune_channel
 from .role import Role
 from .user import CurrentUser
-from .url_functions import get_api_url
+from .deadline import Deadline, current_deadline, deadline
+from .exceptions import DeadlineExceededError
+from .planner import RequestPlan, current_plan, dry_run
+from .ratelimit import RateLimitBackend, RateLimiter
+from .scheduler import Priority, RequestPriority, priority, shared_scheduler
+from .url_functions import Route, get_api_url
+from .webhook import Webhook, execute_webhook
+from .DiscordMessage import Message
+from .snowflake import to_snowflake
+from .streaming import iter_json_array
 
 logger = logging.getLogger("DiscordAPI")
 
+STREAM_CHUNK_SIZE = 16 * 1024
+
 
 class Client:
     """Class for performing generic Discord API actions."""
 
-    def __init__(self, bot_token: str, *, api_version: Optional[int] = None) -> None:
-        """Initialize Discord API."""
+    def __init__(self, bot_token: str, *, api_version: Optional[int] = None,
+                 rate_limit_backend: Optional[RateLimitBackend] = None, timeout: Optional[float] = None,
+                 hedge_after: Optional[float] = None) -> None:
+        """
+        Initialize Discord API.
+
+        Clients share rate limit state with every other client using the same token and backend. The default
+        backend is shared within the process, pass a SQLiteRateLimitBackend or RedisRateLimitBackend to share it
+        between processes.
+
+        `timeout` bounds every call, including its retries and rate limit waits, in seconds. Use `Client.deadline`
+        for a tighter bound on particular calls. If `hedge_after` is set, idempotent reads that have not been
+        answered after that many seconds are sent a second time and the first response is used.
+        """
 
         self.bot_token = bot_token
         self.api_version = api_version
+        self.rate_limiter = RateLimiter(bot_token, rate_limit_backend)
+        self.scheduler = shared_scheduler(self.rate_limiter)
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+
+        self._hedge_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._gateway: Optional[Gateway] = None
 
         self.headers = {
             "User-Agent": "WebsiteServerClient (engfrosh.com, 1)",
@@ -33,10 +72,152 @@ class Client:
             "Content-Type": "application/json"
         }
 
+        self._channel_webhooks: Dict[int, Webhook] = {}
+        # Guards the two dicts, each channel's lock is held while its webhook is looked up or created
+        self._channel_webhooks_lock = threading.Lock()
+        self._channel_webhook_locks: Dict[int, threading.Lock] = {}
+
+        self._membership_indexes: Dict[int, MembershipIndex] = {}
+
     @property
     def api_url(self) -> str:
         return get_api_url(self.api_version)
 
+    def deadline(self, timeout: float) -> ContextManager[Deadline]:
+        """
+        Context manager that bounds all calls made in the block to finish within `timeout` seconds.
+
+        Calls that can no longer finish in time, including while waiting on a rate limit, raise
+        DeadlineExceededError.
+        """
+
+        return deadline(timeout)
+
+    def priority(self, level: Priority, *, job: Optional[str] = None,
+                 weight: float = 1.0) -> ContextManager[RequestPriority]:
+        """
+        Context manager that schedules all calls made in the block with the priority class.
+
+        Requests waiting on the same bucket are served INTERACTIVE first, and fairly between jobs of the same class
+        in proportion to their weight. See `Client.scheduler.stats()` for queue depths and wait times.
+        """
+
+        return priority(level, job=job, weight=weight)
+
+    def dry_run(self, *, concurrency: int = 1, **kwargs) -> ContextManager[RequestPlan]:
+        """
+        Context manager that records the requests made in the block instead of sending them.
+
+        Calls return placeholders, lists are empty and fetched objects have every field 0, and the client's caches
+        and indexes are left as they were. The plan groups the requests by rate limit bucket and estimates how long
+        they would take to send with `concurrency` requests in flight, see `RequestPlan`.
+        """
+
+        return dry_run(concurrency=concurrency, **kwargs)
+
+    def _deadline(self) -> Optional[Deadline]:
+        """The deadline for a call starting now, the tighter of the context deadline and the client timeout."""
+
+        context_deadline = current_deadline()
+        if self.timeout is None:
+            return context_deadline
+
+        client_deadline = Deadline(self.timeout)
+        if context_deadline is not None and context_deadline.expires_at < client_deadline.expires_at:
+            return context_deadline
+        return client_deadline
+
+    def _send(self, route: Route, url: str, deadline: Optional[Deadline], **kwargs) -> requests.Response:
+        """Send a single attempt of a request."""
+
+        self.scheduler.acquire(route.key, route.major, deadline=deadline)
+
+        timeout = deadline.check(str(route)) if deadline is not None else None
+
+        try:
+            r = requests.request(route.method, url, headers=self.headers, timeout=timeout, **kwargs)
+        except requests.exceptions.Timeout as e:
+            if deadline is not None and deadline.expired:
+                raise DeadlineExceededError(f"Deadline exceeded waiting for {route}") from e
+            raise
+
+        retry_after = self.rate_limiter.release(route.key, route.major, r)
+        if retry_after:
+            self.rate_limiter.backoff(retry_after, route.key, deadline=deadline)
+
+        return r
+
+    def _send_hedged(self, route: Route, url: str, deadline: Optional[Deadline], **kwargs) -> requests.Response:
+        """Send a request, and a second copy if the first is slower than `hedge_after`. The first response wins."""
+
+        if self._hedge_executor is None:
+            self._hedge_executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="pyaccord-hedge")
+
+        # Copies of the caller's context keep the request's priority in the executor threads
+        first = self._hedge_executor.submit(contextvars.copy_context().run, self._send, route, url, deadline, **kwargs)
+
+        try:
+            return first.result(timeout=self.hedge_after)
+        except concurrent.futures.TimeoutError:
+            pass
+
+        logger.debug(f"No response for {route} after {self.hedge_after}s, sending hedged request")
+
+        second = self._hedge_executor.submit(
+            contextvars.copy_context().run, self._send, route, url, deadline, **kwargs)
+
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = error or future.exception()
+
+        assert error is not None
+        raise error
+
+    def _request(self, route: Route, *, max_retries: int = 5, hedge: bool = False, **kwargs) -> requests.Response:
+        """
+        Make a request to the route once the rate limiter has reserved capacity for it.
+
+        If Discord still responds with a 429 the rate limiter is told and the request is retried. Set `hedge` only
+        for idempotent requests, they may be sent twice.
+        """
+
+        plan = current_plan()
+        if plan is not None:
+            return plan.record(route, self.rate_limiter)
+
+        url = route.url(self.api_version)
+        deadline = self._deadline()
+
+        for _ in range(max_retries):
+            if hedge and self.hedge_after is not None:
+                r = self._send_hedged(route, url, deadline, **kwargs)
+            else:
+                r = self._send(route, url, deadline, **kwargs)
+
+            if r.status_code != 429:
+                break
+
+            logger.warning(f"Rate limited on {route}, retrying")
+
+        if not r.ok:
+            logger.error(f"{r.content}")
+        r.raise_for_status()
+
+        return r
+
+    def _iter_list(self, route: Route, **kwargs) -> Iterator[dict]:
+        """Make a request for a list and yield its items as they are downloaded, without buffering the body."""
+
+        r = self._request(route, stream=True, **kwargs)
+
+        with r:
+            yield from iter_json_array(r.iter_content(chunk_size=STREAM_CHUNK_SIZE))
+
     # region Guilds
 
     def create_guild(self, name: str) -> Guild:
@@ -49,10 +230,7 @@ class Client:
             "name": name
         }
 
-        url = self.api_url + "/guilds"
-        r = requests.post(url, headers=self.headers, json=data)
-
-        r.raise_for_status()
+        r = self._request(Route("POST", "/guilds"), json=data)
 
         guild = Guild.from_dict(r.json(), client=self)
 
@@ -68,18 +246,14 @@ class Client:
         else:
             guild_id = guild
 
-        url = self.api_url + f"/guilds/{guild_id}"
-        r = requests.get(url, headers=self.headers)
+        if self._gateway is not None and self._gateway.is_live(guild_id):
+            cached = self._gateway.cache.get_guild(guild_id)
+            if cached is not None:
+                return Guild.from_dict(cached, client=self)
 
-        if not r.ok:
-            logger.error(f"{r.content}")
-        r.raise_for_status()
+        r = self._request(Route("GET", "/guilds/{guild_id}", guild_id=guild_id), hedge=True)
 
-        json_response = r.json()
-
-        print(json_response)
-
-        guild = Guild.from_dict(json_response, client=self)
+        guild = Guild.from_dict(r.json(), client=self)
 
         logger.debug(f"Got guild: {guild}")
 
@@ -88,23 +262,174 @@ class Client:
     def delete_guild(self, id: int) -> None:
         """Deletes the specified guild. Bot must be the owner."""
 
-        url = self.api_url + f"/guilds/{id}"
-        r = requests.delete(url, headers=self.headers)
-
-        r.raise_for_status()
+        self._request(Route("DELETE", "/guilds/{guild_id}", guild_id=id))
 
         logger.info(f"Deleted guild with id: {id}")
 
     def remove_guild_member(self, guild_id: int, user_id: int) -> None:
         """Kick a member from the guild"""
 
-        url = self.api_url + f"/guilds/{guild_id}/members/{user_id}"
-        r = requests.delete(url, headers=self.headers)
+        self._request(Route("DELETE", "/guilds/{guild_id}/members/{user_id}", guild_id=guild_id, user_id=user_id))
 
-        r.raise_for_status()
+        if int(guild_id) in self._membership_indexes and current_plan() is None:
+            self._membership_indexes[int(guild_id)].remove_member(int(user_id))
 
         logger.info(f"Kicked guild member with id {user_id} from guild with id {guild_id}")
 
+    def iter_guild_members(self, guild: Guild | int) -> Iterator[dict]:
+        """
+        Iterate over all of a guild's members in ascending id order, fetching 1000 at a time.
+
+        Requires the guild members privileged intent.
+        """
+
+        if isinstance(guild, Guild):
+            guild_id = guild.id
+        else:
+            guild_id = guild
+
+        if self._gateway is not None and self._gateway.is_live(guild_id):
+            cached = self._gateway.cache.get_members(guild_id)
+            if cached is not None:
+                yield from sorted(cached, key=lambda m: int(m["user"]["id"]))
+                return
+
+        route = Route("GET", "/guilds/{guild_id}/members", guild_id=guild_id)
+        after = 0
+
+        while True:
+            count = 0
+            for member in self._iter_list(route, params={"limit": 1000, "after": after}):
+                count += 1
+                after = max(after, int(member["user"]["id"]))
+                yield member
+
+            if count < 1000:
+                return
+
+    def build_membership_index(self, guild: Guild | int) -> MembershipIndex:
+        """
+        Build a member by role index for the guild from its member listing.
+
+        The index is kept up to date by this client's role and member changes for the guild.
+        """
+
+        if isinstance(guild, Guild):
+            guild_id = guild.id
+        else:
+            guild_id = guild
+
+        index = MembershipIndex.from_members(int(guild_id), self.iter_guild_members(guild_id))
+        # A dry run lists no members, registering its empty index would hide the real one
+        if current_plan() is None:
+            self._membership_indexes[int(guild_id)] = index
+
+        logger.debug(f"Built membership index: {index}")
+
+        return index
+
+    def get_membership_index(self, guild: Guild | int) -> Optional[MembershipIndex]:
+        """Get the guild's membership index if one has been built."""
+
+        if isinstance(guild, Guild):
+            guild_id = guild.id
+        else:
+            guild_id = guild
+
+        return self._membership_indexes.get(int(guild_id))
+
+    def iter_guild_snapshots(
+            self, guilds: Iterable[int | Guild], *, include: Iterable[str] = ("roles", "channels"),
+            concurrency: int = 8) -> Iterator[Guild]:
+        """
+        Fetch several guilds concurrently, yielding each one as soon as all of its included parts have loaded.
+
+        `include` can contain "roles" and "channels". Roles come from the guild payload and are only fetched
+        separately if it has none. Requests go through the client's rate limiter like any other call.
+        Every guild is attempted, if any fail the first error is raised once the others have finished.
+        """
+
+        include = set(include)
+        unknown = include - {"roles", "channels"}
+        if unknown:
+            raise ValueError(f"Can't include {', '.join(sorted(unknown))} in a guild snapshot")
+
+        error: Optional[BaseException] = None
+
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=concurrency, thread_name_prefix="pyaccord-snapshot") as executor:
+            # Each future is one part of one guild, a guild is done when it has no parts left pending
+            futures: Dict[concurrent.futures.Future, tuple] = {}
+            pending: Dict[int, int] = {}
+            parts: Dict[int, Dict[str, Any]] = {}
+
+            def submit(guild_id: int, part: str, fn: Callable) -> None:
+                # Run in a copy of the caller's context so deadlines and priorities carry over to the worker threads
+                futures[executor.submit(contextvars.copy_context().run, fn, guild_id)] = (guild_id, part)
+                pending[guild_id] = pending.get(guild_id, 0) + 1
+
+            for guild in guilds:
+                guild_id = int(guild.id if isinstance(guild, Guild) else guild)
+                if guild_id in parts:
+                    continue
+                parts[guild_id] = {}
+                submit(guild_id, "guild", self.get_guild)
+                if "channels" in include:
+                    submit(guild_id, "channels", self.get_guild_channels)
+
+            try:
+                while futures:
+                    done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                    for future in done:
+                        guild_id, part = futures.pop(future)
+                        pending[guild_id] -= 1
+
+                        try:
+                            parts[guild_id][part] = future.result()
+                        except Exception as e:
+                            logger.error(f"Failed to load {part} of guild {guild_id}", exc_info=e)
+                            error = error or e
+                            parts[guild_id]["failed"] = True
+
+                        if part == "guild" and "roles" in include and "failed" not in parts[guild_id] \
+                                and parts[guild_id]["guild"]._roles is None:
+                            submit(guild_id, "roles", self.get_guild_roles)
+
+                        if pending[guild_id] or parts[guild_id].get("failed"):
+                            continue
+
+                        guild_parts = parts.pop(guild_id)
+                        snapshot: Guild = guild_parts["guild"]
+                        if "roles" in guild_parts:
+                            snapshot._roles = guild_parts["roles"]
+                        if "channels" in guild_parts:
+                            snapshot._channels = guild_parts["channels"]
+
+                        yield snapshot
+            except BaseException:
+                # The caller stopped iterating early, don't make them wait for every queued fetch
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+        if error:
+            raise error
+
+    def load_guild_snapshots(
+            self, guilds: Iterable[int | Guild], *, include: Iterable[str] = ("roles", "channels"),
+            concurrency: int = 8) -> List[Guild]:
+        """
+        Fetch several guilds and their roles and channels concurrently.
+
+        Returns the guilds in the order they were given, see iter_guild_snapshots to handle each one as it loads.
+        """
+
+        guilds = [int(g.id if isinstance(g, Guild) else g) for g in guilds]
+
+        snapshots = {int(g.id): g for g in self.iter_guild_snapshots(guilds, include=include, concurrency=concurrency)}
+
+        return [snapshots[guild_id] for guild_id in dict.fromkeys(guilds)]
+
     # endregion
 
     # region Users
@@ -118,12 +443,7 @@ class Client:
     def get_current_user(self) -> CurrentUser:
         """Get the current user."""
 
-        url = self.api_url + "/users/@me"
-        r = requests.get(url, headers=self.headers)
-
-        if not r.ok:
-            logger.error(f"{r.content}")
-        r.raise_for_status()
+        r = self._request(Route("GET", "/users/@me"))
 
         user = CurrentUser.from_dict(r.json(), client=self)
 
@@ -134,10 +454,7 @@ class Client:
     def get_current_user_guilds(self) -> List[Guild]:
         """Gets the guild the user is in."""
 
-        url = self.api_url + "/users/@me/guilds"
-        r = requests.get(url, headers=self.headers)
-
-        r.raise_for_status()
+        r = self._request(Route("GET", "/users/@me/guilds"))
 
         guilds = Guild.from_list_of_dict(r.json(), client=self)
 
@@ -145,6 +462,12 @@ class Client:
 
         return guilds
 
+    def iter_current_user_guilds(self) -> Iterator[Guild]:
+        """Like get_current_user_guilds, but yields each guild as soon as it has been downloaded."""
+
+        for d in self._iter_list(Route("GET", "/users/@me/guilds")):
+            yield Guild.from_dict(d, client=self)
+
     # endregion
 
     # endregion
@@ -187,10 +510,7 @@ class Client:
 
         logger.debug(f"Trying to create role with data: {data}")
 
-        url = get_api_url(self.api_version) + f"/guilds/{guild_id}/roles"
-        response = requests.post(url, headers=self.headers, json=data)
-
-        response.raise_for_status()
+        response = self._request(Route("POST", "/guilds/{guild_id}/roles", guild_id=guild_id), json=data)
 
         role = Role.from_dict(response.json(), client=self)
 
@@ -206,17 +526,34 @@ class Client:
         else:
             guild_id = guild
 
-        url = self.api_url + f"/guilds/{guild_id}/roles"
-        r = requests.get(url, headers=self.headers)
+        if self._gateway is not None and self._gateway.is_live(guild_id):
+            cached = self._gateway.cache.get_roles(guild_id)
+            if cached is not None:
+                return Role.from_list_of_dict(cached, client=self)
 
-        if not r.ok:
-            logger.error((f"{r.content}"))
-        r.raise_for_status()
+        r = self._request(Route("GET", "/guilds/{guild_id}/roles", guild_id=guild_id), hedge=True)
 
         roles = Role.from_list_of_dict(r.json(), client=self)
 
         return roles
 
+    def iter_guild_roles(self, guild: Union[Guild, int]) -> Iterator[Role]:
+        """Like get_guild_roles, but yields each role as soon as it has been downloaded."""
+
+        if isinstance(guild, Guild):
+            guild_id = guild.id
+        else:
+            guild_id = guild
+
+        if self._gateway is not None and self._gateway.is_live(guild_id):
+            cached = self._gateway.cache.get_roles(guild_id)
+            if cached is not None:
+                yield from Role.from_list_of_dict(cached, client=self)
+                return
+
+        for d in self._iter_list(Route("GET", "/guilds/{guild_id}/roles", guild_id=guild_id)):
+            yield Role.from_dict(d, client=self)
+
     def add_role_to_guild_member(self, guild: Guild | int, member: int, role: Union[Role, int]) -> None:
 
         if isinstance(guild, Guild):
@@ -231,13 +568,34 @@ class Client:
         else:
             role_id = role
 
-        url = self.api_url + f"/guilds/{guild_id}/members/{user_id}/roles/{role_id}"
-        r = requests.put(url, headers=self.headers)
+        self._request(Route("PUT", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}",
+                            guild_id=guild_id, user_id=user_id, role_id=role_id))
 
-        r.raise_for_status()
+        if int(guild_id) in self._membership_indexes and current_plan() is None:
+            self._membership_indexes[int(guild_id)].add_role(int(user_id), int(role_id))
 
         return
 
+    def remove_role_from_guild_member(self, guild: Guild | int, member: int, role: Union[Role, int]) -> None:
+
+        if isinstance(guild, Guild):
+            guild_id = guild.id
+        else:
+            guild_id = guild
+
+        user_id = member
+
+        if isinstance(role, Role):
+            role_id = role.id
+        else:
+            role_id = role
+
+        self._request(Route("DELETE", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}",
+                            guild_id=guild_id, user_id=user_id, role_id=role_id))
+
+        if int(guild_id) in self._membership_indexes and current_plan() is None:
+            self._membership_indexes[int(guild_id)].remove_role(int(user_id), int(role_id))
+
     def get_guild_channels(self, guild: Guild | int) -> List[Channel]:
         """Get a guild's channels by guild id or Guild object."""
 
@@ -246,15 +604,34 @@ class Client:
         else:
             guild_id = guild
 
-        url = self.api_url + f"/guilds/{guild_id}/channels"
-        r = requests.get(url, headers=self.headers)
+        if self._gateway is not None and self._gateway.is_live(guild_id):
+            cached = self._gateway.cache.get_channels(guild_id)
+            if cached is not None:
+                return Channel.from_list_of_dict(cached, client=self)
 
-        r.raise_for_status()
+        r = self._request(Route("GET", "/guilds/{guild_id}/channels", guild_id=guild_id), hedge=True)
 
         channels = Channel.from_list_of_dict(r.json(), client=self)
 
         return channels
 
+    def iter_guild_channels(self, guild: Guild | int) -> Iterator[Channel]:
+        """Like get_guild_channels, but yields each channel as soon as it has been downloaded."""
+
+        if isinstance(guild, Guild):
+            guild_id = guild.id
+        else:
+            guild_id = guild
+
+        if self._gateway is not None and self._gateway.is_live(guild_id):
+            cached = self._gateway.cache.get_channels(guild_id)
+            if cached is not None:
+                yield from Channel.from_list_of_dict(cached, client=self)
+                return
+
+        for d in self._iter_list(Route("GET", "/guilds/{guild_id}/channels", guild_id=guild_id)):
+            yield Channel.from_dict(d, client=self)
+
     # endregion
 
     # region Channels
@@ -262,10 +639,14 @@ class Client:
     def get_channel(self, channel_id: int) -> Channel:
         """Get the channel information."""
 
-        url = get_api_url(self.api_version) + f"/channels/{channel_id}"
-        response = requests.get(url, headers=self.headers)
+        if self._gateway is not None:
+            guild_id = self._gateway.cache.guild_of_channel(channel_id)
+            if guild_id is not None and self._gateway.is_live(guild_id):
+                cached = self._gateway.cache.get_channel(channel_id)
+                if cached is not None:
+                    return Channel.from_dict(cached)
 
-        response.raise_for_status()
+        response = self._request(Route("GET", "/channels/{channel_id}", channel_id=channel_id), hedge=True)
 
         json_response = response.json()
 
@@ -273,16 +654,17 @@ class Client:
 
         return Channel.from_dict(json_response)
 
-    def send_channel_message(self, channel_id: int, content: str) -> dict:
-        """Send a message to a channel"""
+    def send_channel_message(self, channel_id: int, content: Union[str, Message]) -> dict:
+        """Send a message to a channel. Attachments are only supported by `send_webhook_message`."""
 
-        url = self.api_url + f"/channels/{channel_id}/messages"
+        if isinstance(content, Message):
+            if content.file_path:
+                raise ValueError("send_channel_message can't send attachments, use send_webhook_message")
+            content = content.text
 
         data = {"content": content}
 
-        response = requests.post(url, headers=self.headers, json=data)
-
-        response.raise_for_status()
+        response = self._request(Route("POST", "/channels/{channel_id}/messages", channel_id=channel_id), json=data)
 
         # TODO return message object
         return response.json()  # Currently just returns the json of the message
@@ -315,10 +697,7 @@ class Client:
                 overwrites[i]["deny"] = str(overwrites[i]["deny"])
             data["permission_overwrites"] = overwrites
 
-        url = get_api_url(self.api_version) + f"/channels/{channel_id}"
-        response = requests.patch(url, headers=self.headers, json=data)
-
-        response.raise_for_status()
+        response = self._request(Route("PATCH", "/channels/{channel_id}", channel_id=channel_id), json=data)
 
         json_response = response.json()
 
@@ -329,10 +708,8 @@ class Client:
     def get_channel_message(self, channel_id: int, message_id: int):
         """Get the message object with the specified ids."""
 
-        url = get_api_url(self.api_version) + f"/channels/{channel_id}/messages/{message_id}"
-        response = requests.get(url, headers=self.headers)
-
-        response.raise_for_status()
+        response = self._request(Route("GET", "/channels/{channel_id}/messages/{message_id}",
+                                       channel_id=channel_id, message_id=message_id))
 
         json_response = response.json()
 
@@ -356,12 +733,319 @@ class Client:
             if var is not None:
                 data[nm] = var
 
-        url = get_api_url(self.api_version) + f"/channels/{channel_id}/invites"
+        r = self._request(Route("POST", "/channels/{channel_id}/invites", channel_id=channel_id), json=data)
 
-        r = requests.post(url, headers=self.headers, json=data)
+        return Invite.from_dict(r.json(), client=self)
 
-        r.raise_for_status()
+    def create_invite_pool(
+            self, channel: int | BaseChannel, *, size: int = 10, max_age: int = 86400, max_uses: int = 1,
+            temporary: Optional[bool] = None, expiry_margin: float = 60, refill_interval: float = 1.0) -> InvitePool:
+        """
+        Create a pool of unique invites for the channel that refills in the background.
 
-        return Invite.from_dict(r.json(), client=self)
+        Invites are taken from the pool with `InvitePool.get`, stop the refill thread with `InvitePool.stop`.
+        """
+
+        return InvitePool(
+            self, channel, size=size, max_age=max_age, max_uses=max_uses, temporary=temporary,
+            expiry_margin=expiry_margin, refill_interval=refill_interval)
+
+    # endregion
+
+    # region Messages
+
+    def get_channel_messages(
+            self, channel: int | BaseChannel, *, before: Optional[int | datetime.datetime] = None,
+            after: Optional[int | datetime.datetime] = None, around: Optional[int] = None,
+            limit: int = 50) -> List[dict]:
+        """Get up to 100 messages from a channel, newest first."""
+
+        if isinstance(channel, BaseChannel):
+            channel_id = channel.id
+        else:
+            channel_id = channel
+
+        params = {"limit": limit}
+        if before is not None:
+            params["before"] = to_snowflake(before)
+        if after is not None:
+            params["after"] = to_snowflake(after)
+        if around is not None:
+            params["around"] = around
+
+        r = self._request(Route("GET", "/channels/{channel_id}/messages", channel_id=channel_id), params=params)
+
+        return r.json()
+
+    def iter_channel_messages(
+            self, channel: int | BaseChannel, *, before: Optional[int | datetime.datetime] = None,
+            after: Optional[int | datetime.datetime] = None, oldest_first: bool = False) -> Iterator[dict]:
+        """
+        Iterate over a channel's message history between the before and after bounds, both exclusive.
+
+        Messages are fetched 100 at a time as the iterator is consumed, newest first unless `oldest_first` is set.
+        """
+
+        before_id = to_snowflake(before) if before is not None else None
+        after_id = to_snowflake(after) if after is not None else None
+
+        if oldest_first:
+            cursor = after_id if after_id is not None else 0
+            while True:
+                page = self.get_channel_messages(channel, after=cursor, limit=100)
+                page.sort(key=lambda m: int(m["id"]))
+                for message in page:
+                    if before_id is not None and int(message["id"]) >= before_id:
+                        return
+                    yield message
+                if len(page) < 100:
+                    return
+                cursor = int(page[-1]["id"])
+
+        cursor = before_id
+        while True:
+            page = self.get_channel_messages(channel, before=cursor, limit=100)
+            page.sort(key=lambda m: int(m["id"]), reverse=True)
+            for message in page:
+                if after_id is not None and int(message["id"]) <= after_id:
+                    return
+                yield message
+            if len(page) < 100:
+                return
+            cursor = int(page[-1]["id"])
+
+    def delete_channel_message(self, channel: int | BaseChannel, message_id: int) -> None:
+        """Delete a message from a channel."""
+
+        if isinstance(channel, BaseChannel):
+            channel_id = channel.id
+        else:
+            channel_id = channel
+
+        self._request(Route("DELETE", "/channels/{channel_id}/messages/{message_id}",
+                            channel_id=channel_id, message_id=message_id))
+
+        logger.debug(f"Deleted message {message_id} from channel {channel_id}")
+
+    def bulk_delete_messages(self, channel: int | BaseChannel, message_ids: List[int]) -> None:
+        """
+        Delete between 2 and 100 messages from a channel in a single request.
+
+        Discord rejects the whole request if any message is older than 2 weeks.
+        """
+
+        if isinstance(channel, BaseChannel):
+            channel_id = channel.id
+        else:
+            channel_id = channel
+
+        if not 2 <= len(message_ids) <= 100:
+            raise ValueError("Bulk delete takes between 2 and 100 message ids")
+
+        data = {"messages": [str(m) for m in message_ids]}
+
+        self._request(Route("POST", "/channels/{channel_id}/messages/bulk-delete", channel_id=channel_id), json=data)
+
+        logger.debug(f"Bulk deleted {len(message_ids)} messages from channel {channel_id}")
+
+    def prune_channel(
+            self, channel: int | BaseChannel, *, before: Optional[int | datetime.datetime] = None,
+            after: Optional[int | datetime.datetime] = None, predicate: Optional[Callable[[dict], bool]] = None,
+            concurrency: int = 4, on_progress: Optional[Callable[[PruneProgress], None]] = None) -> PruneProgress:
+        """
+        Delete the channel's messages between before and after that match the predicate.
+
+        Messages younger than 2 weeks are deleted 100 at a time with the bulk delete endpoint, older messages
+        are deleted one by one with up to `concurrency` requests in flight. `on_progress` is called after every
+        deletion request with the running totals, which are also returned.
+        """
+
+        return prune_channel(
+            self, channel, before=before, after=after, predicate=predicate, concurrency=concurrency,
+            on_progress=on_progress)
+
+    def export_channels(
+            self, channels: Iterable[int | BaseChannel], directory: str, *,
+            start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None,
+            concurrency: int = 4) -> Dict[int, int]:
+        """
+        Export the channels' messages between start and end to gzip compressed NDJSON files in the directory.
+
+        Exports are checkpointed, calling this again with the same range resumes interrupted exports.
+        Returns the number of messages exported for each channel.
+        """
+
+        exporter = ChannelExporter(self, directory, start=start, end=end, concurrency=concurrency)
+
+        return exporter.export_channels(channels)
+
+    # endregion
+
+    # region Webhooks
+
+    def create_channel_webhook(self, channel: int | BaseChannel, name: str = "pyaccord") -> Webhook:
+        """Create a webhook for the channel."""
+
+        if isinstance(channel, BaseChannel):
+            channel_id = channel.id
+        else:
+            channel_id = channel
+
+        r = self._request(Route("POST", "/channels/{channel_id}/webhooks", channel_id=channel_id), json={"name": name})
+
+        webhook = Webhook.from_dict(r.json(), client=self)
+
+        logger.info(f"Created webhook {webhook} for channel {channel_id}")
+
+        return webhook
+
+    def get_channel_webhooks(self, channel: int | BaseChannel) -> List[Webhook]:
+        """Get all the webhooks of a channel."""
+
+        if isinstance(channel, BaseChannel):
+            channel_id = channel.id
+        else:
+            channel_id = channel
+
+        r = self._request(Route("GET", "/channels/{channel_id}/webhooks", channel_id=channel_id))
+
+        return Webhook.from_list_of_dict(r.json(), client=self)
+
+    def delete_webhook(self, webhook: int | Webhook) -> None:
+
+        if isinstance(webhook, Webhook):
+            webhook_id = webhook.id
+        else:
+            webhook_id = webhook
+
+        self._request(Route("DELETE", "/webhooks/{webhook_id}", webhook_id=webhook_id))
+
+        with self._channel_webhooks_lock:
+            for channel_id, cached in list(self._channel_webhooks.items()):
+                if cached.id == webhook_id:
+                    del self._channel_webhooks[channel_id]
+
+        logger.info(f"Deleted webhook with id: {webhook_id}")
+
+    def get_channel_webhook(self, channel: int | BaseChannel, name: str = "pyaccord") -> Webhook:
+        """
+        Get a webhook the bot can execute for the channel, creating one if there isn't one already.
+
+        The webhook is cached for the lifetime of the client.
+        """
+
+        if isinstance(channel, BaseChannel):
+            channel_id = channel.id
+        else:
+            channel_id = channel
+
+        with self._channel_webhooks_lock:
+            if channel_id in self._channel_webhooks:
+                return self._channel_webhooks[channel_id]
+            channel_lock = self._channel_webhook_locks.setdefault(channel_id, threading.Lock())
+
+        with channel_lock:
+            with self._channel_webhooks_lock:
+                if channel_id in self._channel_webhooks:
+                    return self._channel_webhooks[channel_id]
+
+            # Only incoming webhooks created by this bot are returned with their token
+            webhooks = [w for w in self.get_channel_webhooks(channel_id) if w.token and w.name == name]
+            webhook = webhooks[0] if webhooks else self.create_channel_webhook(channel_id, name)
+
+            if current_plan() is None:
+                with self._channel_webhooks_lock:
+                    self._channel_webhooks[channel_id] = webhook
+
+        return webhook
+
+    def send_webhook_message(
+            self, channel: int | BaseChannel, message: Union[str, Message], *, username: Optional[str] = None,
+            avatar_url: Optional[str] = None, wait: bool = False) -> Optional[dict]:
+        """
+        Send a message to the channel through the channel's webhook instead of the bot's message bucket.
+
+        Returns the message json if `wait` is set.
+        """
+
+        if isinstance(channel, BaseChannel):
+            channel_id = channel.id
+        else:
+            channel_id = channel
+
+        deadline = self._deadline()
+        timeout = deadline.remaining() if deadline is not None else None
+
+        webhook = self.get_channel_webhook(channel_id)
+
+        plan = current_plan()
+        if plan is not None:
+            # Webhooks that would only be created by the dry run don't exist, stand the channel in for them
+            stand_in = f"channel-{channel_id}"
+            route = Route("POST", "/webhooks/{webhook_id}/{webhook_token}",
+                          webhook_id=webhook.id or stand_in, webhook_token=webhook.token or stand_in)
+            plan.record(route, RateLimiter(route.parameters["webhook_token"], self.rate_limiter.backend))
+            return None
+
+        try:
+            return execute_webhook(
+                webhook.url, message, username=username, avatar_url=avatar_url, wait=wait, timeout=timeout,
+                rate_limit_backend=self.rate_limiter.backend)
+        except requests.exceptions.HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+
+        # The webhook was deleted from Discord, drop it and try once more with a fresh one
+        logger.warning(f"Webhook {webhook} no longer exists, getting a new one")
+        with self._channel_webhooks_lock:
+            self._channel_webhooks.pop(channel_id, None)
+
+        webhook = self.get_channel_webhook(channel_id)
+        timeout = deadline.remaining() if deadline is not None else None
+        return execute_webhook(
+            webhook.url, message, username=username, avatar_url=avatar_url, wait=wait, timeout=timeout,
+            rate_limit_backend=self.rate_limiter.backend)
+
+    # endregion
+
+    # region Gateway
+
+    @property
+    def gateway(self) -> Optional[Gateway]:
+        return self._gateway
+
+    def connect_gateway(
+            self, *, intents: int = GatewayIntents.GUILDS | GatewayIntents.GUILD_MEMBERS,
+            shard_count: Optional[int] = None, shard_ids: Optional[Iterable[int]] = None,
+            request_members: bool = False, url: Optional[str] = None, max_concurrency: Optional[int] = None,
+            connect: Optional[Callable[[str], Any]] = None, wait: Optional[float] = None) -> Gateway:
+        """
+        Connect to the gateway and keep a cache of guilds, roles, channels and members current.
+
+        While a guild's shard is connected `get_guild`, `get_guild_roles`, `get_guild_channels` and `get_channel`
+        are served from the cache. Set `request_members` to fetch every member of each guild as it becomes
+        available, this needs the guild members intent, `iter_guild_members` is then served from the cache too once
+        all of a guild's members have arrived. If `wait` is set, waits that many seconds for every shard
+        to be ready.
+        """
+
+        if self._gateway is not None:
+            self._gateway.stop()
+
+        self._gateway = Gateway(
+            self, intents=intents, shard_count=shard_count, shard_ids=shard_ids, url=url, connect=connect,
+            request_members=request_members, max_concurrency=max_concurrency)
+        self._gateway.start()
+
+        if wait is not None and not self._gateway.wait_until_ready(wait):
+            logger.warning(f"Gateway not ready after {wait}s, reads will use the http api until it is")
+
+        return self._gateway
+
+    def disconnect_gateway(self) -> None:
+
+        if self._gateway is not None:
+            self._gateway.stop()
+            self._gateway = None
 
     # endregion
@@ -0,0 +1,66 @@
+"""Deadlines that bound the total time of API calls, including retries and rate limit waits."""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import time
+from typing import Iterator, Optional
+
+from .exceptions import DeadlineExceededError
+
+_current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar(
+    "pyaccord_deadline", default=None)
+
+
+class Deadline:
+    """A point in time by which an operation has to finish."""
+
+    expires_at: float
+
+    def __init__(self, timeout: float) -> None:
+        self.expires_at = time.monotonic() + timeout
+
+    def __repr__(self) -> str:
+        return f"<Deadline: {self.remaining():.3f}s remaining>"
+
+    def remaining(self) -> float:
+        """Seconds left, negative once the deadline has passed."""
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, action: str = "request") -> float:
+        """Return the seconds left, raising DeadlineExceededError if there are none."""
+
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceededError(f"Deadline exceeded before {action} could complete")
+        return remaining
+
+
+def current_deadline() -> Optional[Deadline]:
+    """The innermost deadline set with `deadline` in the current context."""
+    return _current_deadline.get()
+
+
+@contextlib.contextmanager
+def deadline(timeout: float) -> Iterator[Deadline]:
+    """
+    Bound every API call made inside the block to finish within `timeout` seconds of entering it.
+
+    Nested deadlines can only shorten the outer deadline, never extend it.
+    """
+
+    new_deadline = Deadline(timeout)
+    outer = _current_deadline.get()
+    if outer is not None and outer.expires_at < new_deadline.expires_at:
+        new_deadline = outer
+
+    token = _current_deadline.set(new_deadline)
+    try:
+        yield new_deadline
+    finally:
+        _current_deadline.reset(token)
@@ -1,3 +1,13 @@
 class NoPyaccordClientProvidedError(Exception):
     """Raised when there is no pyaccord client but one is required for the command."""
     pass
+
+
+class InvitePoolEmptyError(Exception):
+    """Raised when no invite could be taken from an invite pool in time."""
+    pass
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a request can no longer complete before its deadline."""
+    pass
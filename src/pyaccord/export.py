@@ -0,0 +1,184 @@
+"""Resumable export of channel message history to gzip compressed NDJSON files."""
+
+from __future__ import annotations
+
+import concurrent.futures
+import contextvars
+import datetime
+import gzip
+import json
+import logging
+import os
+from typing import Dict, Iterable, Optional, TYPE_CHECKING
+
+from .channel import BaseChannel
+from .snowflake import time_snowflake
+
+if TYPE_CHECKING:
+    from client import Client
+
+logger = logging.getLogger("DiscordAPI")
+
+
+class ChannelExporter:
+    """
+    Exports channel messages created between `start` and `end` to `<directory>/<channel id>.ndjson.gz`.
+
+    Messages are written oldest first, one JSON object per line, as they are paged in so memory use does not
+    depend on the size of the channel. Every `checkpoint_every` messages the current gzip member is closed and
+    the cursor and file length are saved to `<channel id>.checkpoint.json`. An interrupted export truncates the
+    file back to the last checkpoint and carries on from its cursor, the result is a valid multi-member gzip file.
+    """
+
+    def __init__(
+            self, client: Client, directory: str, *, start: Optional[datetime.datetime] = None,
+            end: Optional[datetime.datetime] = None, checkpoint_every: int = 1000, concurrency: int = 4) -> None:
+
+        self.client = client
+        self.directory = directory
+        self.start = start
+        self.end = end
+        self.checkpoint_every = checkpoint_every
+        self.concurrency = concurrency
+
+        # The API bounds are exclusive, start is inclusive and end is exclusive
+        self.after_id = time_snowflake(start) - 1 if start else 0
+        self.before_id = time_snowflake(end) if end else None
+
+        os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self) -> str:
+        return f"<ChannelExporter: {self.directory} from {self.start} to {self.end}>"
+
+    def output_path(self, channel_id: int) -> str:
+        return os.path.join(self.directory, f"{channel_id}.ndjson.gz")
+
+    def checkpoint_path(self, channel_id: int) -> str:
+        return os.path.join(self.directory, f"{channel_id}.checkpoint.json")
+
+    def _load_checkpoint(self, channel_id: int) -> Optional[dict]:
+
+        try:
+            with open(self.checkpoint_path(channel_id)) as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        if checkpoint["range"] != [self.after_id, self.before_id]:
+            raise ValueError(
+                f"Checkpoint for channel {channel_id} is for a different time range, remove "
+                f"{self.checkpoint_path(channel_id)} to start the export over")
+
+        return checkpoint
+
+    def _save_checkpoint(self, channel_id: int, *, cursor: int, offset: int, count: int, complete: bool) -> None:
+
+        checkpoint = {
+            "range": [self.after_id, self.before_id],
+            "cursor": cursor,
+            "offset": offset,
+            "count": count,
+            "complete": complete
+        }
+
+        # Write then rename so a crash never leaves a half written checkpoint
+        path = self.checkpoint_path(channel_id)
+        with open(path + ".tmp", "w") as f:
+            json.dump(checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def _output_size(self, channel_id: int) -> int:
+        """Size of the channel's export file, -1 if there isn't one."""
+
+        try:
+            return os.path.getsize(self.output_path(channel_id))
+        except FileNotFoundError:
+            return -1
+
+    def export_channel(self, channel: int | BaseChannel) -> int:
+        """Export a single channel, resuming from its checkpoint if there is one. Returns the message count."""
+
+        channel_id = channel.id if isinstance(channel, BaseChannel) else int(channel)
+
+        checkpoint = self._load_checkpoint(channel_id)
+        if checkpoint and self._output_size(channel_id) < checkpoint["offset"]:
+            # Resuming would pad the missing part of the file with zeros and leave it unreadable
+            logger.warning(f"Export file of channel {channel_id} is missing or shorter than its checkpoint, "
+                           f"starting the export over")
+            checkpoint = None
+
+        if checkpoint and checkpoint["complete"]:
+            logger.info(f"Export of channel {channel_id} already complete, skipping")
+            return checkpoint["count"]
+
+        cursor = checkpoint["cursor"] if checkpoint else self.after_id
+        offset = checkpoint["offset"] if checkpoint else 0
+        count = checkpoint["count"] if checkpoint else 0
+
+        if checkpoint:
+            logger.info(f"Resuming export of channel {channel_id} after message {cursor} ({count} exported)")
+
+        mode = "r+b" if checkpoint else "wb"
+        with open(self.output_path(channel_id), mode) as raw:
+            # Anything past the checkpoint is from an interrupted run and will be fetched again
+            raw.seek(offset)
+            raw.truncate()
+
+            member = gzip.GzipFile(fileobj=raw, mode="wb")
+            since_checkpoint = 0
+
+            for message in self.client.iter_channel_messages(
+                    channel_id, after=cursor, before=self.before_id, oldest_first=True):
+
+                member.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+                cursor = int(message["id"])
+                count += 1
+                since_checkpoint += 1
+
+                if since_checkpoint >= self.checkpoint_every:
+                    member.close()
+                    raw.flush()
+                    os.fsync(raw.fileno())
+                    self._save_checkpoint(channel_id, cursor=cursor, offset=raw.tell(), count=count, complete=False)
+                    member = gzip.GzipFile(fileobj=raw, mode="wb")
+                    since_checkpoint = 0
+
+            member.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+            self._save_checkpoint(channel_id, cursor=cursor, offset=raw.tell(), count=count, complete=True)
+
+        logger.info(f"Exported {count} messages from channel {channel_id}")
+
+        return count
+
+    def export_channels(self, channels: Iterable[int | BaseChannel]) -> Dict[int, int]:
+        """
+        Export several channels concurrently. Returns the message count of each channel.
+
+        Every channel is attempted, if any fail the first error is raised once the others have finished.
+        """
+
+        counts: Dict[int, int] = {}
+        error: Optional[BaseException] = None
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {}
+            for channel in channels:
+                channel_id = channel.id if isinstance(channel, BaseChannel) else int(channel)
+                futures[executor.submit(contextvars.copy_context().run, self.export_channel, channel_id)] = channel_id
+
+            for future in concurrent.futures.as_completed(futures):
+                channel_id = futures[future]
+                try:
+                    counts[channel_id] = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to export channel {channel_id}", exc_info=e)
+                    error = error or e
+
+        if error:
+            raise error
+
+        return counts
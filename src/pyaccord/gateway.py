@@ -0,0 +1,613 @@
+"""
+Optional Gateway websocket consumer that keeps a cache of guild state current from dispatch events.
+
+Needs the `websocket-client` package, install pyaccord with the `gateway` extra.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import random
+import threading
+import time
+from enum import IntEnum, IntFlag
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, TYPE_CHECKING
+
+from .url_functions import Route
+
+if TYPE_CHECKING:
+    from client import Client
+
+logger = logging.getLogger("DiscordAPI")
+
+GATEWAY_VERSION = 10
+
+# Close codes after which reconnecting would fail the same way
+FATAL_CLOSE_CODES = {4004, 4010, 4011, 4012, 4013, 4014}
+
+# Close codes after which the session can't be resumed and the shard has to identify again
+SESSION_CLOSE_CODES = {4007, 4009}
+
+# Each of a bot's `max_concurrency` identify slots can be used once per this many seconds
+IDENTIFY_INTERVAL = 5.0
+
+
+class GatewayOpcode(IntEnum):
+
+    DISPATCH = 0
+    HEARTBEAT = 1
+    IDENTIFY = 2
+    RESUME = 6
+    RECONNECT = 7
+    REQUEST_GUILD_MEMBERS = 8
+    INVALID_SESSION = 9
+    HELLO = 10
+    HEARTBEAT_ACK = 11
+
+
+class GatewayIntents(IntFlag):
+
+    GUILDS = 1 << 0
+    GUILD_MEMBERS = 1 << 1
+
+
+class GatewayClosedError(Exception):
+    """Raised by a transport when the websocket has been closed."""
+
+    def __init__(self, code: Optional[int] = None, reason: str = "") -> None:
+        super().__init__(f"Gateway closed with code {code}: {reason}")
+        self.code = code
+
+
+class WebSocketTransport:
+    """Websocket connection to the gateway, the default transport."""
+
+    def __init__(self, url: str) -> None:
+        try:
+            import websocket
+        except ImportError as e:
+            raise ImportError("The gateway needs websocket-client, install pyaccord[gateway]") from e
+
+        self._websocket = websocket
+        self._ws = websocket.create_connection(url, enable_multithread=True)
+
+    def send(self, data: str) -> None:
+        self._ws.send(data)
+
+    def recv(self) -> str:
+        try:
+            opcode, data = self._ws.recv_data(control_frame=False)
+        except self._websocket.WebSocketConnectionClosedException as e:
+            raise GatewayClosedError(None, str(e)) from e
+
+        if opcode == self._websocket.ABNF.OPCODE_CLOSE:
+            code = int.from_bytes(data[:2], "big") if len(data) >= 2 else None
+            raise GatewayClosedError(code, data[2:].decode(errors="replace"))
+
+        return data.decode() if isinstance(data, bytes) else data
+
+    def close(self, code: int = 1000) -> None:
+        self._ws.close(status=code)
+
+
+def shard_for_guild(guild_id: int, shard_count: int) -> int:
+    return (int(guild_id) >> 22) % shard_count
+
+
+class IdentifyLimiter:
+    """
+    Spaces out the IDENTIFYs of a bot's shards.
+
+    Shards with the same `shard_id % max_concurrency` share an identify slot, which can be used once every
+    IDENTIFY_INTERVAL seconds, so at most `max_concurrency` shards identify at a time.
+    """
+
+    def __init__(self, max_concurrency: int = 1) -> None:
+        self.max_concurrency = max(max_concurrency, 1)
+        self._lock = threading.Lock()
+        self._next: Dict[int, float] = {}
+
+    def wait(self, shard_id: int, stop: threading.Event) -> bool:
+        """Wait for the shard's turn to identify. Returns False if `stop` was set first."""
+
+        key = shard_id % self.max_concurrency
+        with self._lock:
+            now = time.monotonic()
+            at = max(self._next.get(key, now), now)
+            self._next[key] = at + IDENTIFY_INTERVAL
+
+        return not stop.wait(max(at - time.monotonic(), 0))
+
+
+class GatewayCache:
+    """Raw guild, role, channel and member dicts kept current from gateway dispatch events."""
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self.guilds: Dict[int, dict] = {}
+        self.roles: Dict[int, Dict[int, dict]] = {}
+        self.channels: Dict[int, Dict[int, dict]] = {}
+        self.members: Dict[int, Dict[int, dict]] = {}
+        self.channel_guilds: Dict[int, int] = {}
+        # Guilds every member chunk has arrived for, and the chunks received so far for the rest
+        self.members_complete: Set[int] = set()
+        self._member_chunks: Dict[int, Set[int]] = {}
+
+    def __repr__(self) -> str:
+        return f"<GatewayCache: {len(self.guilds)} guilds>"
+
+    # region Reads
+
+    def has_guild(self, guild_id: int) -> bool:
+        return int(guild_id) in self.guilds
+
+    def get_guild(self, guild_id: int) -> Optional[dict]:
+        with self._lock:
+            guild = self.guilds.get(int(guild_id))
+            if guild is None:
+                return None
+            return dict(guild, roles=list(self.roles.get(int(guild_id), {}).values()))
+
+    def get_roles(self, guild_id: int) -> Optional[List[dict]]:
+        with self._lock:
+            if int(guild_id) not in self.guilds:
+                return None
+            return list(self.roles.get(int(guild_id), {}).values())
+
+    def get_channels(self, guild_id: int) -> Optional[List[dict]]:
+        with self._lock:
+            if int(guild_id) not in self.guilds:
+                return None
+            return list(self.channels.get(int(guild_id), {}).values())
+
+    def get_channel(self, channel_id: int) -> Optional[dict]:
+        with self._lock:
+            guild_id = self.channel_guilds.get(int(channel_id))
+            if guild_id is None:
+                return None
+            return self.channels[guild_id].get(int(channel_id))
+
+    def guild_of_channel(self, channel_id: int) -> Optional[int]:
+        return self.channel_guilds.get(int(channel_id))
+
+    def get_members(self, guild_id: int) -> Optional[List[dict]]:
+        """The guild's members, or None if they haven't all been received."""
+
+        with self._lock:
+            if int(guild_id) not in self.guilds or int(guild_id) not in self.members_complete:
+                return None
+            return list(self.members.get(int(guild_id), {}).values())
+
+    # endregion
+
+    # region Updates
+
+    def handle(self, event: str, data: Any) -> None:
+        """Apply a dispatch event to the cache, events that don't affect it are ignored."""
+
+        handler = getattr(self, f"_on_{event.lower()}", None)
+        if handler is not None:
+            with self._lock:
+                handler(data)
+
+    def _set_channel(self, guild_id: int, channel: dict) -> None:
+        channel = dict(channel, guild_id=str(guild_id))
+        channel.setdefault("permission_overwrites", [])
+        channel.setdefault("position", None)
+        self.channels.setdefault(guild_id, {})[int(channel["id"])] = channel
+        self.channel_guilds[int(channel["id"])] = guild_id
+
+    def _set_member(self, guild_id: int, member: dict) -> None:
+        self.members.setdefault(guild_id, {})[int(member["user"]["id"])] = member
+
+    def clear_shard(self, shard_id: int, shard_count: int) -> None:
+        """Forget every guild of a shard, for when it starts a new session and gets sent them all again."""
+
+        with self._lock:
+            for guild_id in [g for g in self.guilds if shard_for_guild(g, shard_count) == shard_id]:
+                self._on_guild_delete({"id": guild_id})
+
+    def _on_guild_create(self, data: dict) -> None:
+        guild_id = int(data["id"])
+        if data.get("unavailable"):
+            return
+
+        self._on_guild_delete({"id": guild_id})
+
+        self.guilds[guild_id] = {k: v for k, v in data.items() if k not in ("roles", "channels", "members")}
+        self.roles[guild_id] = {int(r["id"]): r for r in data.get("roles", [])}
+        for channel in data.get("channels", []):
+            self._set_channel(guild_id, channel)
+        for member in data.get("members", []):
+            self._set_member(guild_id, member)
+
+    def _on_guild_update(self, data: dict) -> None:
+        guild_id = int(data["id"])
+        if guild_id in self.guilds:
+            self.guilds[guild_id].update({k: v for k, v in data.items() if k not in ("roles", "channels", "members")})
+        if "roles" in data:
+            self.roles[guild_id] = {int(r["id"]): r for r in data["roles"]}
+
+    def _on_guild_delete(self, data: dict) -> None:
+        guild_id = int(data["id"])
+        self.guilds.pop(guild_id, None)
+        self.roles.pop(guild_id, None)
+        self.members.pop(guild_id, None)
+        self.members_complete.discard(guild_id)
+        self._member_chunks.pop(guild_id, None)
+        for channel_id in self.channels.pop(guild_id, {}):
+            self.channel_guilds.pop(channel_id, None)
+
+    def _on_guild_role_create(self, data: dict) -> None:
+        self.roles.setdefault(int(data["guild_id"]), {})[int(data["role"]["id"])] = data["role"]
+
+    _on_guild_role_update = _on_guild_role_create
+
+    def _on_guild_role_delete(self, data: dict) -> None:
+        guild_id = int(data["guild_id"])
+        self.roles.get(guild_id, {}).pop(int(data["role_id"]), None)
+        for member in self.members.get(guild_id, {}).values():
+            if data["role_id"] in member.get("roles", []):
+                member["roles"] = [r for r in member["roles"] if r != data["role_id"]]
+
+    def _on_channel_create(self, data: dict) -> None:
+        if data.get("guild_id"):
+            self._set_channel(int(data["guild_id"]), data)
+
+    _on_channel_update = _on_channel_create
+
+    def _on_channel_delete(self, data: dict) -> None:
+        guild_id = self.channel_guilds.pop(int(data["id"]), None)
+        if guild_id is not None:
+            self.channels.get(guild_id, {}).pop(int(data["id"]), None)
+
+    def _on_guild_member_add(self, data: dict) -> None:
+        self._set_member(int(data["guild_id"]), {k: v for k, v in data.items() if k != "guild_id"})
+
+    def _on_guild_member_update(self, data: dict) -> None:
+        guild_id = int(data["guild_id"])
+        members = self.members.setdefault(guild_id, {})
+        user_id = int(data["user"]["id"])
+        update = {k: v for k, v in data.items() if k != "guild_id"}
+        members[user_id] = dict(members.get(user_id, {}), **update)
+
+    def _on_guild_member_remove(self, data: dict) -> None:
+        self.members.get(int(data["guild_id"]), {}).pop(int(data["user"]["id"]), None)
+
+    def _on_guild_members_chunk(self, data: dict) -> None:
+        guild_id = int(data["guild_id"])
+        for member in data.get("members", []):
+            self._set_member(guild_id, member)
+
+        chunks = self._member_chunks.setdefault(guild_id, set())
+        chunks.add(data.get("chunk_index", 0))
+        if len(chunks) >= data.get("chunk_count", 1):
+            self.members_complete.add(guild_id)
+            del self._member_chunks[guild_id]
+
+    # endregion
+
+
+class GatewayShard:
+    """A single shard's gateway connection, run on its own thread."""
+
+    def __init__(
+            self, token: str, *, intents: int, shard_id: int, shard_count: int, url: str, cache: GatewayCache,
+            connect: Callable[[str], Any], request_members: bool = False,
+            listeners: Optional[List[Callable[[str, Any], None]]] = None,
+            identify_limiter: Optional[IdentifyLimiter] = None) -> None:
+
+        self.token = token
+        self.intents = intents
+        self.shard_id = shard_id
+        self.shard_count = shard_count
+        self.url = url
+        self.cache = cache
+        self.connect = connect
+        self.request_members = request_members
+        self.listeners = listeners if listeners is not None else []
+        self.identify_limiter = identify_limiter if identify_limiter is not None else IdentifyLimiter()
+
+        self.session_id: Optional[str] = None
+        self.resume_url: Optional[str] = None
+        self.sequence: Optional[int] = None
+
+        self.ready = threading.Event()
+        self.latency: Optional[float] = None
+
+        self._transport: Optional[Any] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._send_lock = threading.Lock()
+
+        self._heartbeat_interval = 0.0
+        self._heartbeat_acked = True
+        self._heartbeat_sent_at = 0.0
+
+    def __repr__(self) -> str:
+        return f"<GatewayShard: {self.shard_id}/{self.shard_count}{' ready' if self.ready.is_set() else ''}>"
+
+    @property
+    def live(self) -> bool:
+        """Connected, and has received everything the gateway has sent since connecting."""
+        return self.ready.is_set()
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"pyaccord-gateway-{self.shard_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self.ready.clear()
+        transport = self._transport
+        if transport is not None:
+            try:
+                transport.close()
+            except Exception:
+                pass
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def send(self, op: int, d: Any) -> None:
+        transport = self._transport
+        if transport is None:
+            raise GatewayClosedError(None, "Not connected")
+        with self._send_lock:
+            transport.send(json.dumps({"op": int(op), "d": d}))
+
+    def request_guild_members(self, guild_id: int) -> None:
+        """Ask for every member of the guild, they arrive as GUILD_MEMBERS_CHUNK events."""
+        self.send(GatewayOpcode.REQUEST_GUILD_MEMBERS, {"guild_id": str(guild_id), "query": "", "limit": 0})
+
+    # region Connection
+
+    def _gateway_url(self) -> str:
+        base = self.resume_url if self.session_id and self.resume_url else self.url
+        return f"{base.rstrip('/')}/?v={GATEWAY_VERSION}&encoding=json"
+
+    def _run(self) -> None:
+
+        backoff = 1.0
+
+        while not self._stop.is_set():
+            if not self._resumable() and not self.identify_limiter.wait(self.shard_id, self._stop):
+                break
+
+            try:
+                self._transport = self.connect(self._gateway_url())
+                self._session()
+                backoff = 1.0
+            except GatewayClosedError as e:
+                if e.code in SESSION_CLOSE_CODES:
+                    logger.warning(f"Gateway shard {self.shard_id} session ended with code {e.code}, identifying again")
+                    self._forget_session()
+
+                if e.code in FATAL_CLOSE_CODES:
+                    logger.error(f"Gateway shard {self.shard_id} closed with fatal code {e.code}, stopping")
+                    self._stop.set()
+                elif self.ready.is_set():
+                    # The connection was healthy, reconnect straight away
+                    logger.warning(f"Gateway shard {self.shard_id} disconnected ({e}), reconnecting")
+                    backoff = 1.0
+                elif not self._stop.is_set():
+                    # Closed before it was ready, back off so a failing gateway doesn't use up the identify budget
+                    logger.warning(f"Gateway shard {self.shard_id} disconnected ({e}), reconnecting in {backoff}s")
+                    self._stop.wait(backoff)
+                    backoff = min(backoff * 2, 60)
+            except Exception as e:
+                if not self._stop.is_set():
+                    logger.error(f"Gateway shard {self.shard_id} connection failed", exc_info=e)
+                    self._stop.wait(backoff)
+                    backoff = min(backoff * 2, 60)
+            finally:
+                self.ready.clear()
+                transport, self._transport = self._transport, None
+                if transport is not None:
+                    try:
+                        # A non 1000 close keeps the session resumable
+                        transport.close(4000)
+                    except Exception:
+                        pass
+
+    def _resumable(self) -> bool:
+        return bool(self.session_id) and self.sequence is not None
+
+    def _forget_session(self) -> None:
+        self.session_id = None
+        self.sequence = None
+        self.resume_url = None
+
+    def _session(self) -> None:
+        """Run one websocket connection until it closes."""
+
+        hello = json.loads(self._transport.recv())
+        if hello["op"] != GatewayOpcode.HELLO:
+            raise GatewayClosedError(None, f"Expected HELLO, got op {hello['op']}")
+
+        self._heartbeat_interval = hello["d"]["heartbeat_interval"] / 1000
+        self._heartbeat_acked = True
+        heartbeat_stop = threading.Event()
+        threading.Thread(target=self._heartbeat_loop, args=(heartbeat_stop,), daemon=True,
+                         name=f"pyaccord-gateway-heartbeat-{self.shard_id}").start()
+
+        try:
+            if self._resumable():
+                logger.info(f"Resuming gateway session on shard {self.shard_id}")
+                self.send(GatewayOpcode.RESUME,
+                          {"token": self.token, "session_id": self.session_id, "seq": self.sequence})
+            else:
+                self._identify()
+
+            while not self._stop.is_set():
+                self._handle(json.loads(self._transport.recv()))
+        finally:
+            heartbeat_stop.set()
+
+    def _identify(self) -> None:
+        self.send(GatewayOpcode.IDENTIFY, {
+            "token": self.token,
+            "intents": int(self.intents),
+            "shard": [self.shard_id, self.shard_count],
+            "properties": {"os": "linux", "browser": "pyaccord", "device": "pyaccord"}
+        })
+
+    def _heartbeat_loop(self, stop: threading.Event) -> None:
+
+        # The first heartbeat is jittered so a fleet of reconnecting shards doesn't beat in sync
+        if stop.wait(self._heartbeat_interval * random.random()):
+            return
+
+        while not stop.is_set():
+            if not self._heartbeat_acked:
+                logger.warning(f"Gateway shard {self.shard_id} missed a heartbeat ack, reconnecting")
+                transport = self._transport
+                if transport is not None:
+                    transport.close(4000)
+                return
+
+            self._heartbeat()
+
+            if stop.wait(self._heartbeat_interval):
+                return
+
+    def _heartbeat(self) -> None:
+        self._heartbeat_acked = False
+        self._heartbeat_sent_at = time.monotonic()
+        try:
+            self.send(GatewayOpcode.HEARTBEAT, self.sequence)
+        except Exception as e:
+            logger.debug(f"Failed to send heartbeat on shard {self.shard_id}: {e}")
+
+    def _handle(self, payload: dict) -> None:
+
+        op = payload["op"]
+
+        if op == GatewayOpcode.DISPATCH:
+            if payload.get("s") is not None:
+                self.sequence = payload["s"]
+            self._dispatch(payload["t"], payload["d"])
+
+        elif op == GatewayOpcode.HEARTBEAT:
+            self._heartbeat()
+
+        elif op == GatewayOpcode.HEARTBEAT_ACK:
+            self._heartbeat_acked = True
+            self.latency = time.monotonic() - self._heartbeat_sent_at
+
+        elif op == GatewayOpcode.RECONNECT:
+            raise GatewayClosedError(None, "Gateway asked for a reconnect")
+
+        elif op == GatewayOpcode.INVALID_SESSION:
+            if not payload["d"]:
+                self._forget_session()
+            # Discord asks for a random wait of 1 to 5 seconds before identifying again
+            self._stop.wait(random.uniform(1, 5))
+            raise GatewayClosedError(None, "Invalid session")
+
+    def _dispatch(self, event: str, data: Any) -> None:
+
+        if event == "READY":
+            # A new session, guilds the bot left while disconnected won't be sent again
+            self.cache.clear_shard(self.shard_id, self.shard_count)
+            self.session_id = data["session_id"]
+            self.resume_url = data.get("resume_gateway_url")
+            self.ready.set()
+            logger.info(f"Gateway shard {self.shard_id} ready")
+        elif event == "RESUMED":
+            self.ready.set()
+            logger.info(f"Gateway shard {self.shard_id} resumed")
+
+        self.cache.handle(event, data)
+
+        if event == "GUILD_CREATE" and self.request_members and not data.get("unavailable"):
+            self.request_guild_members(int(data["id"]))
+
+        for listener in self.listeners:
+            try:
+                listener(event, data)
+            except Exception as e:
+                logger.error(f"Gateway listener failed on {event}", exc_info=e)
+
+    # endregion
+
+
+class Gateway:
+    """
+    Runs gateway shards for a client and keeps a shared GatewayCache current.
+
+    Only the given `shard_ids` are run, so shards of a large bot can be split between processes. Shards identify
+    at most `max_concurrency` at a time every IDENTIFY_INTERVAL seconds, Discord's session start limit.
+    """
+
+    def __init__(
+            self, client: Client, *, intents: int = GatewayIntents.GUILDS | GatewayIntents.GUILD_MEMBERS,
+            shard_count: Optional[int] = None, shard_ids: Optional[Iterable[int]] = None, url: Optional[str] = None,
+            connect: Optional[Callable[[str], Any]] = None, request_members: bool = False,
+            max_concurrency: Optional[int] = None) -> None:
+
+        self.client = client
+        self.intents = intents
+        self.shard_count = shard_count
+        self.shard_ids = list(shard_ids) if shard_ids is not None else None
+        self.url = url
+        self.connect = connect if connect is not None else WebSocketTransport
+        self.request_members = request_members
+        self.max_concurrency = max_concurrency
+
+        self.cache = GatewayCache()
+        self.shards: Dict[int, GatewayShard] = {}
+        self.listeners: List[Callable[[str, Any], None]] = []
+
+    def __repr__(self) -> str:
+        return f"<Gateway: {len(self.shards)} shards, {self.cache}>"
+
+    def start(self) -> None:
+        """Connect every shard. The gateway url and shard count are fetched from Discord if not given."""
+
+        if self.url is None or self.shard_count is None:
+            r = self.client._request(Route("GET", "/gateway/bot"))
+            info = r.json()
+            self.url = self.url or info["url"]
+            self.shard_count = self.shard_count or info["shards"]
+            self.max_concurrency = self.max_concurrency or info["session_start_limit"]["max_concurrency"]
+
+        # Shared by every shard, so reconnects that identify again are spaced out too
+        identify_limiter = IdentifyLimiter(self.max_concurrency or 1)
+
+        shard_ids = self.shard_ids if self.shard_ids is not None else range(self.shard_count)
+
+        for shard_id in shard_ids:
+            shard = GatewayShard(
+                self.client.bot_token, intents=self.intents, shard_id=shard_id, shard_count=self.shard_count,
+                url=self.url, cache=self.cache, connect=self.connect, request_members=self.request_members,
+                listeners=self.listeners, identify_limiter=identify_limiter)
+            self.shards[shard_id] = shard
+            shard.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        for shard in self.shards.values():
+            shard.stop(timeout)
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Wait for every shard to be ready. Returns whether they all were in time."""
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for shard in self.shards.values():
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if not shard.ready.wait(remaining):
+                return False
+        return True
+
+    def add_listener(self, listener: Callable[[str, Any], None]) -> None:
+        """Call `listener(event, data)` for every dispatch event, after the cache has been updated."""
+        self.listeners.append(listener)
+
+    def is_live(self, guild_id: int) -> bool:
+        """Whether the cache for the guild is being kept current by a connected shard."""
+
+        if not self.shard_count:
+            return False
+        shard = self.shards.get(shard_for_guild(guild_id, self.shard_count))
+        return shard is not None and shard.live and self.cache.has_guild(guild_id)
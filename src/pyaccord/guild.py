@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from typing import Dict, List, Optional, TYPE_CHECKING
+from .assets import asset_url
 from .channel import Channel
 from .role import Role
 from .exceptions import NoPyaccordClientProvidedError
@@ -14,6 +15,7 @@ class Guild:
 
     id: int
     name: str
+    icon: Optional[str]
     _roles: Optional[List[Role]]
     _channels: Optional[List[Channel]]
     _public_updates_channel_id: Optional[int]
@@ -28,6 +30,7 @@ class Guild:
         guild = Guild(
             id=d["id"],
             name=d["name"],
+            icon=d.get("icon"),
             client=client,
             **kwargs
         )
@@ -45,14 +48,26 @@ class Guild:
 
         return guilds
 
-    def __init__(self, id: int, name: str, *, client: Optional[Client] = None) -> None:
+    def __init__(self, id: int, name: str, *, icon: Optional[str] = None, client: Optional[Client] = None) -> None:
         self.id = id
         self.name = name
+        self.icon = icon
         self._client = client
 
     def __repr__(self) -> str:
         return f"<Guild: {self.name} #{self.id}>"
 
+    def __getstate__(self) -> dict:
+        return dict(self.__dict__, _client=None)
+
+    def icon_url(self, *, size: Optional[int] = None, format: Optional[str] = None) -> Optional[str]:
+        """The CDN url of the guild's icon, or None if it has no icon."""
+
+        if not self.icon:
+            return None
+
+        return asset_url(f"icons/{self.id}", self.icon, size=size, format=format)
+
     def create_role(self,
                     name: Optional[str] = None, *,
                     permissions: Optional[int] = None,
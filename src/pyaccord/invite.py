@@ -1,4 +1,3 @@
-
 from __future__ import annotations
 from typing import Dict, Optional, TYPE_CHECKING
 
@@ -9,19 +8,36 @@ if TYPE_CHECKING:
 class Invite:
 
     code: str
+    max_age: Optional[int]
+    max_uses: Optional[int]
+    temporary: Optional[bool]
     _client: Optional[Client]
 
     @property
     def full_url(self) -> str:
         return f"https://discord.gg/{self.code}"
 
-    def __init__(self, code: str, *, client: Optional[Client] = None) -> None:
+    def __init__(
+            self, code: str, *, max_age: Optional[int] = None, max_uses: Optional[int] = None,
+            temporary: Optional[bool] = None, client: Optional[Client] = None) -> None:
         self.code = code
+        self.max_age = max_age
+        self.max_uses = max_uses
+        self.temporary = temporary
         self._client = client
 
+    def __repr__(self) -> str:
+        return f"<Invite: {self.code}>"
+
+    def __getstate__(self) -> dict:
+        return dict(self.__dict__, _client=None)
+
     @staticmethod
     def from_dict(d: Dict, *, client: Optional[Client] = None) -> Invite:
         return Invite(
             code=d["code"],
+            max_age=d.get("max_age"),
+            max_uses=d.get("max_uses"),
+            temporary=d.get("temporary"),
             client=client
         )
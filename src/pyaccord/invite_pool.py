@@ -0,0 +1,204 @@
+"""Pool of pre-created channel invites that is refilled in the background."""
+
+from __future__ import annotations
+
+import collections
+import contextvars
+import logging
+import threading
+import time
+from typing import Deque, Optional, Tuple, TYPE_CHECKING
+
+import requests
+
+from .channel import BaseChannel
+from .exceptions import InvitePoolEmptyError
+from .invite import Invite
+
+if TYPE_CHECKING:
+    from client import Client
+
+logger = logging.getLogger("DiscordAPI")
+
+# Longest wait between attempts after repeated failures to create an invite
+MAX_FAILURE_BACKOFF = 60.0
+
+
+class InvitePool:
+    """
+    Holds up to `size` unique invites for a channel so they can be handed out without an API call.
+
+    A daemon thread creates invites one at a time, at most one every `refill_interval` seconds, so refilling
+    never bursts against the invites bucket. Invites are dropped `expiry_margin` seconds before their
+    `max_age` runs out so a handed out invite is always still usable.
+    """
+
+    def __init__(
+            self, client: Client, channel: int | BaseChannel, *, size: int = 10, max_age: int = 86400,
+            max_uses: int = 1, temporary: Optional[bool] = None, expiry_margin: float = 60,
+            refill_interval: float = 1.0, start: bool = True) -> None:
+
+        if size < 1:
+            raise ValueError("Invite pool size must be at least 1")
+        if max_age and max_age <= expiry_margin:
+            raise ValueError("Invite max_age must be longer than the pool's expiry_margin")
+
+        self.client = client
+        self.channel_id = channel.id if isinstance(channel, BaseChannel) else channel
+        self.size = size
+        self.max_age = max_age
+        self.max_uses = max_uses
+        self.temporary = temporary
+        self.expiry_margin = expiry_margin
+        self.refill_interval = refill_interval
+
+        # (monotonic expiry time or None, invite), oldest first so expired invites are always at the left
+        self._invites: Deque[Tuple[Optional[float], Invite]] = collections.deque()
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        if start:
+            self.start()
+
+    def __repr__(self) -> str:
+        return f"<InvitePool: channel #{self.channel_id} {len(self)}/{self.size}>"
+
+    def __len__(self) -> int:
+        with self._condition:
+            self._drop_expired()
+            return len(self._invites)
+
+    def __enter__(self) -> InvitePool:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        """Start the background refill thread."""
+
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        # Refills are made in the starting context, so they keep its deadline, priority and dry run
+        self._thread = threading.Thread(
+            target=contextvars.copy_context().run, args=(self._refill_loop,),
+            name=f"pyaccord-invite-pool-{self.channel_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the background refill thread. Invites already in the pool can still be taken."""
+
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def get(self, *, block: bool = True, timeout: Optional[float] = None) -> Invite:
+        """
+        Take the next invite from the pool.
+
+        If the pool is empty and `block` is set, waits up to `timeout` seconds for the refill thread.
+        Raises InvitePoolEmptyError if no invite is available.
+        """
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        with self._condition:
+            while True:
+                self._drop_expired()
+                if self._invites:
+                    _, invite = self._invites.popleft()
+                    # Wake the refill thread now that there is room
+                    self._condition.notify_all()
+                    return invite
+
+                if not block or self._stop.is_set():
+                    raise InvitePoolEmptyError(f"No invites available for channel {self.channel_id}")
+
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    raise InvitePoolEmptyError(f"Timed out waiting for an invite for channel {self.channel_id}")
+
+                self._condition.wait(remaining)
+
+    def _drop_expired(self) -> None:
+        """Remove invites that are about to expire. Caller must hold the condition."""
+
+        now = time.monotonic()
+        while self._invites:
+            expires_at = self._invites[0][0]
+            if expires_at is None or expires_at > now:
+                break
+            _, invite = self._invites.popleft()
+            logger.debug(f"Dropped invite {invite.code} from pool for channel {self.channel_id}, close to expiry")
+
+    def _next_wakeup(self) -> Optional[float]:
+        """Seconds until the oldest invite expires. Caller must hold the condition."""
+
+        if not self._invites or self._invites[0][0] is None:
+            return None
+        return max(self._invites[0][0] - time.monotonic(), 0)
+
+    def _create_invite(self) -> Tuple[Optional[float], Invite]:
+        invite = self.client.create_channel_invite(
+            self.channel_id, max_age=self.max_age, max_uses=self.max_uses, temporary=self.temporary, unique=True)
+        expires_at = time.monotonic() + self.max_age - self.expiry_margin if self.max_age else None
+        return (expires_at, invite)
+
+    def _refill_loop(self) -> None:
+
+        try:
+            self._refill()
+        finally:
+            # Whatever stopped the thread, don't leave callers of get() waiting for invites that will never come
+            self._stop.set()
+            with self._condition:
+                self._condition.notify_all()
+
+    def _failure_backoff(self, failures: int) -> float:
+        return min(max(5 * self.refill_interval, 1.0) * 2 ** (failures - 1), MAX_FAILURE_BACKOFF)
+
+    def _refill(self) -> None:
+
+        failures = 0
+
+        while not self._stop.is_set():
+            with self._condition:
+                self._drop_expired()
+                while len(self._invites) >= self.size and not self._stop.is_set():
+                    self._condition.wait(self._next_wakeup())
+                    self._drop_expired()
+
+            if self._stop.is_set():
+                return
+
+            delay = self.refill_interval
+            try:
+                entry = self._create_invite()
+            except requests.exceptions.HTTPError as e:
+                failures += 1
+                if e.response is not None and e.response.status_code == 429:
+                    retry_after = float(e.response.headers.get("Retry-After", self.refill_interval))
+                    logger.warning(f"Rate limited refilling invite pool for channel {self.channel_id}, "
+                                   f"retrying in {retry_after}s")
+                    delay = max(delay, retry_after)
+                else:
+                    logger.error(f"Failed to create invite for pool of channel {self.channel_id}", exc_info=e)
+                    delay = max(delay, self._failure_backoff(failures))
+            except Exception as e:
+                # Includes DeadlineExceededError when the invites bucket is blocked past the client's timeout
+                failures += 1
+                delay = max(delay, self._failure_backoff(failures))
+                logger.error(f"Failed to create invite for pool of channel {self.channel_id}, "
+                             f"retrying in {delay}s", exc_info=e)
+            else:
+                failures = 0
+                with self._condition:
+                    self._invites.append(entry)
+                    self._condition.notify_all()
+
+            self._stop.wait(delay)
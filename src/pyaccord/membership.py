@@ -0,0 +1,245 @@
+"""Compact index of which guild members have which roles."""
+
+from __future__ import annotations
+
+import bisect
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+# Positions of the set bits of every byte value
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+class MembershipIndex:
+    """
+    Member by role index for a guild, sized for hundreds of thousands of members.
+
+    Every member is given a slot number. Member ids are kept in a sorted `array` alongside their slots for
+    bisect lookups, and each role is a `bytearray` bitmap of the slots of its members, so 200k members with 100
+    roles take a few megabytes. Role set operations convert the bitmaps to ints and use bitwise operators.
+    """
+
+    guild_id: int
+
+    def __init__(self, guild_id: int) -> None:
+        self.guild_id = guild_id
+
+        self._member_ids = array("Q")     # sorted member ids
+        self._member_slots = array("L")   # slot of the member at the same position in _member_ids
+        self._slot_ids = array("Q")       # member id in each slot, 0 for free slots
+        self._free_slots = array("L")
+        self._roles: Dict[int, bytearray] = {}  # role id to bitmap of member slots
+
+        self._lock = threading.RLock()
+
+    def __repr__(self) -> str:
+        return f"<MembershipIndex: guild #{self.guild_id} {len(self)} members {len(self._roles)} roles>"
+
+    def __len__(self) -> int:
+        return len(self._member_ids)
+
+    def __contains__(self, member_id: int) -> bool:
+        return self._slot(int(member_id)) is not None
+
+    @staticmethod
+    def from_members(guild_id: int, members: Iterable[dict]) -> MembershipIndex:
+        """Build an index from guild member dicts, as returned by the list guild members endpoint."""
+
+        index = MembershipIndex(guild_id)
+        index.add_members(members)
+
+        return index
+
+    # region Updates
+
+    def add_members(self, members: Iterable[dict]) -> None:
+        """Add or replace members from guild member dicts."""
+
+        with self._lock:
+            for member in members:
+                self.set_member_roles(int(member["user"]["id"]), [int(r) for r in member.get("roles", [])])
+
+    def set_member_roles(self, member_id: int, role_ids: Iterable[int]) -> None:
+        """Add the member if needed and replace its roles."""
+
+        with self._lock:
+            slot = self._slot(member_id)
+            if slot is None:
+                slot = self._insert(member_id)
+            else:
+                self._clear_slot(slot)
+
+            for role_id in role_ids:
+                self._set_bit(role_id, slot)
+
+    def add_role(self, member_id: int, role_id: int) -> None:
+
+        with self._lock:
+            slot = self._slot(member_id)
+            if slot is None:
+                slot = self._insert(member_id)
+            self._set_bit(role_id, slot)
+
+    def remove_role(self, member_id: int, role_id: int) -> None:
+
+        with self._lock:
+            slot = self._slot(member_id)
+            bitmap = self._roles.get(role_id)
+            if slot is None or bitmap is None or slot >> 3 >= len(bitmap):
+                return
+            bitmap[slot >> 3] &= ~(1 << (slot & 7))
+
+    def remove_member(self, member_id: int) -> None:
+
+        with self._lock:
+            position = self._position(member_id)
+            if position is None:
+                return
+
+            slot = self._member_slots[position]
+            self._clear_slot(slot)
+
+            del self._member_ids[position]
+            del self._member_slots[position]
+            self._slot_ids[slot] = 0
+            self._free_slots.append(slot)
+
+    def remove_role_entirely(self, role_id: int) -> None:
+        """Forget a deleted role."""
+
+        with self._lock:
+            self._roles.pop(role_id, None)
+
+    # endregion
+
+    # region Queries
+
+    @property
+    def role_ids(self) -> List[int]:
+        return list(self._roles)
+
+    def member_ids(self) -> array:
+        """All member ids in ascending order."""
+
+        with self._lock:
+            return array("Q", self._member_ids)
+
+    def member_roles(self, member_id: int) -> List[int]:
+        """Roles the member has, the @everyone role is not included."""
+
+        with self._lock:
+            slot = self._slot(member_id)
+            if slot is None:
+                return []
+            return [role_id for role_id in self._roles if self._has_bit(role_id, slot)]
+
+    def has_role(self, member_id: int, role_id: int) -> bool:
+
+        with self._lock:
+            slot = self._slot(member_id)
+            return slot is not None and self._has_bit(role_id, slot)
+
+    def role_members(self, role_id: int) -> array:
+        """Ids of the role's members in ascending order."""
+
+        with self._lock:
+            return self._to_ids(self._bitmap(role_id))
+
+    def count(self, role_id: int) -> int:
+        return bin(self._bitmap(role_id)).count("1")
+
+    def intersection(self, *role_ids: int) -> array:
+        """Members that have every one of the roles."""
+
+        with self._lock:
+            if not role_ids:
+                return array("Q")
+            bitmap = self._bitmap(role_ids[0])
+            for role_id in role_ids[1:]:
+                bitmap &= self._bitmap(role_id)
+            return self._to_ids(bitmap)
+
+    def union(self, *role_ids: int) -> array:
+        """Members that have any of the roles."""
+
+        with self._lock:
+            bitmap = 0
+            for role_id in role_ids:
+                bitmap |= self._bitmap(role_id)
+            return self._to_ids(bitmap)
+
+    def difference(self, role_id: int, *excluded_role_ids: int) -> array:
+        """Members that have the first role but none of the others."""
+
+        with self._lock:
+            bitmap = self._bitmap(role_id)
+            for excluded in excluded_role_ids:
+                bitmap &= ~self._bitmap(excluded)
+            return self._to_ids(bitmap)
+
+    # endregion
+
+    # region Internals
+
+    def _position(self, member_id: int) -> Optional[int]:
+        position = bisect.bisect_left(self._member_ids, member_id)
+        if position < len(self._member_ids) and self._member_ids[position] == member_id:
+            return position
+        return None
+
+    def _slot(self, member_id: int) -> Optional[int]:
+        position = self._position(member_id)
+        return self._member_slots[position] if position is not None else None
+
+    def _insert(self, member_id: int) -> int:
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._slot_ids[slot] = member_id
+        else:
+            slot = len(self._slot_ids)
+            self._slot_ids.append(member_id)
+
+        position = bisect.bisect_left(self._member_ids, member_id)
+        self._member_ids.insert(position, member_id)
+        self._member_slots.insert(position, slot)
+
+        return slot
+
+    def _set_bit(self, role_id: int, slot: int) -> None:
+        bitmap = self._roles.get(role_id)
+        if bitmap is None:
+            bitmap = self._roles[role_id] = bytearray()
+        if slot >> 3 >= len(bitmap):
+            bitmap.extend(bytes((slot >> 3) - len(bitmap) + 1))
+        bitmap[slot >> 3] |= 1 << (slot & 7)
+
+    def _has_bit(self, role_id: int, slot: int) -> bool:
+        bitmap = self._roles.get(role_id)
+        return bitmap is not None and slot >> 3 < len(bitmap) and bool(bitmap[slot >> 3] >> (slot & 7) & 1)
+
+    def _bitmap(self, role_id: int) -> int:
+        bitmap = self._roles.get(role_id)
+        return int.from_bytes(bitmap, "little") if bitmap else 0
+
+    def _clear_slot(self, slot: int) -> None:
+        index, mask = slot >> 3, ~(1 << (slot & 7)) & 0xFF
+        for bitmap in self._roles.values():
+            if index < len(bitmap):
+                bitmap[index] &= mask
+
+    def _to_ids(self, bitmap: int) -> array:
+        """Convert a bitmap of slots to a sorted array of member ids."""
+
+        ids = array("Q")
+        slot_ids = self._slot_ids
+        # Walk the set bits a byte at a time, most bitmaps are sparse
+        data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+        for byte_index, byte in enumerate(data):
+            if byte:
+                base = byte_index * 8
+                ids.extend(slot_ids[base + bit] for bit in _BYTE_BITS[byte])
+
+        return array("Q", sorted(ids))
+
+    # endregion
@@ -0,0 +1,229 @@
+"""Dry runs that record the requests a job would make and estimate how long they would take."""
+
+from __future__ import annotations
+
+import collections
+import contextlib
+import contextvars
+import math
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .ratelimit import GLOBAL_RATE_LIMIT, RateLimiter
+from .url_functions import Route
+
+# Assumed for buckets no response has been seen for yet, most Discord routes allow about 5 requests per 5 seconds
+DEFAULT_BUCKET_LIMIT: Tuple[int, float] = (5, 5.0)
+
+# Assumed round trip time of a single request
+DEFAULT_REQUEST_LATENCY = 0.3
+
+# A GET route requested at least this many times in one plan is reported as a likely N+1 fetch
+N_PLUS_ONE_THRESHOLD = 10
+
+_current_plan: contextvars.ContextVar[Optional[RequestPlan]] = contextvars.ContextVar("pyaccord_plan", default=None)
+
+
+def current_plan() -> Optional[RequestPlan]:
+    """The plan requests are being recorded to instead of being sent, if in a dry run."""
+    return _current_plan.get()
+
+
+class PlannedRequest:
+    """A request recorded in a dry run."""
+
+    route: Route
+    bucket: str
+    bucket_known: bool
+    limit: Optional[Tuple[int, float]]
+
+    def __init__(self, route: Route, bucket: str, bucket_known: bool, limit: Optional[Tuple[int, float]]) -> None:
+        self.route = route
+        self.bucket = bucket
+        self.bucket_known = bucket_known
+        self.limit = limit
+
+    def __repr__(self) -> str:
+        return f"<PlannedRequest: {self.route}>"
+
+
+class BucketEstimate:
+    """The planned requests to one rate limit bucket and how long the bucket would take to let them through."""
+
+    bucket: str
+    routes: List[str]
+    count: int
+    limit: int
+    period: float
+    observed: bool
+    seconds: float
+
+    def __init__(self, bucket: str, requests: List[PlannedRequest], default_limit: Tuple[int, float]) -> None:
+        self.bucket = bucket
+        self.routes = sorted({r.route.key for r in requests})
+        self.count = len(requests)
+
+        known = next((r.limit for r in requests if r.limit is not None), None)
+        self.observed = known is not None
+        self.limit, self.period = known if known is not None else default_limit
+
+        # The first window's worth goes straight away, every further window waits out a full period
+        self.seconds = (math.ceil(self.count / self.limit) - 1) * self.period
+
+    def __repr__(self) -> str:
+        return (f"<BucketEstimate: {self.count} requests to {', '.join(self.routes)}, "
+                f"{self.limit}/{self.period}s{'' if self.observed else ' assumed'}, {self.seconds:.1f}s>")
+
+
+class _PlaceholderObject(dict):
+    """Stands in for an object response, fields that are read but missing are 0."""
+
+    def __missing__(self, key: str) -> Any:
+        return 0
+
+
+class PlaceholderResponse:
+    """Returned instead of a response in a dry run, lists are empty and objects have every field 0."""
+
+    status_code = 200
+    ok = True
+    reason = "Dry run"
+
+    def __init__(self, route: Route) -> None:
+        self.route = route
+        self.headers: Dict[str, str] = {}
+        self.is_list = _returns_list(route)
+        self.content = b"[]" if self.is_list else b"{}"
+
+    def __repr__(self) -> str:
+        return f"<PlaceholderResponse: {self.route}>"
+
+    def __enter__(self) -> PlaceholderResponse:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+    def json(self) -> Any:
+        return [] if self.is_list else _PlaceholderObject()
+
+    def iter_content(self, chunk_size: int = 1) -> Iterator[bytes]:
+        yield self.content
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def _returns_list(route: Route) -> bool:
+    """Whether a route returns a list, GETs of a collection rather than of one item by id."""
+
+    last = route.path.rstrip("/").rsplit("/", 1)[-1]
+    return route.method == "GET" and not last.startswith("{") and last.endswith("s")
+
+
+class RequestPlan:
+    """
+    The requests recorded in a dry run, grouped by rate limit bucket.
+
+    Time estimates use the limits seen in earlier responses for each bucket, or `default_limit` for buckets that
+    haven't been seen yet. Buckets are let through in parallel, bounded by the global rate limit and by
+    `concurrency` requests in flight at a time, each taking `request_latency` seconds.
+    """
+
+    concurrency: int
+    request_latency: float
+    default_limit: Tuple[int, float]
+    global_limit: int
+
+    def __init__(
+            self, *, concurrency: int = 1, request_latency: float = DEFAULT_REQUEST_LATENCY,
+            default_limit: Tuple[int, float] = DEFAULT_BUCKET_LIMIT, global_limit: int = GLOBAL_RATE_LIMIT) -> None:
+
+        self.concurrency = concurrency
+        self.request_latency = request_latency
+        self.default_limit = default_limit
+        self.global_limit = global_limit
+
+        self._requests: List[PlannedRequest] = []
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"<RequestPlan: {len(self)} requests, about {self.estimate():.1f}s>"
+
+    def __len__(self) -> int:
+        return len(self._requests)
+
+    @property
+    def requests(self) -> List[PlannedRequest]:
+        with self._lock:
+            return list(self._requests)
+
+    def record(self, route: Route, rate_limiter: RateLimiter) -> PlaceholderResponse:
+        """Record a request instead of sending it."""
+
+        bucket = rate_limiter.bucket(route.key, route.major)
+        limit = rate_limiter.backend.get_bucket_limit(rate_limiter.key, bucket) if bucket is not None else None
+        # Routes Discord hasn't reported a bucket for yet are assumed to each have their own
+        planned = PlannedRequest(route, bucket or f"{route.key}:{route.major}", bucket is not None, limit)
+
+        with self._lock:
+            self._requests.append(planned)
+
+        return PlaceholderResponse(route)
+
+    def buckets(self) -> List[BucketEstimate]:
+        """Estimates for each bucket, slowest first."""
+
+        grouped: Dict[str, List[PlannedRequest]] = collections.defaultdict(list)
+        for planned in self.requests:
+            grouped[planned.bucket].append(planned)
+
+        estimates = [BucketEstimate(bucket, requests, self.default_limit) for bucket, requests in grouped.items()]
+        return sorted(estimates, key=lambda e: e.seconds, reverse=True)
+
+    def estimate(self) -> float:
+        """Roughly how many seconds sending every recorded request would take."""
+
+        count = len(self)
+        if not count:
+            return 0.0
+
+        slowest_bucket = max(e.seconds for e in self.buckets())
+        global_wait = (math.ceil(count / self.global_limit) - 1) * 1.0
+        in_flight = count * self.request_latency / max(self.concurrency, 1)
+
+        return max(slowest_bucket, global_wait, in_flight)
+
+    def n_plus_one(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> Dict[str, int]:
+        """GET routes requested at least `threshold` times, usually one fetch per item of an earlier list."""
+
+        counts = collections.Counter(p.route.key for p in self.requests if p.route.method == "GET")
+        return {route_key: n for route_key, n in counts.most_common() if n >= threshold}
+
+    def summary(self) -> str:
+        """A human readable report of the plan."""
+
+        lines = [f"{len(self)} requests in {len(self.buckets())} buckets, about {self.estimate():.1f}s "
+                 f"with concurrency {self.concurrency}"]
+        for estimate in self.buckets():
+            lines.append(f"  {estimate.count:>6} x {', '.join(estimate.routes)}: {estimate.seconds:.1f}s at "
+                         f"{estimate.limit}/{estimate.period:g}s{'' if estimate.observed else ' (assumed)'}")
+        for route_key, n in self.n_plus_one().items():
+            lines.append(f"  possible N+1: {route_key} requested {n} times")
+
+        return "\n".join(lines)
+
+
+@contextlib.contextmanager
+def dry_run(**kwargs) -> Iterator[RequestPlan]:
+    """Record every request made inside the block to a new plan instead of sending it."""
+
+    plan = RequestPlan(**kwargs)
+    token = _current_plan.set(plan)
+    try:
+        yield plan
+    finally:
+        _current_plan.reset(token)
@@ -0,0 +1,167 @@
+"""Bulk deletion of a channel's message history."""
+
+from __future__ import annotations
+
+import concurrent.futures
+import contextvars
+import datetime
+import logging
+import threading
+from typing import Callable, List, Optional, Set, TYPE_CHECKING
+
+import requests
+
+from .channel import BaseChannel
+from .snowflake import time_snowflake
+
+if TYPE_CHECKING:
+    from client import Client
+
+logger = logging.getLogger("DiscordAPI")
+
+BULK_DELETE_MAX_AGE = datetime.timedelta(days=14)
+# Messages this close to the bulk delete age limit are deleted individually, one stale id fails the whole batch
+BULK_DELETE_SAFETY_MARGIN = datetime.timedelta(minutes=5)
+BULK_DELETE_MAX_MESSAGES = 100
+
+
+class PruneProgress:
+    """Running totals of a channel prune."""
+
+    scanned: int
+    matched: int
+    deleted: int
+    failed: int
+    bulk_requests: int
+    single_requests: int
+    done: bool
+
+    def __init__(self) -> None:
+        self.scanned = 0
+        self.matched = 0
+        self.deleted = 0
+        self.failed = 0
+        self.bulk_requests = 0
+        self.single_requests = 0
+        self.done = False
+
+    def __repr__(self) -> str:
+        return (f"<PruneProgress: {self.deleted}/{self.matched} deleted, {self.failed} failed, "
+                f"{self.scanned} scanned{', done' if self.done else ''}>")
+
+
+def bulk_delete_cutoff() -> int:
+    """Return the lowest message snowflake that can currently be bulk deleted."""
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return time_snowflake(now - BULK_DELETE_MAX_AGE + BULK_DELETE_SAFETY_MARGIN)
+
+
+def prune_channel(
+        client: Client, channel: int | BaseChannel, *, before: Optional[int | datetime.datetime] = None,
+        after: Optional[int | datetime.datetime] = None, predicate: Optional[Callable[[dict], bool]] = None,
+        concurrency: int = 4, on_progress: Optional[Callable[[PruneProgress], None]] = None) -> PruneProgress:
+    """
+    Delete the channel's messages between before and after that match the predicate.
+
+    History is streamed newest first. Messages young enough to be bulk deleted are grouped into batches of 100,
+    older messages are deleted individually on a thread pool of `concurrency` workers.
+    """
+
+    channel_id = channel.id if isinstance(channel, BaseChannel) else channel
+
+    progress = PruneProgress()
+    lock = threading.Lock()
+
+    def record(*, deleted: int = 0, failed: int = 0, bulk: int = 0, single: int = 0) -> None:
+        with lock:
+            progress.deleted += deleted
+            progress.failed += failed
+            progress.bulk_requests += bulk
+            progress.single_requests += single
+            if on_progress:
+                on_progress(progress)
+
+    def delete_one(message_id: int) -> None:
+        try:
+            client.delete_channel_message(channel_id, message_id)
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                # Already gone, nothing left to do
+                record(deleted=1, single=1)
+                return
+            logger.error(f"Failed to delete message {message_id} from channel {channel_id}", exc_info=e)
+            record(failed=1, single=1)
+        except Exception as e:
+            # Connection errors and deadlines would otherwise be lost in a future nothing reads
+            logger.error(f"Failed to delete message {message_id} from channel {channel_id}", exc_info=e)
+            record(failed=1, single=1)
+        else:
+            record(deleted=1, single=1)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+
+        pending: Set[concurrent.futures.Future] = set()
+
+        def submit_single(message_id: int) -> None:
+            # Keep the number of queued deletes bounded so history isn't read far ahead of the deletes
+            if len(pending) >= concurrency * 4:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                pending.difference_update(done)
+            pending.add(executor.submit(contextvars.copy_context().run, delete_one, message_id))
+
+        batch: List[int] = []
+
+        def flush() -> None:
+            cutoff = bulk_delete_cutoff()
+            bulk_ids = [m for m in batch if m > cutoff]
+            for message_id in batch:
+                if message_id <= cutoff:
+                    submit_single(message_id)
+            batch.clear()
+
+            if len(bulk_ids) == 1:
+                submit_single(bulk_ids[0])
+            elif bulk_ids:
+                try:
+                    client.bulk_delete_messages(channel_id, bulk_ids)
+                except requests.exceptions.HTTPError as e:
+                    logger.warning(
+                        f"Bulk delete of {len(bulk_ids)} messages in channel {channel_id} failed, "
+                        f"deleting them individually", exc_info=e)
+                    record(bulk=1)
+                    for message_id in bulk_ids:
+                        submit_single(message_id)
+                else:
+                    record(deleted=len(bulk_ids), bulk=1)
+
+        cutoff = bulk_delete_cutoff()
+
+        for message in client.iter_channel_messages(channel_id, before=before, after=after):
+            with lock:
+                progress.scanned += 1
+
+            if predicate is not None and not predicate(message):
+                continue
+
+            with lock:
+                progress.matched += 1
+
+            message_id = int(message["id"])
+            if message_id > cutoff:
+                batch.append(message_id)
+                if len(batch) >= BULK_DELETE_MAX_MESSAGES:
+                    flush()
+            else:
+                submit_single(message_id)
+
+        flush()
+        concurrent.futures.wait(pending)
+
+    progress.done = True
+    if on_progress:
+        on_progress(progress)
+
+    logger.info(f"Pruned channel {channel_id}: {progress}")
+
+    return progress
@@ -0,0 +1,474 @@
+"""Rate limit state shared between every client, thread and process using the same token."""
+
+from __future__ import annotations
+
+import abc
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+
+from .deadline import Deadline
+from .exceptions import DeadlineExceededError
+
+logger = logging.getLogger("DiscordAPI")
+
+GLOBAL_RATE_LIMIT = 50
+"""Requests per second Discord allows a bot across all routes."""
+
+DEFAULT_BUCKET_PERIOD = 1.0
+
+
+def token_key(token: str) -> str:
+    """Key rate limit state by a hash of the token so the token itself is never stored."""
+
+    return hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+class RateLimitBackend(abc.ABC):
+    """
+    Storage for rate limit state.
+
+    `reserve` must check and take capacity atomically, so that any number of clients sharing a backend never
+    send more than the global limit or a bucket's remaining requests.
+    """
+
+    @abc.abstractmethod
+    def reserve(self, key: str, bucket: Optional[str], *, global_limit: int, now: float) -> float:
+        """Reserve one request. Returns 0 if it was reserved, otherwise how many seconds to wait before retrying."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def update(self, key: str, bucket: str, *, limit: int, remaining: int, reset_after: float, now: float) -> None:
+        """Record the bucket state from a response's rate limit headers."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def block(self, key: str, until: float, bucket: Optional[str] = None) -> None:
+        """Stop all requests, or all requests to the bucket, until the given time after a 429."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_route_bucket(self, key: str, route: str) -> Optional[str]:
+        """Get the bucket hash Discord reported for the route."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set_route_bucket(self, key: str, route: str, bucket_hash: str) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_bucket_limit(self, key: str, bucket: str) -> Optional[Tuple[int, float]]:
+        """Get the last seen (limit, period) for the bucket, if known."""
+        raise NotImplementedError
+
+
+def _reserve_bucket(state: Optional[Dict[str, float]], now: float) -> Tuple[float, Optional[Dict[str, float]]]:
+    """
+    Apply a reservation to a bucket's state.
+
+    Returns the seconds to wait, 0 if reserved, and the new state. Unknown buckets are let through, the first
+    response fills in their state.
+    """
+
+    if state is None:
+        return 0, None
+
+    if state["blocked_until"] > now:
+        return state["blocked_until"] - now, state
+
+    if now >= state["reset_at"]:
+        # A new window has started, assume it is as long as the last one until a response says otherwise
+        state = dict(state, remaining=state["limit"] - 1, reset_at=now + state["period"])
+        return 0, state
+
+    if state["remaining"] >= 1:
+        state = dict(state, remaining=state["remaining"] - 1)
+        return 0, state
+
+    return state["reset_at"] - now, state
+
+
+def _update_bucket(
+        state: Optional[Dict[str, float]], *, limit: int, remaining: int, reset_after: float,
+        now: float) -> Dict[str, float]:
+
+    reset_at = now + reset_after
+
+    if state is None or reset_at > state["reset_at"] + 0.5:
+        # First response in a new window
+        return {"limit": limit, "remaining": remaining, "reset_at": reset_at,
+                "period": max(reset_after, DEFAULT_BUCKET_PERIOD if state is None else state["period"]),
+                "blocked_until": state["blocked_until"] if state else 0}
+
+    # Responses from the same window can arrive out of order, never give back capacity already reserved
+    return dict(state, limit=limit, remaining=min(state["remaining"], remaining))
+
+
+class LocalRateLimitBackend(RateLimitBackend):
+    """Rate limit state for the threads of a single process."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._global_windows: Dict[str, Tuple[int, int]] = {}
+        self._global_blocks: Dict[str, float] = {}
+        self._buckets: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self._routes: Dict[Tuple[str, str], str] = {}
+
+    def reserve(self, key: str, bucket: Optional[str], *, global_limit: int, now: float) -> float:
+
+        with self._lock:
+            blocked_until = self._global_blocks.get(key, 0)
+            if blocked_until > now:
+                return blocked_until - now
+
+            window = int(now)
+            window_start, count = self._global_windows.get(key, (window, 0))
+            if window_start != window:
+                count = 0
+            if count >= global_limit:
+                return window + 1 - now
+
+            if bucket is not None:
+                wait, state = _reserve_bucket(self._buckets.get((key, bucket)), now)
+                if wait > 0:
+                    return wait
+                if state is not None:
+                    self._buckets[(key, bucket)] = state
+
+            self._global_windows[key] = (window, count + 1)
+            return 0
+
+    def update(self, key: str, bucket: str, *, limit: int, remaining: int, reset_after: float, now: float) -> None:
+
+        with self._lock:
+            self._buckets[(key, bucket)] = _update_bucket(
+                self._buckets.get((key, bucket)), limit=limit, remaining=remaining, reset_after=reset_after, now=now)
+
+    def block(self, key: str, until: float, bucket: Optional[str] = None) -> None:
+
+        with self._lock:
+            if bucket is None:
+                self._global_blocks[key] = max(self._global_blocks.get(key, 0), until)
+            elif (key, bucket) in self._buckets:
+                state = self._buckets[(key, bucket)]
+                self._buckets[(key, bucket)] = dict(state, blocked_until=max(state["blocked_until"], until))
+
+    def get_route_bucket(self, key: str, route: str) -> Optional[str]:
+        return self._routes.get((key, route))
+
+    def set_route_bucket(self, key: str, route: str, bucket_hash: str) -> None:
+        self._routes[(key, route)] = bucket_hash
+
+    def get_bucket_limit(self, key: str, bucket: str) -> Optional[Tuple[int, float]]:
+        state = self._buckets.get((key, bucket))
+        return (int(state["limit"]), state["period"]) if state else None
+
+
+class SQLiteRateLimitBackend(RateLimitBackend):
+    """
+    Rate limit state in a SQLite database shared by every process on the host.
+
+    Reservations run in `BEGIN IMMEDIATE` transactions, which take the database write lock, so they are atomic
+    across processes. Keep the file on a local disk, SQLite locking is not reliable over network filesystems.
+    """
+
+    def __init__(self, path: str, *, timeout: float = 30) -> None:
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+        with self._transaction() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS global_windows "
+                       "(key TEXT PRIMARY KEY, window INTEGER, count INTEGER, blocked_until REAL)")
+            db.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT, bucket TEXT, state TEXT, "
+                       "PRIMARY KEY (key, bucket))")
+            db.execute("CREATE TABLE IF NOT EXISTS routes (key TEXT, route TEXT, bucket_hash TEXT, "
+                       "PRIMARY KEY (key, route))")
+
+    def __repr__(self) -> str:
+        return f"<SQLiteRateLimitBackend: {self.path}>"
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _transaction(self) -> _SQLiteTransaction:
+        return _SQLiteTransaction(self._connection())
+
+    def _get_bucket(self, db: sqlite3.Connection, key: str, bucket: str) -> Optional[Dict[str, float]]:
+        row = db.execute("SELECT state FROM buckets WHERE key = ? AND bucket = ?", (key, bucket)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_bucket(self, db: sqlite3.Connection, key: str, bucket: str, state: Dict[str, float]) -> None:
+        db.execute("INSERT OR REPLACE INTO buckets (key, bucket, state) VALUES (?, ?, ?)",
+                   (key, bucket, json.dumps(state)))
+
+    def reserve(self, key: str, bucket: Optional[str], *, global_limit: int, now: float) -> float:
+
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT window, count, blocked_until FROM global_windows WHERE key = ?", (key,)).fetchone()
+            window_start, count, blocked_until = row if row else (None, 0, 0)
+
+            if blocked_until > now:
+                return blocked_until - now
+
+            window = int(now)
+            if window_start != window:
+                count = 0
+            if count >= global_limit:
+                return window + 1 - now
+
+            if bucket is not None:
+                wait, state = _reserve_bucket(self._get_bucket(db, key, bucket), now)
+                if wait > 0:
+                    return wait
+                if state is not None:
+                    self._set_bucket(db, key, bucket, state)
+
+            db.execute("INSERT OR REPLACE INTO global_windows (key, window, count, blocked_until) VALUES (?, ?, ?, ?)",
+                       (key, window, count + 1, blocked_until))
+            return 0
+
+    def update(self, key: str, bucket: str, *, limit: int, remaining: int, reset_after: float, now: float) -> None:
+
+        with self._transaction() as db:
+            state = _update_bucket(
+                self._get_bucket(db, key, bucket), limit=limit, remaining=remaining, reset_after=reset_after, now=now)
+            self._set_bucket(db, key, bucket, state)
+
+    def block(self, key: str, until: float, bucket: Optional[str] = None) -> None:
+
+        with self._transaction() as db:
+            if bucket is None:
+                row = db.execute("SELECT window, count, blocked_until FROM global_windows WHERE key = ?",
+                                 (key,)).fetchone()
+                window, count, blocked_until = row if row else (0, 0, 0)
+                db.execute("INSERT OR REPLACE INTO global_windows (key, window, count, blocked_until) "
+                           "VALUES (?, ?, ?, ?)", (key, window, count, max(blocked_until, until)))
+            else:
+                state = self._get_bucket(db, key, bucket)
+                if state is not None:
+                    self._set_bucket(db, key, bucket, dict(state, blocked_until=max(state["blocked_until"], until)))
+
+    def get_route_bucket(self, key: str, route: str) -> Optional[str]:
+        row = self._connection().execute(
+            "SELECT bucket_hash FROM routes WHERE key = ? AND route = ?", (key, route)).fetchone()
+        return row[0] if row else None
+
+    def set_route_bucket(self, key: str, route: str, bucket_hash: str) -> None:
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO routes (key, route, bucket_hash) VALUES (?, ?, ?)",
+                       (key, route, bucket_hash))
+
+    def get_bucket_limit(self, key: str, bucket: str) -> Optional[Tuple[int, float]]:
+        state = self._get_bucket(self._connection(), key, bucket)
+        return (int(state["limit"]), state["period"]) if state else None
+
+
+class _SQLiteTransaction:
+
+    def __init__(self, db: sqlite3.Connection) -> None:
+        self.db = db
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, *exc) -> None:
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Rate limit state in Redis, shared by every process on every host using the server.
+
+    Only needs `get`, `set`, `incr`, `decr` and `expire`, so any redis-py compatible client works, including
+    in-process stand-ins. Reservations are atomic `INCR`s on per window counters, the bucket window itself is stored as
+    JSON and refreshed from responses.
+    """
+
+    def __init__(self, redis: Any, *, prefix: str = "pyaccord") -> None:
+        self.redis = redis
+        self.prefix = prefix
+
+    def __repr__(self) -> str:
+        return f"<RedisRateLimitBackend: {self.prefix}>"
+
+    def _get_json(self, name: str) -> Optional[dict]:
+        value = self.redis.get(name)
+        return json.loads(value) if value else None
+
+    def _incr(self, name: str, ttl: float) -> int:
+        count = self.redis.incr(name)
+        if count == 1:
+            self.redis.expire(name, max(int(ttl) + 1, 1))
+        return count
+
+    def reserve(self, key: str, bucket: Optional[str], *, global_limit: int, now: float) -> float:
+
+        blocked_until = float(self.redis.get(f"{self.prefix}:{key}:blocked") or 0)
+        if blocked_until > now:
+            return blocked_until - now
+
+        # The bucket is checked before the global counter is counted against, so reservations a blocked or
+        # exhausted bucket turns away don't use up global capacity other routes could have had
+        bucket_counter = None
+        state = self._get_json(f"{self.prefix}:{key}:bucket:{bucket}") if bucket is not None else None
+
+        if state is not None:
+            if state["blocked_until"] > now:
+                return state["blocked_until"] - now
+
+            # Windows after the last one a response told us about are assumed to be the same length
+            windows_passed = 0
+            if now >= state["reset_at"]:
+                windows_passed = int((now - state["reset_at"]) // state["period"]) + 1
+            reset_at = state["reset_at"] + windows_passed * state["period"]
+            budget = state["limit"] if windows_passed else state["remaining"]
+
+            bucket_counter = f"{self.prefix}:{key}:bucket:{bucket}:{reset_at:.3f}"
+            if self._incr(bucket_counter, reset_at - now) > budget:
+                return reset_at - now
+
+        window = int(now)
+        if self._incr(f"{self.prefix}:{key}:global:{window}", 2) > global_limit:
+            if bucket_counter is not None:
+                # Give back the bucket request this reservation took
+                self.redis.decr(bucket_counter)
+            return window + 1 - now
+
+        return 0
+
+    def update(self, key: str, bucket: str, *, limit: int, remaining: int, reset_after: float, now: float) -> None:
+
+        name = f"{self.prefix}:{key}:bucket:{bucket}"
+        state = self._get_json(name)
+        reset_at = now + reset_after
+
+        if state is not None and reset_at <= state["reset_at"] + 0.5:
+            # Same window, the reservation counter already accounts for requests made through this backend
+            return
+
+        state = {"limit": limit, "remaining": remaining, "reset_at": reset_at,
+                 "period": max(reset_after, DEFAULT_BUCKET_PERIOD if state is None else state["period"]),
+                 "blocked_until": state["blocked_until"] if state else 0}
+        self.redis.set(name, json.dumps(state), ex=max(int(state["period"] * 10), 60))
+
+    def block(self, key: str, until: float, bucket: Optional[str] = None) -> None:
+
+        if bucket is None:
+            self.redis.set(f"{self.prefix}:{key}:blocked", str(until), ex=max(int(until - time.time()) + 1, 1))
+            return
+
+        name = f"{self.prefix}:{key}:bucket:{bucket}"
+        state = self._get_json(name)
+        if state is not None:
+            state["blocked_until"] = max(state["blocked_until"], until)
+            self.redis.set(name, json.dumps(state), ex=max(int(state["period"] * 10), 60))
+
+    def get_route_bucket(self, key: str, route: str) -> Optional[str]:
+        value = self.redis.get(f"{self.prefix}:{key}:route:{route}")
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set_route_bucket(self, key: str, route: str, bucket_hash: str) -> None:
+        self.redis.set(f"{self.prefix}:{key}:route:{route}", bucket_hash)
+
+    def get_bucket_limit(self, key: str, bucket: str) -> Optional[Tuple[int, float]]:
+        state = self._get_json(f"{self.prefix}:{key}:bucket:{bucket}")
+        return (int(state["limit"]), state["period"]) if state else None
+
+
+_default_backend = LocalRateLimitBackend()
+
+
+class RateLimiter:
+    """Reserves capacity for a token's requests from a backend and feeds responses back into it."""
+
+    def __init__(self, token: str, backend: Optional[RateLimitBackend] = None, *,
+                 global_limit: int = GLOBAL_RATE_LIMIT) -> None:
+        self.key = token_key(token)
+        self.backend = backend if backend is not None else _default_backend
+        self.global_limit = global_limit
+
+    def __repr__(self) -> str:
+        return f"<RateLimiter: {self.backend}>"
+
+    def bucket(self, route_key: str, major: str) -> Optional[str]:
+        """The bucket for a route, None until Discord has told us which bucket the route is in."""
+
+        bucket_hash = self.backend.get_route_bucket(self.key, route_key)
+        return f"{bucket_hash}:{major}" if bucket_hash else None
+
+    def acquire(self, route_key: str, major: str, *, deadline: Optional[Deadline] = None) -> None:
+        """
+        Block until a request to the route can be sent.
+
+        Raises DeadlineExceededError straight away if the wait would run past the deadline.
+        """
+
+        bucket = self.bucket(route_key, major)
+
+        while True:
+            wait = self.backend.reserve(self.key, bucket, global_limit=self.global_limit, now=time.time())
+            if wait <= 0:
+                return
+            if deadline is not None and wait >= deadline.remaining():
+                raise DeadlineExceededError(f"Rate limit on {route_key} resets after the deadline")
+            logger.debug(f"Waiting {wait:.3f}s for rate limit on {route_key}")
+            time.sleep(wait)
+
+    def release(self, route_key: str, major: str, response: requests.Response) -> float:
+        """
+        Record the rate limit headers of a response.
+
+        Returns how long the caller has to wait before retrying a 429 that couldn't be recorded in the backend,
+        because there is no state for the route's bucket yet, otherwise 0.
+        """
+
+        headers = response.headers
+        now = time.time()
+
+        bucket_hash = headers.get("X-RateLimit-Bucket")
+        bucket = None
+        if bucket_hash:
+            self.backend.set_route_bucket(self.key, route_key, bucket_hash)
+            bucket = f"{bucket_hash}:{major}"
+
+            if "X-RateLimit-Remaining" in headers and "X-RateLimit-Reset-After" in headers:
+                self.backend.update(
+                    self.key, bucket, limit=int(headers.get("X-RateLimit-Limit", 1)),
+                    remaining=int(headers["X-RateLimit-Remaining"]),
+                    reset_after=float(headers["X-RateLimit-Reset-After"]), now=now)
+
+        if response.status_code == 429:
+            retry_after = float(headers.get("Retry-After", 1))
+            if headers.get("X-RateLimit-Global") == "true" or headers.get("X-RateLimit-Scope") == "global":
+                logger.warning(f"Hit the global rate limit, blocking all requests for {retry_after}s")
+                self.backend.block(self.key, now + retry_after)
+                return 0
+            if bucket is not None and self.backend.get_bucket_limit(self.key, bucket) is not None:
+                self.backend.block(self.key, now + retry_after, bucket)
+                return 0
+            logger.warning(f"Rate limited on {route_key} without a known bucket, waiting {retry_after}s")
+            return retry_after
+
+        return 0
+
+    def backoff(self, seconds: float, route_key: str, *, deadline: Optional[Deadline] = None) -> None:
+        """Wait out a 429 that `release` couldn't record, failing fast if that would run past the deadline."""
+
+        if deadline is not None and seconds >= deadline.remaining():
+            raise DeadlineExceededError(f"Rate limit on {route_key} resets after the deadline")
+        time.sleep(seconds)
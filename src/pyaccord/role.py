@@ -52,6 +52,9 @@ class Role:
 
         return roles
 
+    def __getstate__(self) -> dict:
+        return dict(self.__dict__, _client=None)
+
     def __str__(self) -> str:
         if self.name:
             return f"<Role: {self.name} #{self.id}>"
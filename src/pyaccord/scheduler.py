@@ -0,0 +1,357 @@
+"""Priority scheduling of requests that are waiting on the same rate limit bucket."""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import enum
+import heapq
+import itertools
+import threading
+import time
+import weakref
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .deadline import Deadline, current_deadline
+from .exceptions import DeadlineExceededError
+from .ratelimit import RateLimitBackend, RateLimiter
+
+
+class Priority(enum.IntEnum):
+    """Request priority classes, lower values are served first."""
+
+    INTERACTIVE = 0
+    DEFAULT = 1
+    BACKGROUND = 2
+
+
+# Share of a bucket given to each class when all of them are waiting on it
+CLASS_WEIGHTS: Dict[Priority, float] = {
+    Priority.INTERACTIVE: 16.0,
+    Priority.DEFAULT: 4.0,
+    Priority.BACKGROUND: 1.0,
+}
+
+
+class RequestPriority:
+    """The priority class, job and weight requests made in a `priority` block are scheduled with."""
+
+    level: Priority
+    job: Optional[str]
+    weight: float
+
+    def __init__(self, level: Priority, job: Optional[str] = None, weight: float = 1.0) -> None:
+        self.level = Priority(level)
+        self.job = job
+        self.weight = weight
+
+    def __repr__(self) -> str:
+        return f"<RequestPriority: {self.level.name}{f' job {self.job}' if self.job else ''}>"
+
+
+_current_priority: contextvars.ContextVar[Optional[RequestPriority]] = contextvars.ContextVar(
+    "pyaccord_priority", default=None)
+
+
+def current_priority() -> Optional[RequestPriority]:
+    """The innermost priority set with `priority` in the current context."""
+    return _current_priority.get()
+
+
+@contextlib.contextmanager
+def priority(level: Priority, *, job: Optional[str] = None, weight: float = 1.0) -> Iterator[RequestPriority]:
+    """
+    Schedule every request made inside the block with the priority class.
+
+    Requests of the same class are shared fairly between jobs, in proportion to their weight. A nested block
+    without a job keeps the job of the outer block.
+    """
+
+    outer = _current_priority.get()
+    if job is None and outer is not None:
+        job = outer.job
+
+    token = _current_priority.set(RequestPriority(level, job, weight))
+    try:
+        yield _current_priority.get()
+    finally:
+        _current_priority.reset(token)
+
+
+class QueueStats:
+    """Queue depth and wait times of one priority class."""
+
+    depth: int
+    blocked: int
+    granted: int
+    total_wait: float
+    max_wait: float
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.blocked = 0
+        self.granted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def __repr__(self) -> str:
+        return (f"<QueueStats: {self.depth} queued, {self.blocked} blocked, {self.granted} granted, "
+                f"{self.mean_wait:.3f}s mean wait>")
+
+    @property
+    def mean_wait(self) -> float:
+        return self.total_wait / self.granted if self.granted else 0.0
+
+    def copy(self) -> QueueStats:
+        stats = QueueStats()
+        stats.__dict__.update(self.__dict__)
+        return stats
+
+
+class _Ticket:
+    """A request waiting for its turn on a bucket."""
+
+    __slots__ = ("level", "finish", "start", "enqueued_at")
+
+    def __init__(self, level: Priority, start: float, finish: float) -> None:
+        self.level = level
+        self.start = start
+        self.finish = finish
+        self.enqueued_at = time.monotonic()
+
+
+class _Window:
+    """Non interactive grants on a bucket in its current window, capped to leave room for interactive requests."""
+
+    __slots__ = ("start", "grants")
+
+    def __init__(self) -> None:
+        self.start = float("-inf")
+        self.grants = 0
+
+
+class _BucketQueue:
+    """
+    Weighted fair queue of the requests waiting on one bucket.
+
+    Each (class, job) pair is a flow, every ticket is stamped with the virtual time its flow would finish at if
+    the bucket were shared in proportion to the flows' weights, and the earliest finish is served first.
+    """
+
+    def __init__(self, bucket: Optional[str]) -> None:
+        self.bucket = bucket
+        self.busy = False
+        self.interactive: List[Tuple[float, int, _Ticket]] = []
+        self.others: List[Tuple[float, int, _Ticket]] = []
+        self.virtual_time = 0.0
+        self.flow_finish: Dict[Tuple[Priority, Optional[str]], float] = {}
+
+    def __len__(self) -> int:
+        return len(self.interactive) + len(self.others)
+
+    def push(self, request_priority: RequestPriority, seq: int) -> _Ticket:
+        flow = (request_priority.level, request_priority.job)
+        weight = CLASS_WEIGHTS[request_priority.level] * request_priority.weight
+
+        start = max(self.virtual_time, self.flow_finish.get(flow, 0.0))
+        ticket = _Ticket(request_priority.level, start, start + 1 / weight)
+        self.flow_finish[flow] = ticket.finish
+
+        heap = self.interactive if ticket.level == Priority.INTERACTIVE else self.others
+        heapq.heappush(heap, (ticket.finish, seq, ticket))
+        return ticket
+
+    def remove(self, ticket: _Ticket) -> None:
+        heap = self.interactive if ticket.level == Priority.INTERACTIVE else self.others
+        heap[:] = [entry for entry in heap if entry[2] is not ticket]
+        heapq.heapify(heap)
+
+
+class RequestScheduler:
+    """
+    Orders requests waiting on the same rate limit bucket by priority class and job.
+
+    Only one request per bucket waits on the rate limiter at a time, the scheduler decides which one goes next.
+    Interactive requests always have `interactive_share` of each bucket's known limit kept free for them. Other
+    classes are limited to `max_queued` waiting requests across all buckets, further requests block until there is
+    room, so bulk producers slow down instead of queueing without bound.
+    """
+
+    rate_limiter: RateLimiter
+    max_queued: int
+    interactive_share: float
+
+    def __init__(self, rate_limiter: RateLimiter, *, max_queued: int = 1000, interactive_share: float = 0.2) -> None:
+        self.rate_limiter = rate_limiter
+        self.max_queued = max_queued
+        self.interactive_share = interactive_share
+
+        self._condition = threading.Condition()
+        self._queues: Dict[str, _BucketQueue] = {}
+        # Outlives the queues, which are dropped whenever nothing is waiting on their bucket
+        self._windows: Dict[str, _Window] = {}
+        self._stats = {level: QueueStats() for level in Priority}
+        self._seq = itertools.count()
+
+    def __repr__(self) -> str:
+        return f"<RequestScheduler: {sum(s.depth for s in self._stats.values())} queued>"
+
+    def stats(self) -> Dict[Priority, QueueStats]:
+        """A snapshot of the queue depth and wait times of each priority class."""
+
+        with self._condition:
+            return {level: stats.copy() for level, stats in self._stats.items()}
+
+    def _headroom_wait(self, queue: _BucketQueue, now: float) -> float:
+        """Seconds until a non interactive request may use the bucket without eating into the reserved share."""
+
+        if queue.bucket is None or self.interactive_share <= 0:
+            return 0
+
+        known = self.rate_limiter.backend.get_bucket_limit(self.rate_limiter.key, queue.bucket)
+        if known is None:
+            return 0
+
+        limit, period = known
+        reserved = int(limit * self.interactive_share)
+        if not reserved:
+            return 0
+
+        window = self._windows.get(queue.bucket)
+        if window is None:
+            window = self._windows[queue.bucket] = _Window()
+
+        if now - window.start >= period:
+            window.start = now
+            window.grants = 0
+        if window.grants < limit - reserved:
+            return 0
+        return window.start + period - now
+
+    def _next(self, queue: _BucketQueue) -> Tuple[Optional[_Ticket], float]:
+        """The ticket to serve next, and if it is held back by the reserved share how long until that clears."""
+
+        interactive = queue.interactive[0] if queue.interactive else None
+        other = queue.others[0] if queue.others else None
+
+        wait = 0.0
+        if other is not None:
+            wait = self._headroom_wait(queue, time.monotonic())
+            if wait > 0:
+                other = None
+
+        if interactive is not None and (other is None or interactive[:2] < other[:2]):
+            return interactive[2], 0.0
+        if other is not None:
+            return other[2], 0.0
+        return None, wait
+
+    def _grant(self, queue: _BucketQueue, ticket: _Ticket) -> None:
+
+        if ticket.level == Priority.INTERACTIVE:
+            heapq.heappop(queue.interactive)
+        else:
+            heapq.heappop(queue.others)
+            window = self._windows.get(queue.bucket) if queue.bucket is not None else None
+            if window is not None:
+                window.grants += 1
+
+        queue.busy = True
+        queue.virtual_time = ticket.start
+
+        waited = time.monotonic() - ticket.enqueued_at
+        stats = self._stats[ticket.level]
+        stats.depth -= 1
+        stats.granted += 1
+        stats.total_wait += waited
+        stats.max_wait = max(stats.max_wait, waited)
+
+        self._condition.notify_all()
+
+    def _wait(self, timeout: Optional[float], deadline: Optional[Deadline], action: str) -> None:
+
+        if deadline is not None:
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                raise DeadlineExceededError(f"Deadline exceeded {action}")
+            timeout = remaining if timeout is None else min(timeout, remaining)
+
+        self._condition.wait(timeout)
+
+    def acquire(self, route_key: str, major: str, *, deadline: Optional[Deadline] = None) -> None:
+        """
+        Wait for this request's turn on its bucket, then block until the rate limiter lets it be sent.
+
+        The request is scheduled with the priority of the current `priority` block, DEFAULT outside of one.
+        Without an explicit `deadline` the one of the current `deadline` block applies.
+        """
+
+        if deadline is None:
+            deadline = current_deadline()
+
+        request_priority = current_priority() or RequestPriority(Priority.DEFAULT)
+        level = request_priority.level
+        stats = self._stats[level]
+
+        bucket = self.rate_limiter.bucket(route_key, major)
+        queue_key = bucket or f"{route_key}:{major}"
+
+        with self._condition:
+            if level != Priority.INTERACTIVE and stats.depth >= self.max_queued:
+                stats.blocked += 1
+                try:
+                    while stats.depth >= self.max_queued:
+                        self._wait(None, deadline, f"waiting for room in the {level.name} request queue")
+                finally:
+                    stats.blocked -= 1
+
+            queue = self._queues.get(queue_key)
+            if queue is None:
+                queue = self._queues[queue_key] = _BucketQueue(bucket)
+
+            ticket = queue.push(request_priority, next(self._seq))
+            stats.depth += 1
+
+            try:
+                while True:
+                    wait = None
+                    if not queue.busy:
+                        chosen, headroom_wait = self._next(queue)
+                        if chosen is ticket:
+                            self._grant(queue, ticket)
+                            break
+                        wait = headroom_wait or None
+                    self._wait(wait, deadline, f"waiting in the request queue for {route_key}")
+            except BaseException:
+                queue.remove(ticket)
+                stats.depth -= 1
+                self._release(queue_key, queue, busy=queue.busy)
+                raise
+
+        try:
+            self.rate_limiter.acquire(route_key, major, deadline=deadline)
+        finally:
+            with self._condition:
+                self._release(queue_key, queue, busy=False)
+
+    def _release(self, queue_key: str, queue: _BucketQueue, *, busy: bool) -> None:
+        """Hand the bucket on, must be called with the lock held."""
+
+        queue.busy = busy
+        if not queue and not queue.busy:
+            self._queues.pop(queue_key, None)
+        self._condition.notify_all()
+
+
+_schedulers: weakref.WeakKeyDictionary[RateLimitBackend, Dict[str, RequestScheduler]] = weakref.WeakKeyDictionary()
+_schedulers_lock = threading.Lock()
+
+
+def shared_scheduler(rate_limiter: RateLimiter) -> RequestScheduler:
+    """The scheduler shared by every client in the process using the rate limiter's token and backend."""
+
+    with _schedulers_lock:
+        schedulers = _schedulers.setdefault(rate_limiter.backend, {})
+        if rate_limiter.key not in schedulers:
+            schedulers[rate_limiter.key] = RequestScheduler(rate_limiter)
+        return schedulers[rate_limiter.key]
@@ -0,0 +1,527 @@
+"""
+Compact, versioned binary encoding of pyaccord models for sending them between processes.
+
+Models of each type are stored column by column. Ids and other integers are little endian fixed width arrays,
+strings are an offsets array and one utf-8 blob, and every column has a bitmap of which values are present.
+Roles, channels and permission overwrites nested in guilds and channels are stored in their own sections and
+referenced by index range. Decoding casts the numeric columns in place with `memoryview` and only builds a model
+when it is accessed, see `ModelBatch`. `loads` instead decodes whole columns at once and builds each section's
+models in a single pass.
+
+The client a model was created with is never encoded, pass the receiving process' client to `loads` to
+reattach one. Snowflakes are decoded as ints.
+"""
+
+from __future__ import annotations
+
+import struct
+import sys
+from array import array
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+from .channel import BaseChannel, Channel, TextChannel
+from .guild import Guild
+from .invite import Invite
+from .role import Role
+from .user import CurrentUser, User
+from .webhook import Webhook
+
+if TYPE_CHECKING:
+    from client import Client
+
+MAGIC = b"PYAC"
+VERSION = 2
+
+_HEADER = struct.Struct("<4sBxxxI")
+_SECTION = struct.Struct("<BxxxI")
+
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+# Section tags
+_ROLE = 1
+_OVERWRITE = 2
+_CHANNEL = 3
+_GUILD = 4
+_INVITE = 5
+_USER = 6
+_CURRENT_USER = 7
+_WEBHOOK = 8
+
+# Column kinds and the array typecode they are stored with
+_U64 = "Q"
+_I64 = "q"
+_BOOL = "B"
+_STR = "s"
+_RANGE = "R"
+
+
+class SerializationError(ValueError):
+    """Raised when data can't be decoded as a pyaccord model batch."""
+    pass
+
+
+def _int_or_none(value: Any) -> Optional[int]:
+    return int(value) if value is not None else None
+
+
+# region Schemas
+
+# Each section is a list of (kind, getter) columns, getters return None for missing values
+_Column = Tuple[str, Callable[[Any], Any]]
+
+_SCHEMAS: Dict[int, List[_Column]] = {
+    _ROLE: [
+        (_U64, lambda r: int(r.id)),
+        (_STR, lambda r: r.name),
+        (_I64, lambda r: r.position),
+        (_BOOL, lambda r: r.hoist),
+        (_BOOL, lambda r: r.managed),
+        (_BOOL, lambda r: r.mentionable),
+    ],
+    _OVERWRITE: [
+        (_U64, lambda o: int(o["id"])),
+        (_I64, lambda o: int(o["type"])),
+        (_U64, lambda o: int(o["allow"])),
+        (_U64, lambda o: int(o["deny"])),
+    ],
+    _CHANNEL: [
+        (_U64, lambda c: int(c.id)),
+        (_I64, lambda c: c.type_int),
+        (_U64, lambda c: _int_or_none(c.guild_id)),
+        (_I64, lambda c: c.position),
+        (_STR, lambda c: c.name),
+        (_RANGE, None),  # permission overwrites
+    ],
+    _GUILD: [
+        (_U64, lambda g: int(g.id)),
+        (_STR, lambda g: g.name),
+        (_U64, lambda g: _int_or_none(getattr(g, "_public_updates_channel_id", None))),
+        (_STR, lambda g: getattr(g, "icon", None)),
+        (_RANGE, None),  # roles
+        (_RANGE, None),  # channels
+    ],
+    _INVITE: [
+        (_STR, lambda i: i.code),
+        (_I64, lambda i: i.max_age),
+        (_I64, lambda i: i.max_uses),
+        (_BOOL, lambda i: i.temporary),
+    ],
+    _USER: [
+        (_U64, lambda u: int(u.id)),
+        (_STR, lambda u: u.username),
+        (_STR, lambda u: u.discriminator),
+        (_STR, lambda u: getattr(u, "avatar", None)),
+    ],
+    _WEBHOOK: [
+        (_U64, lambda w: int(w.id)),
+        (_STR, lambda w: w.token),
+        (_U64, lambda w: _int_or_none(w.channel_id)),
+        (_U64, lambda w: _int_or_none(w.guild_id)),
+        (_STR, lambda w: w.name),
+        (_I64, lambda w: w.type_int),
+        (_I64, lambda w: w.api_version),
+    ],
+}
+_SCHEMAS[_CURRENT_USER] = _SCHEMAS[_USER]
+
+
+def _tag_of(model: Any) -> int:
+    # Subclasses first
+    if isinstance(model, CurrentUser):
+        return _CURRENT_USER
+    for cls, tag in ((Role, _ROLE), (BaseChannel, _CHANNEL), (Guild, _GUILD), (Invite, _INVITE), (User, _USER),
+                     (Webhook, _WEBHOOK)):
+        if isinstance(model, cls):
+            return tag
+    raise TypeError(f"Can't serialize {type(model).__name__}")
+
+# endregion
+
+# region Encoding
+
+
+class _Writer:
+
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+
+    def align(self) -> None:
+        self.buffer.extend(bytes(-len(self.buffer) % 8))
+
+    def write(self, data: bytes) -> None:
+        self.buffer.extend(data)
+
+    def write_array(self, values: array) -> None:
+        if not _LITTLE_ENDIAN and values.itemsize > 1:
+            values = array(values.typecode, values)
+            values.byteswap()
+        self.write(values.tobytes())
+        self.align()
+
+    def write_presence(self, values: Sequence[Any]) -> None:
+        bitmap = bytearray((len(values) + 7) // 8)
+        for i, value in enumerate(values):
+            if value is not None:
+                bitmap[i >> 3] |= 1 << (i & 7)
+        self.write(bitmap)
+        self.align()
+
+    def write_column(self, kind: str, values: Sequence[Any]) -> None:
+
+        self.write_presence(values)
+
+        if kind == _STR:
+            encoded = [v.encode() if v is not None else b"" for v in values]
+            offsets = array("I", [0])
+            total = 0
+            for e in encoded:
+                total += len(e)
+                offsets.append(total)
+            self.write_array(offsets)
+            self.write(b"".join(encoded))
+            self.align()
+        elif kind == _RANGE:
+            self.write_array(array("I", [v[0] if v is not None else 0 for v in values]))
+            self.write_array(array("I", [v[1] if v is not None else 0 for v in values]))
+        else:
+            self.write_array(array(kind, [int(v) if v is not None else 0 for v in values]))
+
+
+def dumps(models: Iterable[Any]) -> bytes:
+    """Encode a batch of models of any mix of types."""
+
+    sections: Dict[int, List[Any]] = {tag: [] for tag in _SCHEMAS}
+    ranges: Dict[int, List[List[Optional[Tuple[int, int]]]]] = {_CHANNEL: [[]], _GUILD: [[], []]}
+    order_tags = array("B")
+    order_indexes = array("I")
+
+    def add_channel(channel: BaseChannel) -> int:
+        overwrites = channel.raw_permission_overwrites
+        if overwrites is None:
+            ranges[_CHANNEL][0].append(None)
+        else:
+            ranges[_CHANNEL][0].append((len(sections[_OVERWRITE]), len(overwrites)))
+            sections[_OVERWRITE].extend(overwrites)
+        sections[_CHANNEL].append(channel)
+        return len(sections[_CHANNEL]) - 1
+
+    def add_guild(guild: Guild) -> int:
+        roles = getattr(guild, "_roles", None)
+        if roles is None:
+            ranges[_GUILD][0].append(None)
+        else:
+            ranges[_GUILD][0].append((len(sections[_ROLE]), len(roles)))
+            sections[_ROLE].extend(roles)
+
+        channels = getattr(guild, "_channels", None)
+        if channels is None:
+            ranges[_GUILD][1].append(None)
+        else:
+            start = len(sections[_CHANNEL])
+            for channel in channels:
+                add_channel(channel)
+            ranges[_GUILD][1].append((start, len(channels)))
+
+        sections[_GUILD].append(guild)
+        return len(sections[_GUILD]) - 1
+
+    for model in models:
+        tag = _tag_of(model)
+        if tag == _GUILD:
+            index = add_guild(model)
+        elif tag == _CHANNEL:
+            index = add_channel(model)
+        else:
+            sections[tag].append(model)
+            index = len(sections[tag]) - 1
+        order_tags.append(tag)
+        order_indexes.append(index)
+
+    writer = _Writer()
+    writer.write(_HEADER.pack(MAGIC, VERSION, len(order_tags)))
+    writer.write_array(order_tags)
+    writer.write_array(order_indexes)
+
+    present = [tag for tag, items in sections.items() if items]
+    writer.write(struct.pack("<B", len(present)))
+    writer.align()
+
+    for tag in present:
+        items = sections[tag]
+        writer.write(_SECTION.pack(tag, len(items)))
+        range_columns = iter(ranges.get(tag, []))
+        for kind, getter in _SCHEMAS[tag]:
+            if kind == _RANGE:
+                writer.write_column(kind, next(range_columns))
+            else:
+                writer.write_column(kind, [getter(item) for item in items])
+
+    return bytes(writer.buffer)
+
+# endregion
+
+# region Decoding
+
+
+class _Reader:
+
+    def __init__(self, data: memoryview) -> None:
+        self.data = data
+        self.offset = 0
+
+    def align(self) -> None:
+        self.offset += -self.offset % 8
+
+    def read(self, size: int) -> memoryview:
+        if self.offset + size > len(self.data):
+            raise SerializationError("Data is truncated")
+        view = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return view
+
+    def read_array(self, typecode: str, count: int) -> Sequence[int]:
+        size = array(typecode).itemsize
+        view = self.read(size * count)
+        self.align()
+        if _LITTLE_ENDIAN:
+            # Zero copy, values are read straight from the buffer
+            return view.cast(typecode)
+        values = array(typecode, view.tobytes())
+        values.byteswap()
+        return values
+
+
+class _DecodedColumn:
+    """A column of a section, values are decoded from the buffer when indexed."""
+
+    def __init__(self, kind: str, reader: _Reader, count: int) -> None:
+        self.kind = kind
+        self.count = count
+        self.presence = reader.read((count + 7) // 8)
+        reader.align()
+
+        if kind == _STR:
+            self.offsets = reader.read_array("I", count + 1)
+            self.blob = reader.read(self.offsets[count] if count else 0)
+            reader.align()
+        elif kind == _RANGE:
+            self.starts = reader.read_array("I", count)
+            self.counts = reader.read_array("I", count)
+        else:
+            self.values = reader.read_array(kind, count)
+
+    def tolist(self) -> List[Any]:
+        """Decode the whole column at once, much faster than indexing every value."""
+
+        if self.kind == _STR:
+            offsets = self.offsets.tolist()
+            blob = bytes(self.blob)
+            text = blob.decode()
+            if len(text) == len(blob):
+                # All ascii, byte offsets are character offsets
+                values = [text[start:end] for start, end in zip(offsets, offsets[1:])]
+            else:
+                values = [blob[start:end].decode() for start, end in zip(offsets, offsets[1:])]
+        elif self.kind == _RANGE:
+            values = [(start, start + n) for start, n in zip(self.starts.tolist(), self.counts.tolist())]
+        elif self.kind == _BOOL:
+            values = [v != 0 for v in self.values.tolist()]
+        else:
+            values = self.values.tolist()
+
+        # Only columns with missing values need masking
+        presence = bytes(self.presence)
+        if presence.count(0xFF) * 8 < self.count:
+            mask = int.from_bytes(presence, "little")
+            values = [v if mask >> i & 1 else None for i, v in enumerate(values)]
+
+        return values
+
+    def __getitem__(self, i: int) -> Any:
+        if not self.presence[i >> 3] >> (i & 7) & 1:
+            return None
+        if self.kind == _STR:
+            return str(self.blob[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+        if self.kind == _RANGE:
+            return (self.starts[i], self.starts[i] + self.counts[i])
+        if self.kind == _BOOL:
+            return bool(self.values[i])
+        return self.values[i]
+
+
+class ModelBatch(Sequence):
+    """
+    Lazily decoded batch of models.
+
+    Holds a view of the encoded data, each model is built when it is accessed. Models are reattached to `client`.
+    """
+
+    def __init__(self, data: bytes | bytearray | memoryview, *, client: Optional[Client] = None) -> None:
+
+        self.client = client
+        view = memoryview(data).cast("B")
+        reader = _Reader(view)
+
+        magic, version, count = _HEADER.unpack(reader.read(_HEADER.size))
+        if magic != MAGIC:
+            raise SerializationError("Not a pyaccord model batch")
+        if version != VERSION:
+            raise SerializationError(f"Unsupported model batch version {version}, this pyaccord reads {VERSION}")
+
+        self._count = count
+        self._order_tags = reader.read_array("B", count)
+        self._order_indexes = reader.read_array("I", count)
+
+        section_count = reader.read(1)[0]
+        reader.align()
+
+        self._sections: Dict[int, List[_DecodedColumn]] = {}
+        for _ in range(section_count):
+            tag, items = _SECTION.unpack(reader.read(_SECTION.size))
+            if tag not in _SCHEMAS:
+                raise SerializationError(f"Unknown section {tag}")
+            self._sections[tag] = [_DecodedColumn(kind, reader, items) for kind, _ in _SCHEMAS[tag]]
+        # Rows of the sections decoded a whole column at a time by `_materialize`
+        self._rows: Dict[int, List[Tuple[Any, ...]]] = {}
+
+        self._decoders: Dict[int, Callable[[int], Any]] = {
+            _ROLE: self._decode_role,
+            _CHANNEL: self._decode_channel,
+            _GUILD: self._decode_guild,
+            _INVITE: self._decode_invite,
+            _USER: self._decode_user,
+            _CURRENT_USER: self._decode_current_user,
+            _WEBHOOK: self._decode_webhook,
+        }
+
+    def __repr__(self) -> str:
+        return f"<ModelBatch: {len(self)} models>"
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("Model batch index out of range")
+        return self._decode(self._order_tags[i], self._order_indexes[i])
+
+    def __iter__(self) -> Iterator[Any]:
+        # Every model is about to be built, decoding whole columns is much cheaper than cell by cell
+        self._materialize()
+        for i in range(len(self)):
+            yield self._decode(self._order_tags[i], self._order_indexes[i])
+
+    def _row(self, tag: int, i: int) -> Sequence[Any]:
+        rows = self._rows.get(tag)
+        if rows is not None:
+            return rows[i]
+        return [column[i] for column in self._sections[tag]]
+
+    def _materialize(self) -> None:
+        """Decode every column at once, after which building models no longer decodes them value by value."""
+
+        for tag, columns in self._sections.items():
+            if tag not in self._rows:
+                self._rows[tag] = list(zip(*[column.tolist() for column in columns]))
+
+    def _decode(self, tag: int, i: int) -> Any:
+        return self._decoders[tag](i)
+
+    def _build_all(self) -> List[Any]:
+        """
+        Build every model in order.
+
+        Each section's models are built in one pass over its rows and nested roles, channels and overwrites are
+        sliced out of those lists, rather than decoding every model and its nested models one by one.
+        """
+
+        self._materialize()
+        client = self.client
+        rows = self._rows
+
+        overwrites = [{"id": str(id), "type": type_int, "allow": str(allow), "deny": str(deny)}
+                      for id, type_int, allow, deny in rows.get(_OVERWRITE, ())]
+
+        roles = [Role(id, name, position=position, hoist=hoist, managed=managed, mentionable=mentionable,
+                      client=client)
+                 for id, name, position, hoist, managed, mentionable in rows.get(_ROLE, ())]
+
+        channels = []
+        for id, type_int, guild_id, position, name, overwrite_range in rows.get(_CHANNEL, ()):
+            channel = object.__new__(TextChannel if type_int == 0 else Channel)
+            BaseChannel.__init__(
+                channel, id, type_int=type_int, position=position, name=name, guild_id=guild_id, client=client,
+                raw_permission_overwrites=overwrites[overwrite_range[0]:overwrite_range[1]]
+                if overwrite_range else None)
+            channels.append(channel)
+
+        guilds = []
+        for id, name, public_updates_channel_id, icon, role_range, channel_range in rows.get(_GUILD, ()):
+            guild = Guild(id, name, icon=icon, client=client)
+            guild._public_updates_channel_id = public_updates_channel_id
+            guild._roles = roles[role_range[0]:role_range[1]] if role_range else None
+            guild._channels = channels[channel_range[0]:channel_range[1]] if channel_range else None
+            guilds.append(guild)
+
+        built: Dict[int, List[Any]] = {_ROLE: roles, _CHANNEL: channels, _GUILD: guilds}
+        for tag in (_INVITE, _USER, _CURRENT_USER, _WEBHOOK):
+            if tag in rows:
+                built[tag] = [self._decoders[tag](i) for i in range(len(rows[tag]))]
+
+        return [built[tag][i] for tag, i in zip(self._order_tags.tolist(), self._order_indexes.tolist())]
+
+    def _decode_role(self, i: int) -> Role:
+        id, name, position, hoist, managed, mentionable = self._row(_ROLE, i)
+        return Role(id, name, position=position, hoist=hoist, managed=managed, mentionable=mentionable,
+                    client=self.client)
+
+    def _decode_overwrite(self, i: int) -> dict:
+        id, type_int, allow, deny = self._row(_OVERWRITE, i)
+        return {"id": str(id), "type": type_int, "allow": str(allow), "deny": str(deny)}
+
+    def _decode_channel(self, i: int) -> BaseChannel:
+        id, type_int, guild_id, position, name, overwrites = self._row(_CHANNEL, i)
+
+        channel = object.__new__(TextChannel if type_int == 0 else Channel)
+        BaseChannel.__init__(
+            channel, id, type_int=type_int, position=position, name=name, guild_id=guild_id, client=self.client,
+            raw_permission_overwrites=[self._decode_overwrite(j) for j in range(*overwrites)] if overwrites else None)
+        return channel
+
+    def _decode_guild(self, i: int) -> Guild:
+        id, name, public_updates_channel_id, icon, roles, channels = self._row(_GUILD, i)
+
+        guild = Guild(id, name, icon=icon, client=self.client)
+        guild._public_updates_channel_id = public_updates_channel_id
+        guild._roles = [self._decode_role(j) for j in range(*roles)] if roles else None
+        guild._channels = [self._decode_channel(j) for j in range(*channels)] if channels else None
+        return guild
+
+    def _decode_invite(self, i: int) -> Invite:
+        code, max_age, max_uses, temporary = self._row(_INVITE, i)
+        return Invite(code, max_age=max_age, max_uses=max_uses, temporary=temporary, client=self.client)
+
+    def _decode_user(self, i: int) -> User:
+        id, username, discriminator, avatar = self._row(_USER, i)
+        return User(id, username, discriminator, avatar=avatar, client=self.client)
+
+    def _decode_current_user(self, i: int) -> CurrentUser:
+        id, username, discriminator, avatar = self._row(_CURRENT_USER, i)
+        return CurrentUser(id, username, discriminator, avatar=avatar, client=self.client)
+
+    def _decode_webhook(self, i: int) -> Webhook:
+        id, token, channel_id, guild_id, name, type_int, api_version = self._row(_WEBHOOK, i)
+        return Webhook(id, token, channel_id=channel_id, guild_id=guild_id, name=name, type_int=type_int,
+                       api_version=api_version, client=self.client)
+
+
+def loads(data: bytes | bytearray | memoryview, *, client: Optional[Client] = None) -> List[Any]:
+    """Decode every model in a batch, attaching them to `client`."""
+
+    return ModelBatch(data, client=client)._build_all()
+
+# endregion
@@ -0,0 +1,42 @@
+"""Functions for converting between Discord snowflakes and times."""
+
+from __future__ import annotations
+
+import datetime
+
+DISCORD_EPOCH = 1420070400000
+"""Milliseconds since the unix epoch of the first second of 2015, the start of Discord time."""
+
+
+def snowflake_time(snowflake: int) -> datetime.datetime:
+    """Return the timezone aware UTC time the snowflake was created at."""
+
+    timestamp_ms = (int(snowflake) >> 22) + DISCORD_EPOCH
+    return datetime.datetime.fromtimestamp(timestamp_ms / 1000, tz=datetime.timezone.utc)
+
+
+def time_snowflake(dt: datetime.datetime, *, high: bool = False) -> int:
+    """
+    Return a snowflake to use as a `before` or `after` cursor for the given time.
+
+    Naive datetimes are treated as UTC. With `high` set the lowest 22 bits are all set, so the snowflake sorts
+    after every real snowflake created in the same millisecond, use it for `after` cursors that should be exclusive
+    of that millisecond and `before` cursors that should be inclusive of it.
+    """
+
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+
+    timestamp_ms = int(dt.timestamp() * 1000) - DISCORD_EPOCH
+    if timestamp_ms < 0:
+        timestamp_ms = 0
+
+    return (timestamp_ms << 22) + (2 ** 22 - 1 if high else 0)
+
+
+def to_snowflake(value: int | str | datetime.datetime, *, high: bool = False) -> int:
+    """Return the snowflake for an id, or the cursor snowflake for a datetime."""
+
+    if isinstance(value, datetime.datetime):
+        return time_snowflake(value, high=high)
+    return int(value)
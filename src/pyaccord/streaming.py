@@ -0,0 +1,96 @@
+"""Incremental decoding of JSON array responses."""
+
+from __future__ import annotations
+
+import codecs
+import json
+from typing import Any, Iterable, Iterator
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+# Consumed text is dropped from the buffer once this much has built up
+_COMPACT_THRESHOLD = 64 * 1024
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """
+    Yield the elements of a top level JSON array as soon as each one has been fully received.
+
+    Only the current element and the unread part of the last chunk are held in memory.
+    """
+
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    started = False
+    finished = False
+    # Whether the next token must be a value, rather than the "," or "]" that follows one
+    expect_value = True
+    empty = True
+    chunks_iter = iter(chunks)
+
+    while True:
+        chunk = next(chunks_iter, None)
+        final = chunk is None
+        buffer += text_decoder.decode(chunk or b"", final=final)
+
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            if position >= len(buffer):
+                break
+
+            if finished:
+                raise ValueError(f"Unexpected data after the end of the JSON array: {buffer[position:position + 20]!r}")
+
+            if not started:
+                if buffer[position] != "[":
+                    raise ValueError(f"Expected a JSON array, got {buffer[position:position + 20]!r}")
+                started = True
+                position += 1
+                continue
+
+            if buffer[position] == "]":
+                if expect_value and not empty:
+                    raise ValueError("Expected a value before the end of the JSON array")
+                finished = True
+                position += 1
+                continue
+
+            if buffer[position] == ",":
+                if expect_value:
+                    raise ValueError(f"Expected a value, got {buffer[position:position + 20]!r}")
+                expect_value = True
+                position += 1
+                continue
+
+            if not expect_value:
+                raise ValueError(f"Expected ',' or ']' between array elements, got {buffer[position:position + 20]!r}")
+
+            try:
+                element, end = _decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                # The element is not complete yet
+                break
+
+            if end == len(buffer) and not final and type(element) in (int, float):
+                # A number could still be missing digits, wait until something follows it
+                break
+
+            position = end
+            expect_value = False
+            empty = False
+            yield element
+
+        if position > _COMPACT_THRESHOLD:
+            buffer = buffer[position:]
+            position = 0
+
+        if final:
+            break
+
+    if not finished:
+        raise ValueError("JSON array was not terminated")
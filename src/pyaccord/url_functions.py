@@ -29,3 +29,31 @@ def get_authorization_url(version=None):
 def get_token_url(version=None):
     """Return the token api endpoint url."""
     return get_api_url(version) + TOKEN_URL_PATH
+
+
+class Route:
+    """An API endpoint, used to find the rate limit bucket a request belongs to."""
+
+    # Discord rate limits each value of these parameters separately
+    MAJOR_PARAMETERS = ("channel_id", "guild_id", "webhook_id", "webhook_token")
+
+    def __init__(self, method: str, path: str, **parameters) -> None:
+        self.method = method
+        self.path = path
+        self.parameters = parameters
+
+    def __repr__(self) -> str:
+        return f"<Route: {self.method} {self.path.format(**self.parameters)}>"
+
+    @property
+    def key(self) -> str:
+        """The method and unformatted path, requests with the same key share a bucket hash."""
+        return f"{self.method} {self.path}"
+
+    @property
+    def major(self) -> str:
+        """The values of the major parameters, which split a bucket."""
+        return ":".join(str(self.parameters[p]) for p in self.MAJOR_PARAMETERS if p in self.parameters)
+
+    def url(self, version: Optional[int] = None) -> str:
+        return get_api_url(version) + self.path.format(**self.parameters)
@@ -1,6 +1,8 @@
 from __future__ import annotations
 from typing import Dict, List, Optional, TYPE_CHECKING
 
+from .assets import asset_url, default_avatar_url
+
 if TYPE_CHECKING:
     from client import Client
     from guild import Guild
@@ -11,15 +13,17 @@ class User:
     id: int
     username: Optional[str]
     discriminator: Optional[str]
+    avatar: Optional[str]
     _client: Optional[Client]
     _is_current_user: bool
 
     def __init__(
             self, id: int, username: Optional[str] = None, discriminator: Optional[str] = None, *,
-            client: Optional[Client] = None) -> None:
+            avatar: Optional[str] = None, client: Optional[Client] = None) -> None:
         self.id = id
         self.username = username
         self.discriminator = discriminator
+        self.avatar = avatar
         self._client = client
 
     @staticmethod
@@ -28,6 +32,7 @@ class User:
             id=d["id"],
             username=d["username"],
             discriminator=d["discriminator"],
+            avatar=d.get("avatar"),
             client=client,
             **kwargs
         )
@@ -35,6 +40,17 @@ class User:
     def __repr__(self) -> str:
         return f"<User: {self.username}#{self.discriminator} with id: {self.id}>"
 
+    def __getstate__(self) -> dict:
+        return dict(self.__dict__, _client=None)
+
+    def avatar_url(self, *, size: Optional[int] = None, format: Optional[str] = None) -> str:
+        """The CDN url of the user's avatar, or of their default avatar if they haven't set one."""
+
+        if self.avatar:
+            return asset_url(f"avatars/{self.id}", self.avatar, size=size, format=format)
+
+        return default_avatar_url(self.id, self.discriminator)
+
 
 class CurrentUser(User):
 
@@ -55,6 +71,7 @@ class CurrentUser(User):
             id=d["id"],
             username=d["username"],
             discriminator=d["discriminator"],
+            avatar=d.get("avatar"),
             client=client,
             **kwargs
         )
@@ -0,0 +1,186 @@
+"""Object representation of a Discord Webhook and sending messages through webhooks."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+from typing import Dict, List, Optional, TYPE_CHECKING, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .DiscordMessage import Message
+from .deadline import Deadline, current_deadline
+from .exceptions import NoPyaccordClientProvidedError
+from .ratelimit import RateLimitBackend, RateLimiter
+from .url_functions import Route, get_api_url
+
+if TYPE_CHECKING:
+    from client import Client
+
+logger = logging.getLogger("DiscordAPI")
+
+WEBHOOK_URL_PATTERN = re.compile(r"/webhooks/(?P<id>\d+)/(?P<token>[\w-]+)")
+
+# Webhook executions authenticate with the token in the url, so every webhook send shares one keep-alive pool
+# regardless of which client or bot created the webhook.
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+_session.headers.update({"User-Agent": "WebsiteServerClient (engfrosh.com, 1)"})
+
+
+class Webhook:
+
+    id: int
+    token: Optional[str]
+    channel_id: Optional[int]
+    guild_id: Optional[int]
+    name: Optional[str]
+    type_int: Optional[int]
+    api_version: Optional[int]
+
+    _client: Optional[Client]
+
+    def __init__(
+            self, id: int, token: Optional[str] = None, *, channel_id: Optional[int] = None,
+            guild_id: Optional[int] = None, name: Optional[str] = None, type_int: Optional[int] = None,
+            api_version: Optional[int] = None, client: Optional[Client] = None) -> None:
+        self.id = id
+        self.token = token
+        self.channel_id = channel_id
+        self.guild_id = guild_id
+        self.name = name
+        self.type_int = type_int
+        self.api_version = api_version
+        self._client = client
+
+    def __repr__(self) -> str:
+        return f"<Webhook: {self.name} #{self.id}>"
+
+    def __getstate__(self) -> dict:
+        return dict(self.__dict__, _client=None)
+
+    @property
+    def url(self) -> str:
+        """The url to execute the webhook, does not require any other authorization."""
+
+        if not self.token:
+            raise ValueError(f"Webhook {self.id} has no token, it can only be executed by its owner")
+
+        return get_api_url(self.api_version) + f"/webhooks/{self.id}/{self.token}"
+
+    @staticmethod
+    def from_url(url: str, *, client: Optional[Client] = None) -> Webhook:
+        """Create a webhook from its execution url."""
+
+        match = WEBHOOK_URL_PATTERN.search(url)
+        if not match:
+            raise ValueError(f"Not a webhook url: {url}")
+
+        return Webhook(int(match["id"]), match["token"], client=client)
+
+    @staticmethod
+    def from_dict(d: Dict, *, client: Optional[Client] = None, **kwargs) -> Webhook:
+        return Webhook(
+            id=int(d["id"]),
+            token=d.get("token"),
+            channel_id=int(d["channel_id"]) if d.get("channel_id") else None,
+            guild_id=int(d["guild_id"]) if d.get("guild_id") else None,
+            name=d.get("name"),
+            type_int=d.get("type"),
+            api_version=client.api_version if client else None,
+            client=client,
+            **kwargs
+        )
+
+    @staticmethod
+    def from_list_of_dict(lst: List[Dict], *, client: Optional[Client] = None, **kwargs) -> List[Webhook]:
+        webhooks = []
+        for w in lst:
+            webhooks.append(Webhook.from_dict(w, client=client, **kwargs))
+
+        return webhooks
+
+    def send(self, message: Union[str, Message], *, username: Optional[str] = None,
+             avatar_url: Optional[str] = None, wait: bool = False, timeout: Optional[float] = None) -> Optional[dict]:
+        """Send a message through the webhook."""
+
+        backend = self._client.rate_limiter.backend if self._client else None
+
+        return execute_webhook(
+            self.url, message, username=username, avatar_url=avatar_url, wait=wait, timeout=timeout,
+            rate_limit_backend=backend)
+
+    def delete(self) -> None:
+
+        if not self._client:
+            raise NoPyaccordClientProvidedError
+
+        self._client.delete_webhook(self)
+
+
+def execute_webhook(
+        url: str, message: Union[str, Message], *, username: Optional[str] = None,
+        avatar_url: Optional[str] = None, wait: bool = False, max_retries: int = 5,
+        timeout: Optional[float] = None, rate_limit_backend: Optional[RateLimitBackend] = None) -> Optional[dict]:
+    """
+    Send a message to a webhook url over the shared connection pool.
+
+    Returns the message json if `wait` is set, otherwise Discord does not return the message.
+    `timeout` bounds the whole send including rate limit waits, raising DeadlineExceededError if it runs out.
+    Sends are rate limited per webhook, sharing state with every other sender using the same backend.
+    """
+
+    match = WEBHOOK_URL_PATTERN.search(url)
+    if not match:
+        raise ValueError(f"Not a webhook url: {url}")
+
+    route = Route("POST", "/webhooks/{webhook_id}/{webhook_token}",
+                  webhook_id=match["id"], webhook_token=match["token"])
+    # Webhook executions are limited per webhook rather than against the bot that created it
+    rate_limiter = RateLimiter(match["token"], rate_limit_backend)
+
+    deadline = Deadline(timeout) if timeout is not None else current_deadline()
+
+    if isinstance(message, str):
+        message = Message(text=message)
+
+    data: Dict[str, Union[str, bool]] = {"content": message.text}
+    if username:
+        data["username"] = username
+    if avatar_url:
+        data["avatar_url"] = avatar_url
+
+    params = {"wait": "true"} if wait else None
+
+    for _ in range(max_retries):
+        rate_limiter.acquire(route.key, route.major, deadline=deadline)
+
+        request_timeout = deadline.check("webhook send") if deadline is not None else None
+
+        if message.file_path:
+            filename = message.display_filename or os.path.basename(message.file_path)
+            with open(message.file_path, "rb") as f:
+                r = _session.post(url, params=params, data={"payload_json": json.dumps(data)},
+                                  files={"files[0]": (filename, f)}, timeout=request_timeout)
+        else:
+            r = _session.post(url, params=params, json=data, timeout=request_timeout)
+
+        retry_after = rate_limiter.release(route.key, route.major, r)
+
+        if r.status_code != 429:
+            break
+
+        logger.warning(f"Webhook {match['id']} rate limited, retrying")
+        if retry_after:
+            rate_limiter.backoff(retry_after, route.key, deadline=deadline)
+
+    if not r.ok:
+        logger.error(f"{r.content}")
+    r.raise_for_status()
+
+    if wait:
+        return r.json()
+    return None
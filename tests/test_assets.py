@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+from pyaccord import AssetCache, assets
+from pyaccord.guild import Guild
+from pyaccord.user import User
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b"", headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.ok = status_code < 400
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise RuntimeError(self.status_code)
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), 3):
+            yield self.body[i:i + 3]
+
+
+@pytest.fixture
+def cdn(monkeypatch):
+    requests = []
+    lock = threading.Lock()
+
+    def get(url, headers, stream, timeout):
+        with lock:
+            requests.append((url, headers))
+        time.sleep(0.05)
+        if headers.get("If-None-Match") == '"v1"':
+            return FakeResponse(304)
+        return FakeResponse(200, url.encode() * 10, {"ETag": '"v1"'})
+
+    monkeypatch.setattr(assets._session, "get", get)
+    return requests
+
+
+def test_asset_urls():
+    guild = Guild(1, "guild", icon="a_abc")
+    assert guild.icon_url() == "https://cdn.discordapp.com/icons/1/a_abc.gif"
+    assert guild.icon_url(size=64, format="webp") == "https://cdn.discordapp.com/icons/1/a_abc.webp?size=64"
+    assert Guild(1, "guild").icon_url() is None
+    avatar_url = User(2, "user", "0", avatar="def").avatar_url(size=128)
+    assert avatar_url == "https://cdn.discordapp.com/avatars/2/def.png?size=128"
+    assert User(2, "user", "0007").avatar_url() == "https://cdn.discordapp.com/embed/avatars/2.png"
+    with pytest.raises(ValueError):
+        guild.icon_url(size=100)
+
+
+def test_repeat_fetches_are_served_from_disk(tmp_path, cdn):
+    cache = AssetCache(str(tmp_path))
+    url = Guild(1, "guild", icon="abc").icon_url(size=64)
+
+    threads = [threading.Thread(target=cache.fetch, args=(url,)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert cache.read(url) == url.encode() * 10
+    assert len(cdn) == 1
+
+    # A new cache on the same directory picks up the index
+    assert AssetCache(str(tmp_path)).read(url) == url.encode() * 10
+    assert len(cdn) == 1
+
+
+def test_stale_assets_are_revalidated(tmp_path, cdn):
+    cache = AssetCache(str(tmp_path), revalidate_after=0)
+    url = User(2, "user", "0", avatar="def").avatar_url()
+
+    path = cache.fetch(url)
+    assert cache.fetch(url) == path
+
+    assert cdn[1] == (url, {"If-None-Match": '"v1"'})
+    assert cache.read(url) == url.encode() * 10
+
+
+def test_least_recently_used_assets_are_evicted(tmp_path, cdn):
+    urls = [Guild(i, "guild", icon="abc").icon_url() for i in range(3)]
+    cache = AssetCache(str(tmp_path), max_bytes=len(urls[0].encode() * 10) * 2)
+
+    cache.fetch(urls[0])
+    cache.fetch(urls[1])
+    cache.fetch(urls[0])
+    cache.fetch(urls[2])
+
+    assert len(cache) == 2
+    assert cache.total_bytes <= cache.max_bytes
+    cache.fetch(urls[0])
+    assert len(cdn) == 3
+    cache.fetch(urls[1])
+    assert len(cdn) == 4
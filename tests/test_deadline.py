@@ -0,0 +1,40 @@
+import threading
+import time
+
+import pytest
+
+from pyaccord import Client, DeadlineExceededError, LocalRateLimitBackend
+from pyaccord.url_functions import Route
+
+
+def test_rate_limit_wait_past_deadline_fails_fast():
+    backend = LocalRateLimitBackend()
+    client = Client("FAKE BOT TOKEN", rate_limit_backend=backend)
+    backend.block(client.rate_limiter.key, time.time() + 30)
+
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceededError):
+        with client.deadline(1):
+            client.get_guild(1234)
+
+    assert time.monotonic() - start < 0.5
+
+
+def test_hedged_request_uses_first_response(monkeypatch):
+    client = Client("FAKE BOT TOKEN", rate_limit_backend=LocalRateLimitBackend(), hedge_after=0.05)
+    calls = []
+    lock = threading.Lock()
+
+    def fake_send(route, url, deadline, **kwargs):
+        with lock:
+            calls.append(time.monotonic())
+            attempt = len(calls)
+        if attempt == 1:
+            time.sleep(1)
+        return attempt
+
+    monkeypatch.setattr(client, "_send", fake_send)
+
+    start = time.monotonic()
+    assert client._send_hedged(Route("GET", "/guilds/{guild_id}", guild_id=1), "", None) == 2
+    assert time.monotonic() - start < 0.5
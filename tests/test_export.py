@@ -0,0 +1,49 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from pyaccord import ChannelExporter
+
+
+class FakeClient:
+
+    def __init__(self, count, fail_after=None):
+        self.ids = list(range(1000, 1000 + count))
+        self.fail_after = fail_after
+
+    def iter_channel_messages(self, channel, *, after=None, before=None, oldest_first=False):
+        assert oldest_first
+        for i, message_id in enumerate(m for m in self.ids if m > after):
+            if self.fail_after is not None and i == self.fail_after:
+                raise ConnectionError("connection dropped")
+            yield {"id": str(message_id), "channel_id": str(channel)}
+
+
+def read_ids(path):
+    with gzip.open(path, "rt") as f:
+        return [int(json.loads(line)["id"]) for line in f]
+
+
+def test_export_resumes_after_interruption(tmp_path):
+    with pytest.raises(ConnectionError):
+        ChannelExporter(FakeClient(250, fail_after=120), str(tmp_path), checkpoint_every=50).export_channel(7)
+
+    exporter = ChannelExporter(FakeClient(250), str(tmp_path), checkpoint_every=50)
+    assert exporter.export_channel(7) == 250
+    assert read_ids(exporter.output_path(7)) == list(range(1000, 1250))
+
+    # A completed export is not fetched again
+    assert exporter.export_channels([7]) == {7: 250}
+
+
+def test_export_starts_over_when_the_file_is_gone(tmp_path):
+    with pytest.raises(ConnectionError):
+        ChannelExporter(FakeClient(250, fail_after=120), str(tmp_path), checkpoint_every=50).export_channel(7)
+
+    exporter = ChannelExporter(FakeClient(250), str(tmp_path), checkpoint_every=50)
+    os.remove(exporter.output_path(7))
+
+    assert exporter.export_channel(7) == 250
+    assert read_ids(exporter.output_path(7)) == list(range(1000, 1250))
@@ -0,0 +1,229 @@
+import json
+import queue
+import time
+
+from pyaccord import Client, LocalRateLimitBackend
+from pyaccord import gateway
+from pyaccord.gateway import GatewayClosedError, GatewayOpcode
+
+
+class StandInConnection:
+    """Both ends of an in-memory websocket."""
+
+    def __init__(self, url):
+        self.url = url
+        self.to_client = queue.Queue()
+        self.to_server = queue.Queue()
+
+    # Client side transport
+    def send(self, data):
+        self.to_server.put(json.loads(data))
+
+    def recv(self):
+        item = self.to_client.get(timeout=5)
+        if item is None:
+            raise GatewayClosedError(4000, "closed")
+        if isinstance(item, int):
+            raise GatewayClosedError(item, "closed")
+        return json.dumps(item)
+
+    def close(self, code=1000):
+        self.to_client.put(None)
+
+    # Server side
+    def close_with(self, code):
+        self.to_client.put(code)
+
+    def push(self, op, d=None, t=None, s=None):
+        self.to_client.put({"op": int(op), "d": d, "t": t, "s": s})
+
+    def expect(self, op):
+        while True:
+            payload = self.to_server.get(timeout=5)
+            if payload["op"] != GatewayOpcode.HEARTBEAT:
+                assert payload["op"] == op
+                return payload["d"]
+
+
+class StandInGateway:
+
+    def __init__(self):
+        self.connections = queue.Queue()
+
+    def connect(self, url):
+        connection = StandInConnection(url)
+        self.connections.put(connection)
+        return connection
+
+    def accept(self):
+        connection = self.connections.get(timeout=5)
+        connection.push(GatewayOpcode.HELLO, {"heartbeat_interval": 45000})
+        return connection
+
+
+def wait_for(condition):
+    end = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < end
+        time.sleep(0.01)
+
+
+GUILD = {
+    "id": "100", "name": "Guild",
+    "roles": [{"id": "100", "name": "@everyone", "position": 0, "hoist": False, "managed": False,
+               "mentionable": False}],
+    "channels": [{"id": "200", "name": "general", "type": 0, "position": 0, "permission_overwrites": []}],
+    "members": [],
+}
+
+
+def test_gateway_cache_serves_reads_and_resumes():
+    server = StandInGateway()
+    client = Client("FAKE BOT TOKEN", rate_limit_backend=LocalRateLimitBackend())
+
+    def no_http(*args, **kwargs):
+        raise AssertionError("Read should have been served from the gateway cache")
+
+    client._request = no_http
+    client.connect_gateway(url="wss://gateway.invalid", shard_count=1, connect=server.connect)
+
+    connection = server.accept()
+    identify = connection.expect(GatewayOpcode.IDENTIFY)
+    assert identify["shard"] == [0, 1]
+
+    connection.push(GatewayOpcode.DISPATCH, {"session_id": "abc", "resume_gateway_url": "wss://resume.invalid"},
+                    "READY", 1)
+    connection.push(GatewayOpcode.DISPATCH, GUILD, "GUILD_CREATE", 2)
+    wait_for(lambda: client.gateway.is_live(100))
+
+    assert client.get_guild(100).name == "Guild"
+    assert [c.name for c in client.get_guild_channels(100)] == ["general"]
+
+    role = {"id": "101", "name": "Mods", "position": 1, "hoist": True, "managed": False, "mentionable": True}
+    connection.push(GatewayOpcode.DISPATCH, {"guild_id": "100", "role": role}, "GUILD_ROLE_CREATE", 3)
+    wait_for(lambda: len(client.get_guild_roles(100)) == 2)
+
+    # Gateway asks for a reconnect, the shard resumes where it left off
+    connection.push(GatewayOpcode.RECONNECT)
+    connection = server.accept()
+    assert connection.url.startswith("wss://resume.invalid")
+    assert connection.expect(GatewayOpcode.RESUME) == {"token": "FAKE BOT TOKEN", "session_id": "abc", "seq": 3}
+
+    connection.push(GatewayOpcode.DISPATCH, None, "RESUMED", 4)
+    connection.push(GatewayOpcode.DISPATCH, {"id": "200", "guild_id": "100"}, "CHANNEL_DELETE", 5)
+    wait_for(lambda: client.gateway.is_live(100) and client.gateway.cache.get_channel(200) is None)
+    assert client.get_guild_channels(100) == []
+
+    client.disconnect_gateway()
+
+
+def test_new_session_forgets_guilds_and_failing_gateway_backs_off(monkeypatch):
+    monkeypatch.setattr(gateway.random, "uniform", lambda a, b: 0)
+    monkeypatch.setattr(gateway, "IDENTIFY_INTERVAL", 0.05)
+    server = StandInGateway()
+    client = Client("FAKE BOT TOKEN", rate_limit_backend=LocalRateLimitBackend())
+    client.connect_gateway(url="wss://gateway.invalid", shard_count=1, connect=server.connect)
+
+    connection = server.accept()
+    connection.expect(GatewayOpcode.IDENTIFY)
+    connection.push(GatewayOpcode.DISPATCH, {"session_id": "abc"}, "READY", 1)
+    connection.push(GatewayOpcode.DISPATCH, GUILD, "GUILD_CREATE", 2)
+    wait_for(lambda: client.gateway.is_live(100))
+
+    # The session can't be resumed, the bot leaves the guild before the new session is ready
+    connection.push(GatewayOpcode.INVALID_SESSION, False)
+    connection = server.accept()
+    connection.expect(GatewayOpcode.IDENTIFY)
+    connection.push(GatewayOpcode.DISPATCH, {"session_id": "def"}, "READY", 1)
+    wait_for(lambda: client.gateway.shards[0].live)
+    assert not client.gateway.cache.has_guild(100)
+
+    # A gateway that closes every connection before it is ready is retried with a growing wait
+    connection.close()
+    start = time.monotonic()
+    attempts = 0
+    while time.monotonic() - start < 2.5:
+        try:
+            server.connections.get(timeout=0.1).close()
+            attempts += 1
+        except queue.Empty:
+            pass
+    assert 1 <= attempts <= 3
+
+    client.disconnect_gateway()
+
+
+def test_timed_out_session_identifies_again(monkeypatch):
+    monkeypatch.setattr(gateway, "IDENTIFY_INTERVAL", 0.05)
+    server = StandInGateway()
+    client = Client("FAKE BOT TOKEN", rate_limit_backend=LocalRateLimitBackend())
+    client.connect_gateway(url="wss://gateway.invalid", shard_count=1, connect=server.connect)
+
+    connection = server.accept()
+    connection.expect(GatewayOpcode.IDENTIFY)
+    connection.push(GatewayOpcode.DISPATCH, {"session_id": "abc", "resume_gateway_url": "wss://resume.invalid"},
+                    "READY", 1)
+    wait_for(lambda: client.gateway.shards[0].live)
+
+    connection.close_with(4009)
+    connection = server.accept()
+    assert connection.url.startswith("wss://gateway.invalid")
+    connection.expect(GatewayOpcode.IDENTIFY)
+    assert client.gateway.shards[0].session_id is None
+
+    client.disconnect_gateway()
+
+
+def test_shards_identify_within_max_concurrency(monkeypatch):
+    monkeypatch.setattr(gateway, "IDENTIFY_INTERVAL", 0.3)
+    server = StandInGateway()
+    client = Client("FAKE BOT TOKEN", rate_limit_backend=LocalRateLimitBackend())
+
+    class GatewayBotResponse:
+        def json(self):
+            return {"url": "wss://gateway.invalid", "shards": 4, "session_start_limit": {"max_concurrency": 2}}
+
+    client._request = lambda route, **kwargs: GatewayBotResponse()
+    start = time.monotonic()
+    client.connect_gateway(connect=server.connect)
+
+    identified = {}
+    for _ in range(4):
+        connection = server.accept()
+        shard_id = connection.expect(GatewayOpcode.IDENTIFY)["shard"][0]
+        identified[shard_id] = time.monotonic() - start
+    client.disconnect_gateway()
+
+    assert max(identified[0], identified[1]) < 0.2
+    assert min(identified[2], identified[3]) >= 0.25
+
+
+def test_requested_members_are_served_from_the_cache():
+    server = StandInGateway()
+    client = Client("FAKE BOT TOKEN", rate_limit_backend=LocalRateLimitBackend())
+
+    def no_http(*args, **kwargs):
+        raise AssertionError("Members should have been served from the gateway cache")
+
+    client.connect_gateway(url="wss://gateway.invalid", shard_count=1, connect=server.connect, request_members=True)
+    client._request = no_http
+
+    connection = server.accept()
+    connection.expect(GatewayOpcode.IDENTIFY)
+    connection.push(GatewayOpcode.DISPATCH, {"session_id": "abc"}, "READY", 1)
+    connection.push(GatewayOpcode.DISPATCH, GUILD, "GUILD_CREATE", 2)
+    assert connection.expect(GatewayOpcode.REQUEST_GUILD_MEMBERS)["guild_id"] == "100"
+
+    members = [{"user": {"id": str(user_id)}, "roles": []} for user_id in (5, 3, 4)]
+    connection.push(GatewayOpcode.DISPATCH, {"guild_id": "100", "members": members[:2], "chunk_index": 0,
+                                             "chunk_count": 2}, "GUILD_MEMBERS_CHUNK", 3)
+    wait_for(lambda: client.gateway.cache.members.get(100))
+    # Until the last chunk arrives the cache only has some of the members
+    assert client.gateway.cache.get_members(100) is None
+
+    connection.push(GatewayOpcode.DISPATCH, {"guild_id": "100", "members": members[2:], "chunk_index": 1,
+                                             "chunk_count": 2}, "GUILD_MEMBERS_CHUNK", 4)
+    wait_for(lambda: client.gateway.cache.get_members(100) is not None)
+    assert [m["user"]["id"] for m in client.iter_guild_members(100)] == ["3", "4", "5"]
+
+    client.disconnect_gateway()
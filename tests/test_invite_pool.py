@@ -0,0 +1,68 @@
+import itertools
+import time
+
+import pytest
+
+from pyaccord import DeadlineExceededError, Invite, InvitePool
+from pyaccord.exceptions import InvitePoolEmptyError
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.codes = itertools.count()
+
+    def create_channel_invite(self, channel, *, max_age=None, max_uses=None, temporary=None, unique=None):
+        assert unique
+        return Invite(f"code{next(self.codes)}", max_age=max_age, max_uses=max_uses)
+
+
+def test_invite_pool_hands_out_unique_invites():
+    with InvitePool(FakeClient(), 1234, size=3, refill_interval=0) as pool:
+        codes = [pool.get(timeout=5).code for _ in range(6)]
+
+    assert len(set(codes)) == 6
+    assert codes == sorted(codes, key=lambda c: int(c[4:]))
+
+
+def test_invites_are_dropped_before_they_expire():
+    client = FakeClient()
+    with InvitePool(client, 1234, size=1, max_age=2, expiry_margin=1.9, refill_interval=10) as pool:
+        assert pool.get(timeout=5).code == "code0"
+        # The refill after taking one waits out refill_interval, so only its next invite can expire
+        pool.stop()
+        pool._invites.append((time.monotonic() + 0.1, Invite("late")))
+        time.sleep(0.2)
+
+        assert len(pool) == 0
+        with pytest.raises(InvitePoolEmptyError):
+            pool.get(block=False)
+
+
+class FailingClient(FakeClient):
+
+    def __init__(self, error):
+        super().__init__()
+        self.error = error
+
+    def create_channel_invite(self, channel, **kwargs):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        return super().create_channel_invite(channel, **kwargs)
+
+
+def test_refill_recovers_from_failures():
+    client = FailingClient(DeadlineExceededError("invites bucket blocked"))
+    with InvitePool(client, 1234, size=1, refill_interval=0) as pool:
+        assert pool.get(timeout=5).code == "code0"
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_get_does_not_hang_when_refill_thread_dies():
+    pool = InvitePool(FailingClient(SystemExit()), 1234, size=1, refill_interval=0)
+
+    with pytest.raises(InvitePoolEmptyError):
+        pool.get(timeout=5)
+    pool._thread.join(5)
+    assert not pool._thread.is_alive()
@@ -0,0 +1,30 @@
+from pyaccord import MembershipIndex
+
+
+def member(user_id, *roles):
+    return {"user": {"id": str(user_id)}, "roles": [str(r) for r in roles]}
+
+
+def test_membership_index_queries_and_updates():
+    index = MembershipIndex.from_members(1, [
+        member(30, 100, 200),
+        member(10, 100),
+        member(20, 200, 300),
+        member(40),
+    ])
+
+    assert list(index.member_ids()) == [10, 20, 30, 40]
+    assert list(index.role_members(100)) == [10, 30]
+    assert list(index.intersection(100, 200)) == [30]
+    assert list(index.union(100, 300)) == [10, 20, 30]
+    assert list(index.difference(200, 100)) == [20]
+    assert sorted(index.member_roles(20)) == [200, 300]
+
+    index.remove_member(30)
+    index.add_role(50, 100)
+    index.remove_role(10, 100)
+
+    assert 30 not in index
+    assert list(index.role_members(100)) == [50]
+    assert index.count(200) == 1
+    assert not index.has_role(10, 100)
@@ -0,0 +1,85 @@
+import pytest
+import requests
+
+from pyaccord import Client, LocalRateLimitBackend, MembershipIndex
+from pyaccord.url_functions import Route
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, headers):
+        self.headers = headers
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def no_network(*args, **kwargs):
+        raise AssertionError("dry runs must not send requests")
+
+    monkeypatch.setattr(requests, "request", no_network)
+    return Client("FAKE BOT TOKEN", rate_limit_backend=LocalRateLimitBackend())
+
+
+def test_dry_run_estimates_from_observed_bucket_limits(client):
+    route = Route("PUT", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}", guild_id=1, user_id=2, role_id=3)
+    client.rate_limiter.release(route.key, route.major, FakeResponse({
+        "X-RateLimit-Bucket": "abc", "X-RateLimit-Limit": "10", "X-RateLimit-Remaining": "9",
+        "X-RateLimit-Reset-After": "10"}))
+    client._membership_indexes[1] = index = MembershipIndex(1)
+
+    with client.dry_run(concurrency=4) as plan:
+        for user_id in range(100):
+            client.add_role_to_guild_member(1, user_id, 3)
+        client.remove_guild_member(2, 1)
+
+    assert len(plan) == 101
+    slowest = plan.buckets()[0]
+    assert (slowest.count, slowest.limit, slowest.period, slowest.observed) == (100, 10, 10.0, True)
+    assert slowest.seconds == 90
+    assert plan.estimate() == 90
+    assert index.count(3) == 0
+    assert "100 x PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}" in plan.summary()
+
+
+def test_dry_run_detects_n_plus_one_fetches(client):
+    with client.dry_run() as plan:
+        assert client.get_guild_roles(1) == []
+        assert list(client.iter_guild_members(1)) == []
+        for guild_id in range(20):
+            client.get_guild(guild_id)
+
+    assert plan.n_plus_one() == {"GET /guilds/{guild_id}": 20}
+    # Each guild is its own bucket, so only the request latency adds up
+    assert all(not e.observed for e in plan.buckets())
+    assert plan.estimate() == pytest.approx(22 * 0.3)
+
+
+def test_dry_run_records_webhook_sends_without_caching(client):
+    with client.dry_run() as plan:
+        client.send_webhook_message(5, "hello")
+
+    assert [p.route.key for p in plan.requests] == [
+        "GET /channels/{channel_id}/webhooks", "POST /channels/{channel_id}/webhooks",
+        "POST /webhooks/{webhook_id}/{webhook_token}"]
+    assert client._channel_webhooks == {}
+
+
+def test_dry_run_keeps_registered_membership_index(client):
+    client._membership_indexes[1] = index = MembershipIndex(1)
+
+    with client.dry_run() as plan:
+        client.build_membership_index(1)
+
+    assert client.get_membership_index(1) is index
+    assert [p.route.key for p in plan.requests] == ["GET /guilds/{guild_id}/members"]
+
+
+def test_dry_run_records_invite_pool_refills(client):
+    with client.dry_run() as plan:
+        with client.create_invite_pool(7, size=3, refill_interval=0) as pool:
+            for _ in range(3):
+                pool.get(timeout=5)
+
+    assert len(plan) >= 3
+    assert {p.route.key for p in plan.requests} == {"POST /channels/{channel_id}/invites"}
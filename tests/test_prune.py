@@ -0,0 +1,72 @@
+import datetime
+import threading
+
+import requests
+
+from pyaccord.prune import prune_channel
+from pyaccord.snowflake import snowflake_time, time_snowflake
+
+
+def test_snowflake_round_trip():
+    dt = datetime.datetime(2022, 5, 1, 12, 30, tzinfo=datetime.timezone.utc)
+    assert snowflake_time(time_snowflake(dt)) == dt
+    assert time_snowflake(dt, high=True) - time_snowflake(dt) == 2 ** 22 - 1
+
+
+class FakeClient:
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.bulk_calls = []
+        self.single_calls = []
+        self.lock = threading.Lock()
+
+    def iter_channel_messages(self, channel, *, before=None, after=None):
+        return iter(sorted(self.messages, key=lambda m: int(m["id"]), reverse=True))
+
+    def bulk_delete_messages(self, channel, message_ids):
+        self.bulk_calls.append(list(message_ids))
+
+    def delete_channel_message(self, channel, message_id):
+        with self.lock:
+            self.single_calls.append(message_id)
+
+
+def test_prune_channel_groups_recent_messages():
+    now = datetime.datetime.now(datetime.timezone.utc)
+    recent = [{"id": str(time_snowflake(now - datetime.timedelta(minutes=i)) + i)} for i in range(250)]
+    old = [{"id": str(time_snowflake(now - datetime.timedelta(days=30, minutes=i)))} for i in range(7)]
+
+    client = FakeClient(recent + old)
+    progress = prune_channel(client, 1, concurrency=3)
+
+    assert [len(c) for c in client.bulk_calls] == [100, 100, 50]
+    assert sorted(client.single_calls) == sorted(int(m["id"]) for m in old)
+    assert progress.deleted == progress.matched == progress.scanned == 257
+    assert progress.done
+
+
+def test_prune_channel_predicate():
+    now = datetime.datetime.now(datetime.timezone.utc)
+    messages = [{"id": str(time_snowflake(now) - i), "pinned": i % 2 == 0} for i in range(10)]
+
+    client = FakeClient(messages)
+    progress = prune_channel(client, 1, predicate=lambda m: not m["pinned"])
+
+    assert progress.matched == 5
+    assert sum(len(c) for c in client.bulk_calls) == 5
+
+
+def test_prune_channel_counts_connection_errors():
+    now = datetime.datetime.now(datetime.timezone.utc)
+    old = [{"id": str(time_snowflake(now - datetime.timedelta(days=30, minutes=i)))} for i in range(5)]
+
+    class FailingClient(FakeClient):
+        def delete_channel_message(self, channel, message_id):
+            raise requests.exceptions.ConnectionError("connection reset")
+
+    progress = prune_channel(FailingClient(old), 1)
+
+    assert progress.failed == 5
+    assert progress.deleted == 0
+    assert progress.single_requests == 5
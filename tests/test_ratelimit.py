@@ -0,0 +1,112 @@
+import time
+
+import pytest
+import requests
+
+from pyaccord import (
+    Client, DeadlineExceededError, LocalRateLimitBackend, RateLimitBackend, RedisRateLimitBackend,
+    SQLiteRateLimitBackend
+)
+from pyaccord.url_functions import Route
+
+
+class FakeRedis:
+    """Stand-in for the few redis-py commands the backend uses."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, name):
+        return self.data.get(name)
+
+    def set(self, name, value, ex=None):
+        self.data[name] = value.encode() if isinstance(value, str) else value
+
+    def incr(self, name):
+        self.data[name] = int(self.data.get(name, 0)) + 1
+        return self.data[name]
+
+    def decr(self, name):
+        self.data[name] = int(self.data.get(name, 0)) - 1
+        return self.data[name]
+
+    def expire(self, name, seconds):
+        pass
+
+
+@pytest.fixture(params=["local", "sqlite", "redis"])
+def backends(request, tmp_path):
+    """Two backends sharing state, as two worker processes would."""
+
+    if request.param == "local":
+        backend = LocalRateLimitBackend()
+        return backend, backend
+    if request.param == "sqlite":
+        path = str(tmp_path / "ratelimit.sqlite3")
+        return SQLiteRateLimitBackend(path), SQLiteRateLimitBackend(path)
+    redis = FakeRedis()
+    return RedisRateLimitBackend(redis), RedisRateLimitBackend(redis)
+
+
+def test_global_limit_is_shared(backends):
+    first, second = backends
+    now = int(time.time()) + 0.1
+
+    granted = [b.reserve("token", None, global_limit=10, now=now) == 0 for b in (first, second) * 10]
+
+    assert granted.count(True) == 10
+    assert first.reserve("token", None, global_limit=10, now=now) == pytest.approx(0.9)
+
+
+def test_bucket_remaining_is_shared(backends):
+    first, second = backends
+    now = int(time.time()) + 0.1
+
+    first.update("token", "bucket", limit=5, remaining=5, reset_after=2, now=now)
+
+    granted = [b.reserve("token", "bucket", global_limit=50, now=now) == 0 for b in (first, second) * 5]
+
+    assert granted.count(True) == 5
+    # Reservations the exhausted bucket turned away don't count against the global limit
+    assert first.reserve("token", "other", global_limit=6, now=now) == 0
+    assert second.reserve("token", "bucket", global_limit=50, now=now + 2.1) == 0
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers):
+        self.status_code = status_code
+        self.headers = headers
+        self.ok = status_code < 400
+        self.content = b""
+
+    def raise_for_status(self):
+        pass
+
+
+def test_unrecorded_429_waits_out_retry_after(monkeypatch):
+    client = Client("FAKE BOT TOKEN", rate_limit_backend=LocalRateLimitBackend())
+    sent = []
+
+    def request(method, url, **kwargs):
+        sent.append(time.monotonic())
+        return FakeResponse(429 if len(sent) == 1 else 200, {"Retry-After": "0.2"})
+
+    monkeypatch.setattr(requests, "request", request)
+    client._request(Route("GET", "/guilds/{guild_id}", guild_id=1))
+
+    assert len(sent) == 2
+    assert sent[1] - sent[0] >= 0.2
+
+    with pytest.raises(DeadlineExceededError):
+        sent.clear()
+        with client.deadline(0.1):
+            client._request(Route("GET", "/guilds/{guild_id}", guild_id=1))
+
+
+def test_incomplete_backend_fails_on_construction():
+    class IncompleteBackend(RateLimitBackend):
+        def reserve(self, key, bucket, *, global_limit, now):
+            return 0
+
+    with pytest.raises(TypeError):
+        IncompleteBackend()
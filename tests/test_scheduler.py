@@ -0,0 +1,137 @@
+import threading
+import time
+
+import pytest
+
+from pyaccord import DeadlineExceededError, LocalRateLimitBackend, Priority, RequestScheduler
+from pyaccord import scheduler as scheduler_module
+from pyaccord.DiscordUserAPI import DiscordUserAPI
+from pyaccord.deadline import deadline
+from pyaccord.scheduler import current_priority, priority
+
+
+class FakeBackend:
+    def __init__(self, limit=None):
+        self.limit = limit
+
+    def get_bucket_limit(self, key, bucket):
+        return self.limit
+
+
+class FakeRateLimiter:
+    """Lets requests through as soon as they are scheduled, except while `hold` is cleared."""
+
+    key = "token"
+
+    def __init__(self, limit=None):
+        self.backend = FakeBackend(limit)
+        self.hold = threading.Event()
+        self.hold.set()
+        self.order = []
+
+    def bucket(self, route_key, major):
+        return f"hash:{major}"
+
+    def acquire(self, route_key, major, *, deadline=None):
+        request_priority = current_priority()
+        self.order.append((request_priority.level, request_priority.job) if request_priority else None)
+        self.hold.wait()
+
+
+def start(scheduler, level, job=None, errors=None):
+    def run():
+        try:
+            with priority(level, job=job):
+                scheduler.acquire("PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}", "1")
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def wait_for_depth(scheduler, level, depth):
+    while scheduler.stats()[level].depth != depth:
+        time.sleep(0.001)
+
+
+def hold_bucket(scheduler, rate_limiter):
+    rate_limiter.hold.clear()
+    holder = start(scheduler, Priority.BACKGROUND, "holder")
+    while not rate_limiter.order:
+        time.sleep(0.001)
+    return holder
+
+
+def test_interactive_requests_go_first_and_jobs_share_fairly():
+    rate_limiter = FakeRateLimiter()
+    scheduler = RequestScheduler(rate_limiter)
+    threads = [hold_bucket(scheduler, rate_limiter)]
+
+    for i, job in enumerate(["a"] * 4 + ["b"] * 2):
+        threads.append(start(scheduler, Priority.BACKGROUND, job))
+        wait_for_depth(scheduler, Priority.BACKGROUND, i + 1)
+    threads.append(start(scheduler, Priority.INTERACTIVE, "login"))
+    wait_for_depth(scheduler, Priority.INTERACTIVE, 1)
+
+    rate_limiter.hold.set()
+    for thread in threads:
+        thread.join()
+
+    assert [job for _, job in rate_limiter.order] == ["holder", "login", "a", "b", "a", "b", "a", "a"]
+    stats = scheduler.stats()
+    assert stats[Priority.INTERACTIVE].granted == 1 and stats[Priority.BACKGROUND].granted == 7
+    assert stats[Priority.BACKGROUND].max_wait > 0 and stats[Priority.BACKGROUND].depth == 0
+
+
+def test_full_queues_block_producers():
+    rate_limiter = FakeRateLimiter()
+    scheduler = RequestScheduler(rate_limiter, max_queued=2)
+    threads = [hold_bucket(scheduler, rate_limiter)]
+    errors = []
+
+    threads += [start(scheduler, Priority.DEFAULT, errors=errors) for _ in range(2)]
+    wait_for_depth(scheduler, Priority.DEFAULT, 2)
+
+    with pytest.raises(DeadlineExceededError):
+        with deadline(0.1):
+            scheduler.acquire("GET /channels/{channel_id}", "1")
+    assert scheduler.stats()[Priority.DEFAULT].depth == 2
+
+    # Interactive requests are never held back by full queues
+    threads.append(start(scheduler, Priority.INTERACTIVE, errors=errors))
+    wait_for_depth(scheduler, Priority.INTERACTIVE, 1)
+
+    rate_limiter.hold.set()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+def test_interactive_share_is_reserved():
+    rate_limiter = FakeRateLimiter(limit=(5, 60.0))
+    scheduler = RequestScheduler(rate_limiter, interactive_share=0.2)
+
+    with priority(Priority.BACKGROUND):
+        for _ in range(4):
+            scheduler.acquire("PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}", "1")
+
+        with pytest.raises(DeadlineExceededError):
+            with deadline(0.1):
+                scheduler.acquire("PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}", "1")
+
+    with priority(Priority.INTERACTIVE):
+        scheduler.acquire("PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}", "1")
+
+    assert len(rate_limiter.order) == 5
+
+
+def test_user_logins_are_not_kept_in_the_shared_registry():
+    backend = LocalRateLimitBackend()
+    apis = [DiscordUserAPI(access_token=f"user {i}", refresh_token="refresh", bot_token="FAKE BOT TOKEN",
+                           rate_limit_backend=backend) for i in range(50)]
+
+    # Only the bot token's scheduler is shared, each login's scheduler goes away with it
+    assert len(scheduler_module._schedulers[backend]) == 1
+    assert len({id(api._bot_scheduler) for api in apis}) == 1
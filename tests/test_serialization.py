@@ -0,0 +1,88 @@
+import pickle
+
+import pytest
+
+from pyaccord import Client
+from pyaccord.channel import Channel, TextChannel
+from pyaccord.guild import Guild
+from pyaccord.invite import Invite
+from pyaccord.user import CurrentUser, User
+from pyaccord.webhook import Webhook
+from pyaccord.serialization import ModelBatch, SerializationError, dumps, loads
+
+
+def make_guild(client, n):
+    guild = Guild.from_dict({
+        "id": str(10**17 + n), "name": f"guild {n}", "icon": f"{n:032x}",
+        "roles": [{"id": str(10**17 + n * 10 + r), "name": f"röle {r}", "position": r,
+                   "hoist": r % 2 == 0, "managed": False, "mentionable": True} for r in range(3)],
+    }, client=client)
+    guild._channels = Channel.from_list_of_dict([
+        {"id": str(10**17 + n * 10 + c), "guild_id": str(10**17 + n), "name": f"ch {c}", "type": c % 2,
+         "position": c, "permission_overwrites": [{"id": "42", "type": 0, "allow": "1024", "deny": "0"}]}
+        for c in range(2)], client=client)
+    return guild
+
+
+def test_round_trip_reattaches_client():
+    sender, receiver = Client("a"), Client("b")
+    models = [
+        make_guild(sender, 1),
+        User(10**17, "someone", "0001", avatar="a_1f", client=sender),
+        CurrentUser(10**17 + 1, "bot", "0002", client=sender),
+        Invite("abc", max_age=60, max_uses=1, temporary=None, client=sender),
+        Webhook(10**17 + 2, "tok-en", channel_id=5, name=None, client=sender),
+    ]
+
+    guild, user, current_user, invite, webhook = loads(dumps(models), client=receiver)
+
+    assert (guild.id, guild.name, guild.icon, guild._client) == (10**17 + 1, "guild 1", models[0].icon, receiver)
+    assert [(r.id, r.name, r.hoist) for r in guild.roles] == [(int(r.id), r.name, r.hoist) for r in models[0].roles]
+    assert [type(c) for c in guild.channels] == [TextChannel, Channel]
+    assert guild.channels[1].raw_permission_overwrites == models[0].channels[1].raw_permission_overwrites
+    assert all(c._client is receiver for c in guild.channels)
+    assert type(user) is User and (user.id, user.username, user.avatar) == (10**17, "someone", "a_1f")
+    assert type(current_user) is CurrentUser
+    assert (invite.code, invite.max_age, invite.max_uses, invite.temporary) == ("abc", 60, 1, None)
+    assert (webhook.token, webhook.channel_id, webhook.name, webhook._client) == ("tok-en", 5, None, receiver)
+
+
+def test_model_batch_is_lazy_and_smaller_than_pickle():
+    client = Client("a")
+    guilds = [make_guild(client, n) for n in range(500)]
+    data = dumps(guilds)
+
+    batch = ModelBatch(data, client=client)
+    assert len(batch) == 500
+    assert batch[-1].name == "guild 499"
+    assert len(data) < len(pickle.dumps(guilds, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def test_pickle_drops_client():
+    user = pickle.loads(pickle.dumps(User(1, "a", "0001", client=Client("a"))))
+    assert user._client is None
+
+
+def test_rejects_foreign_data():
+    with pytest.raises(SerializationError):
+        loads(b"not a batch")
+
+
+def test_loads_matches_lazy_decoding():
+    client = Client("a")
+    models = [make_guild(client, n) for n in range(20)]
+    models[3].icon = None
+    models[5]._channels = None
+    models.append(Webhook(10**17 + 2, "tok-en", channel_id=5, name=None, client=client))
+    data = dumps(models)
+
+    batch = ModelBatch(data, client=client)
+    lazy = [batch[i] for i in range(len(batch))]
+    eager = loads(data, client=client)
+
+    def state(model):
+        nested = [vars(m) for m in (getattr(model, "_roles", None) or []) + (getattr(model, "_channels", None) or [])]
+        return {k: v for k, v in vars(model).items() if k not in ("_roles", "_channels")}, nested
+
+    assert [state(m) for m in eager] == [state(m) for m in lazy]
+    assert eager[3].icon is None and eager[5]._channels is None and eager[0]._roles[1].name == "röle 1"
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from pyaccord import Client, LocalRateLimitBackend
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+def fake_request(calls, fail=None):
+    lock = threading.Lock()
+
+    def request(route, **kwargs):
+        with lock:
+            calls.append(route.key)
+        time.sleep(0.05)
+        guild_id = route.parameters["guild_id"]
+        if guild_id == fail:
+            raise requests.HTTPError("404")
+        if route.path == "/guilds/{guild_id}":
+            return FakeResponse({"id": guild_id, "name": f"guild {guild_id}", "roles": [
+                {"id": "1", "name": "@everyone", "position": 0, "hoist": False, "managed": False,
+                 "mentionable": False}]})
+        return FakeResponse([{"id": str(guild_id * 10), "guild_id": str(guild_id), "name": "general", "type": 0,
+                              "position": 0, "permission_overwrites": []}])
+
+    return request
+
+
+def test_load_guild_snapshots_fetches_concurrently_and_reuses_roles(monkeypatch):
+    client = Client("FAKE BOT TOKEN", rate_limit_backend=LocalRateLimitBackend())
+    calls = []
+    monkeypatch.setattr(client, "_request", fake_request(calls))
+
+    start = time.monotonic()
+    guilds = client.load_guild_snapshots([3, 1, 2, 1], concurrency=8)
+
+    assert time.monotonic() - start < 0.25
+    assert [g.id for g in guilds] == [3, 1, 2]
+    assert [r.name for r in guilds[0]._roles] == ["@everyone"]
+    assert guilds[1]._channels[0].name == "general"
+    assert not any(key.endswith("/roles") for key in calls)
+    assert len(calls) == 6
+
+
+def test_iter_guild_snapshots_raises_after_loading_the_rest(monkeypatch):
+    client = Client("FAKE BOT TOKEN", rate_limit_backend=LocalRateLimitBackend())
+    monkeypatch.setattr(client, "_request", fake_request([], fail=2))
+
+    loaded = []
+    with pytest.raises(requests.HTTPError):
+        for guild in client.iter_guild_snapshots([1, 2, 3], include=("channels",)):
+            loaded.append(guild.id)
+
+    assert sorted(loaded) == [1, 3]
+
+
+def test_stopping_early_cancels_queued_fetches(monkeypatch):
+    client = Client("FAKE BOT TOKEN", rate_limit_backend=LocalRateLimitBackend())
+    calls = []
+    monkeypatch.setattr(client, "_request", fake_request(calls))
+
+    start = time.monotonic()
+    snapshots = client.iter_guild_snapshots(range(1, 101), concurrency=2)
+    next(snapshots)
+    snapshots.close()
+
+    # 200 fetches two at a time would take 5s, only the ones already running are waited for
+    assert time.monotonic() - start < 0.5
+    assert len(calls) < 10
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from pyaccord.streaming import iter_json_array
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 4096])
+def test_iter_json_array_across_chunk_boundaries(size):
+    items = [{"id": str(i), "name": f"röle {i}", "tags": [i, None, True]} for i in range(50)] + [12345, "x"]
+    data = json.dumps(items).encode()
+
+    assert list(iter_json_array(chunked(data, size))) == items
+
+
+def test_iter_json_array_yields_before_the_end():
+    received = []
+
+    def chunks():
+        for chunk in [b'[{"id": "1"}, {"id"', b': "2"}', b"]"]:
+            received.append(chunk)
+            yield chunk
+
+    elements = iter_json_array(chunks())
+
+    assert next(elements) == {"id": "1"}
+    assert len(received) == 1
+    assert next(elements) == {"id": "2"}
+    assert len(received) == 2
+    assert list(elements) == []
+
+
+def test_iter_json_array_rejects_truncated_response():
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'[{"id": "1"}, {"id": "2"']))
+
+
+@pytest.mark.parametrize("body", [b"[1 2]", b"[,1]", b"[1,,2]", b"[1,]", b'[{"a": 1}{"b": 2}]'])
+@pytest.mark.parametrize("size", [1, 4096])
+def test_iter_json_array_rejects_misplaced_separators(body, size):
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunked(body, size)))
+
+
+def test_iter_json_array_empty():
+    assert list(iter_json_array([b" [ ] "])) == []
@@ -0,0 +1,129 @@
+import json
+import threading
+import time
+
+import pytest
+import requests
+
+from pyaccord import Client, LocalRateLimitBackend, Webhook, webhook
+from pyaccord.DiscordMessage import Message
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.ok = status_code < 400
+        self.content = b""
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(str(self.status_code), response=self)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = Client("FAKE BOT TOKEN", rate_limit_backend=LocalRateLimitBackend())
+    client.calls = []
+    client.webhooks = {5: [{"id": "1", "name": "pyaccord"}, {"id": "2", "token": "other", "name": "other"},
+                           {"id": "3", "token": "good", "name": "pyaccord"}]}
+    lock = threading.Lock()
+
+    def request(route, **kwargs):
+        with lock:
+            client.calls.append(route.key)
+        time.sleep(0.02)
+        channel_id = route.parameters["channel_id"]
+        if route.method == "GET":
+            return FakeResponse(body=client.webhooks.get(channel_id, []))
+        created = {"id": "9", "token": "fresh", "name": kwargs["json"]["name"]}
+        client.webhooks[channel_id] = [created]
+        return FakeResponse(body=created)
+
+    monkeypatch.setattr(client, "_request", request)
+    return client
+
+
+@pytest.fixture
+def posts(monkeypatch):
+    posts = []
+    responses = []
+
+    def post(url, **kwargs):
+        posts.append((time.monotonic(), url, kwargs))
+        return responses.pop(0) if responses else FakeResponse(204)
+
+    monkeypatch.setattr(webhook._session, "post", post)
+    return posts, responses
+
+
+def test_channel_webhook_is_selected_and_cached(client):
+    threads = [threading.Thread(target=client.get_channel_webhook, args=(5,)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    cached = client.get_channel_webhook(5)
+    assert (cached.id, cached.token) == (3, "good")
+    assert client.calls == ["GET /channels/{channel_id}/webhooks"]
+
+    # Channels without a usable webhook get one created
+    assert client.get_channel_webhook(6).token == "fresh"
+    assert client.calls[1:] == ["GET /channels/{channel_id}/webhooks", "POST /channels/{channel_id}/webhooks"]
+
+
+def test_deleted_webhook_is_recreated(client, posts):
+    sent, responses = posts
+    client.get_channel_webhook(5)
+    # Someone deletes the webhook in Discord
+    client.webhooks[5] = []
+    responses.append(FakeResponse(404))
+
+    client.send_webhook_message(5, "hello")
+
+    assert [url.rsplit("/", 2)[-2:] for _, url, _ in sent] == [["3", "good"], ["9", "fresh"]]
+    assert client.get_channel_webhook(5).token == "fresh"
+
+
+def test_webhook_sends_are_rate_limited(posts):
+    sent, responses = posts
+    hook = Webhook(1, "tok", client=Client("FAKE BOT TOKEN", rate_limit_backend=LocalRateLimitBackend()))
+
+    responses.append(FakeResponse(429, headers={"Retry-After": "0.1"}))
+    responses.append(FakeResponse(204, headers={"X-RateLimit-Bucket": "hook", "X-RateLimit-Limit": "1",
+                                                "X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "0.2"}))
+    hook.send("first")
+    hook.send("second")
+
+    times = [t for t, _, _ in sent]
+    assert len(times) == 3
+    assert times[1] - times[0] >= 0.1
+    # The second send waits for the bucket to reset instead of hitting a 429
+    assert times[2] - times[1] >= 0.15
+
+
+def test_message_with_file_is_uploaded(posts, tmp_path):
+    sent, _ = posts
+    path = tmp_path / "report.txt"
+    path.write_text("contents")
+
+    Webhook(1, "tok").send(Message(text="see attached", file_path=str(path), display_filename="r.txt"),
+                           username="bot")
+
+    _, _, kwargs = sent[0]
+    assert json.loads(kwargs["data"]["payload_json"]) == {"content": "see attached", "username": "bot"}
+    assert kwargs["files"]["files[0]"][0] == "r.txt"
+
+
+def test_channel_messages_refuse_attachments(client, tmp_path):
+    path = tmp_path / "r.txt"
+    path.write_text("report")
+
+    with pytest.raises(ValueError):
+        client.send_channel_message(5, Message(text="see attached", file_path=str(path)))
+    assert client.calls == []